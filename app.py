@@ -1,27 +1,19 @@
-import streamlit as st
-import requests
-from datetime import datetime
+import base64
 import os
 import streamlit as st
-from utils.api_handler import geocode_address, get_directions, get_weather_by_coords
-from utils.calculations import (
-    haversine_distance,
-    destination_point,
-    calculate_calories,
-    calculate_time_from_speed,
-    rank_routes
-)
-from utils.map_renderer import (
-    render_routes_map,
-    decode_polyline,
-    get_waypoints_from_polyline,
-    create_google_maps_url,
-    create_static_map_url
+from utils.api_handler import suggest_addresses
+from utils.calculations import rank_routes_top_k
+from utils.engine import (
+    iter_generation,
+    SHAPE_OUT as SHAPE_OUT_ENGINE,
+    SHAPE_LOOP as SHAPE_LOOP_ENGINE,
+    SEARCH_FIXED as SEARCH_FIXED_ENGINE,
+    SEARCH_ADAPTIVE as SEARCH_ADAPTIVE_ENGINE
 )
-from streamlit_folium import st_folium
-import folium
-import pandas as pd
-import base64
+from utils.metrics import metrics, start_metrics_server
+# folium, utils.map_renderer (branca) and utils.thumbnails (Pillow) are imported
+# where routes are drawn, so reruns without results never load them.
+# `python benchmarks/import_time.py` tracks what each of these costs at startup.
 
 # -----------------------------------------------------------
 # APP CONFIGURATION
@@ -42,6 +34,15 @@ if not GOOGLE_API_KEY or not OPENWEATHER_API_KEY:
     st.error("Missing API keys in secrets.toml.")
     st.stop()
 
+# Optional instrumentation: Prometheus /metrics on this port, and a sidebar debug panel
+METRICS_PORT = os.environ.get("WONDER_RUN_METRICS_PORT")
+SHOW_DEBUG_PANEL = os.environ.get("WONDER_RUN_DEBUG", "").lower() in ("1", "true", "yes")
+if METRICS_PORT:
+    try:
+        start_metrics_server(int(METRICS_PORT))
+    except (OSError, ValueError) as e:
+        st.warning(f"Metrics server not started: {e}")
+
 # Initialize session state for storing results
 if 'routes_generated' not in st.session_state:
     st.session_state.routes_generated = False
@@ -49,6 +50,14 @@ if 'all_routes' not in st.session_state:
     st.session_state.all_routes = []
 if 'best_index' not in st.session_state:
     st.session_state.best_index = 0
+if 'route_order' not in st.session_state:
+    st.session_state.route_order = []
+if 'selected_route_id' not in st.session_state:
+    st.session_state.selected_route_id = None
+if 'search_summary' not in st.session_state:
+    st.session_state.search_summary = None
+if 'last_generation' not in st.session_state:
+    st.session_state.last_generation = None
 if 'origin_coords' not in st.session_state:
     st.session_state.origin_coords = None
 if 'weather_data' not in st.session_state:
@@ -139,7 +148,9 @@ st.markdown("""
 # -----------------------------------------------------------
 # Load Local GIF for Header
 # -----------------------------------------------------------
+@st.cache_resource
 def load_gif(path):
+    # read and base64-encode once per process, not on every rerun
     try:
         with open(path, "rb") as file:
             data = file.read()
@@ -196,11 +207,41 @@ else:
 st.sidebar.header("Plan Your Run")
 
 start_location = st.sidebar.text_input("Start Location (e.g., Condongcatur, Sleman)")
+# places resolved before are answered from the local geocode cache, no API call needed
+known_places = suggest_addresses(start_location) if start_location else []
+if known_places:
+    picked_place = st.sidebar.selectbox(
+        "Known places",
+        ["Use typed location"] + [p["formatted_address"] for p in known_places]
+    )
+    if picked_place != "Use typed location":
+        start_location = picked_place
 goal_type = st.sidebar.selectbox("Goal Type", ["Distance (km)", "Duration (minutes)", "Calories"])
 target_value = st.sidebar.number_input("Target Value", min_value=1.0, step=0.5)
 weight = st.sidebar.number_input("Your Weight (kg)", min_value=30.0, max_value=150.0, value=60.0)
 speed_pref = st.sidebar.slider("Average Speed (km/h)", 5, 15, 8)
 st.sidebar.markdown("---")
+# one shared map keeps the page at a single map component however many routes there are
+MAP_MODE_SINGLE = "One map for all routes"
+MAP_MODE_PER_CARD = "A map on every route card"
+map_mode = st.sidebar.radio("Route Maps", [MAP_MODE_SINGLE, MAP_MODE_PER_CARD])
+# loops are fetched as one origin -> A -> B -> origin request each, so the ranked
+# distance is the distance actually run
+SHAPE_OUT = "Out to a point"
+SHAPE_LOOP = "Loop back to start"
+route_shape = st.sidebar.radio("Route Shape", [SHAPE_OUT, SHAPE_LOOP])
+# adaptive search corrects the candidate radius from the first Directions responses
+SEARCH_MODE_FIXED = "Fixed (8 bearings)"
+SEARCH_MODE_ADAPTIVE = "Adaptive (closer to target)"
+search_mode = SEARCH_MODE_FIXED
+fit_routes = False
+if route_shape == SHAPE_OUT:
+    search_mode = st.sidebar.radio("Candidate Search", [SEARCH_MODE_FIXED, SEARCH_MODE_ADAPTIVE])
+    # trimming a loop would leave it short of the start, so this is for out routes only
+    fit_routes = st.sidebar.checkbox(
+        "Fit routes to target distance", value=True,
+        help="Cut routes that run long, turn short ones into an out-and-back. Uses no extra API calls."
+    )
 
 # -----------------------------------------------------------
 # MAIN AREA: MAP AND ROUTE RESULTS
@@ -211,88 +252,218 @@ generate = st.button("Generate Route")
 # ----------------------
 # Generate logic
 # ----------------------
+def render_provisional_routes(placeholder, routes, origin):
+    # lightweight view of the routes received so far, best first; replaced by the
+    # full results once every candidate has landed
+    from utils.thumbnails import get_route_thumbnail
+
+    order = rank_routes_top_k(routes, goal_type, target_value)
+    best = routes[order[0]]
+    with placeholder.container():
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #FF8C00 0%, #FFD700 100%); 
+                    padding: 1rem 1.5rem; border-radius: 15px; margin-bottom: 1rem; color: white;">
+            <strong>⭐ Best so far ({len(routes)} routes received):</strong>
+            Route {best['route_id']} · {best['distance_km']} km · {best['duration_min']} min · {best['calories']} kcal
+        </div>
+        """, unsafe_allow_html=True)
+        for i in range(0, len(order), 3):
+            cols = st.columns(3)
+            for col, idx in zip(cols, order[i:i + 3]):
+                route = routes[idx]
+                with col:
+                    st.markdown(f"**{'⭐ ' if idx == order[0] else ''}Route {route['route_id']}** · {route['distance_km']} km · {route['duration_min']} min")
+                    st.image(get_route_thumbnail(
+                        route['polyline'],
+                        origin=origin,
+                        style={"line_color": "#FF8C00" if idx == order[0] else "#D2691E"}
+                    ))
+
+
 if generate:
     if not GOOGLE_API_KEY:
         st.error("Google Maps API key missing.")
     else:
-        with st.spinner("Generating routes..."):
-            # 1. Geocode start
-            geocode = geocode_address(start_location, GOOGLE_API_KEY)
-            if not geocode:
-                st.error("Start location not found. Please refine the address.")
+        # geocode -> candidate search -> fit -> dedupe -> rank, streamed from the engine
+        events = iter_generation(
+            start_location, goal_type, target_value, weight, speed_pref,
+            GOOGLE_API_KEY, OPENWEATHER_API_KEY,
+            shape=SHAPE_LOOP_ENGINE if route_shape == SHAPE_LOOP else SHAPE_OUT_ENGINE,
+            search_mode=SEARCH_ADAPTIVE_ENGINE if search_mode == SEARCH_MODE_ADAPTIVE else SEARCH_FIXED_ENGINE,
+            fit_routes=fit_routes
+        )
+        result = None
+        live_results = None
+        # 1. Geocode start
+        with st.spinner("Finding start location..."):
+            kind, geocode = next(events)
+        if geocode:
+            origin = (geocode["lat"], geocode["lng"])
+            st.session_state.origin_coords = origin
+            live_results = st.empty()
+            live_results.info("Generating routes...")
+        # 2-5. Routes are streamed: cards fill in as each candidate lands
+        for kind, payload in events:
+            if kind == "routes":
+                with metrics.timer("provisional_render"):
+                    render_provisional_routes(live_results, payload, origin)
+            elif kind == "result":
+                result = payload
+        if live_results is not None:
+            live_results.empty()
+
+        if result["error"] == "geocode":
+            st.error("Start location not found. Please refine the address.")
+            st.session_state.routes_generated = False
+        else:
+            dropped_bearings = result["dropped_bearings"]
+            if dropped_bearings:
+                st.warning(
+                    f"{len(dropped_bearings)} of {result['candidates']} route directions timed out "
+                    f"(bearings {', '.join(str(round(b)) for b in dropped_bearings)}°) "
+                    "and were skipped."
+                )
+            if result["error"] == "no_routes":
+                st.error("No routes were returned from the Directions API. Try another start location or increase candidate bearings.")
                 st.session_state.routes_generated = False
             else:
-                origin_lat, origin_lng = geocode["lat"], geocode["lng"]
-                st.session_state.origin_coords = (origin_lat, origin_lng)
-
-                # 2. Determine target distance depending on goal type
-                if goal_type == "Distance (km)":
-                    target_distance_km = float(target_value)
-                elif goal_type == "Duration (minutes)":
-                    # convert duration to distance using preferred speed
-                    minutes = float(target_value)
-                    target_distance_km = (minutes / 60.0) * speed_pref
-                else:  # Calories
-                    # approximate distance from calories: calories = distance_km * weight * 1.036
-                    target_distance_km = float(target_value) / (weight * 1.036)
-
-                # 3. Generate candidate destinations by bearings
-                n_bearings = 8
-                bearings = [i * (360 / n_bearings) for i in range(n_bearings)]
-                candidates = []
-                for bearing in bearings:
-                    dest_lat, dest_lng = destination_point(origin_lat, origin_lng, bearing, target_distance_km / 2.0)
-                    # aim for half distance away to encourage roundtrip-ish route (origin->point)
-                    candidates.append((dest_lat, dest_lng))
-
-                # 4. Request Directions for each candidate (origin -> candidate)
-                all_routes = []
-                for idx, (dlat, dlng) in enumerate(candidates):
-                    directions = get_directions(
-                        origin=(origin_lat, origin_lng),
-                        destination=(dlat, dlng),
-                        api_key=GOOGLE_API_KEY,
-                        alternatives=True
-                    )
-                    if not directions:
-                        continue
-                    # directions may have multiple route alternatives
-                    for r in directions:
-                        # distance in km, duration in minutes
-                        dist_km = r["distance_m"] / 1000.0
-                        dur_min = r["duration_s"] / 60.0
-                        est_cal = calculate_calories(dist_km, weight)
-                        all_routes.append({
-                            "route_id": f"{idx}-{r['route_index']}",
-                            "polyline": r["polyline"],
-                            "distance_km": round(dist_km, 3),
-                            "duration_min": round(dur_min, 1),
-                            "calories": round(est_cal, 1),
-                            "summary": r.get("summary", "")
-                        })
-
-                if not all_routes:
-                    st.error("No routes were returned from the Directions API. Try another start location or increase candidate bearings.")
-                    st.session_state.routes_generated = False
-                else:
-                    # 5. Rank routes based on goal and target
-                    best_index = rank_routes(all_routes, goal_type, target_value, weight, speed_pref)
-
-                    # Store in session state
-                    st.session_state.all_routes = all_routes
-                    st.session_state.best_index = best_index
-                    st.session_state.routes_generated = True
-
-                    # 8. Weather at origin
-                    if OPENWEATHER_API_KEY:
-                        w = get_weather_by_coords(lat=origin_lat, lon=origin_lng, api_key=OPENWEATHER_API_KEY)
-                        st.session_state.weather_data = w
+                # Store in session state
+                st.session_state.all_routes = result["routes"]
+                st.session_state.best_index = result["best_index"]
+                st.session_state.route_order = result["route_order"]
+                st.session_state.selected_route_id = None
+                st.session_state.search_summary = result["summary"]
+                st.session_state.routes_generated = True
+
+                # Weather at origin (fetched alongside the directions)
+                st.session_state.weather_data = result["weather"]
+            st.session_state.last_generation = result["log_line"]
 
-# Display results if routes have been generated
-if st.session_state.routes_generated:
+# -----------------------------------------------------------
+# Results rendering
+# -----------------------------------------------------------
+# Cards, thumbnails, links and maps depend only on the stored routes and their
+# style, so each piece is cached by those values and reused across reruns; only
+# cards whose route data changed are rebuilt. Maps are cached as rendered HTML
+# (a folium Map object cannot be rendered twice without duplicating its scripts).
+# st.fragment (Streamlit >= 1.37) lets the highlight buttons and map checkboxes
+# rerun just the results instead of the whole script.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+
+def embed_html(html, height):
+    # st.iframe replaces components.html in newer Streamlit releases
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=height)
+    else:
+        import streamlit.components.v1 as components
+        components.html(html, height=height)
+
+
+def select_route(route_id):
+    # highlight-button callback: the map and cards rerender around the selection
+    st.session_state.selected_route_id = route_id
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def route_card_html(route_id, distance_km, duration_min, calories, summary, is_best):
+    border_color = "#FF8C00" if is_best else "#D2691E"
+    return f"""
+    <div style="border: 3px solid {border_color}; 
+                border-radius: 12px; 
+                padding: 1rem; 
+                background-color: #FFF8F0;
+                margin-bottom: 1rem;
+                height: 100%;">
+        <h4 style="color: #3E2723; margin-top: 0;">
+            {'⭐ ' if is_best else ''}Route {route_id}
+        </h4>
+        <div style="margin: 0.5rem 0;">
+            <strong>📏 Distance:</strong> {distance_km} km<br>
+            <strong>⏱️ Duration:</strong> {duration_min} min<br>
+            <strong>🔥 Calories:</strong> {calories} kcal<br>
+            <strong>🛣️ Via:</strong> {summary if summary else 'Direct route'}
+        </div>
+    </div>
+    """
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def route_thumbnail(polyline_str, origin, line_color):
+    # Locally rasterized thumbnail (also cached on disk); no tiles, no iframe
+    from utils.thumbnails import get_route_thumbnail
+    return get_route_thumbnail(polyline_str, origin=origin, style={"line_color": line_color})
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def route_maps_link(polyline_str, waypoints, origin):
+    from utils.map_renderer import get_waypoints_from_polyline, create_google_maps_url
+
+    origin_lat, origin_lng = origin
+    if waypoints:
+        # True loop: link the exact waypoints the ranked route was fetched with
+        return create_google_maps_url(origin=origin, destination=origin, waypoints=waypoints, mode='walking')
+    # Decode polyline to get waypoints for directions URL
+    points = get_waypoints_from_polyline(polyline_str, num_waypoints=3)
+    if len(points) >= 2:
+        # For a round trip: origin -> waypoint -> origin
+        mid_point = points[len(points)//2]
+        return create_google_maps_url(origin=origin, destination=origin, waypoints=[mid_point], mode='walking')
+    return f"https://www.google.com/maps/dir/?api=1&origin={origin_lat},{origin_lng}&destination={origin_lat},{origin_lng}&travelmode=walking"
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def routes_map_html(origin, routes, best_index, selected_route_id):
+    # all routes on one map, one toggleable layer each
+    from utils.map_renderer import render_routes_map
+    routes_map = render_routes_map(origin, routes, best_index=best_index, selected_route_id=selected_route_id)
+    return routes_map.get_root().render()
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def route_preview_map(polyline_str, origin, line_color):
+    # small folium map for one route -> (html, vertices before simplification, vertices removed)
+    import folium
+    from utils.geometry import decode_coords
+    from utils.map_renderer import simplify_coords
+
+    route_map = folium.Map(
+        location=list(origin),
+        zoom_start=13,
+        tiles='OpenStreetMap',
+        width=400,
+        height=300
+    )
+
+    # Add start marker
+    folium.Marker(
+        list(origin),
+        popup="Start",
+        icon=folium.Icon(color="green", icon="play", prefix='fa')
+    ).add_to(route_map)
+
+    # Decode, simplify and add route polyline
+    full_coords = decode_coords(polyline_str)
+    simplified, removed = simplify_coords(full_coords)
+    route_coords = simplified.tolist()
+    if route_coords:
+        folium.PolyLine(
+            locations=route_coords,
+            color=line_color,
+            weight=4,
+            opacity=0.8
+        ).add_to(route_map)
+
+        # Fit bounds to show entire route
+        route_map.fit_bounds(route_coords)
+    return route_map.get_root().render(), len(full_coords), removed
+
+
+@fragment
+def show_results(map_mode):
     all_routes = st.session_state.all_routes
     best_index = st.session_state.best_index
-    origin_lat, origin_lng = st.session_state.origin_coords
+    origin = tuple(st.session_state.origin_coords)
 
     # Display weather at top
     if st.session_state.weather_data:
@@ -327,10 +498,21 @@ if st.session_state.routes_generated:
 
     # Display routes in columns (3 per row)
     st.markdown("### 📍 All Route Options")
+    if st.session_state.search_summary:
+        st.caption(st.session_state.search_summary)
     
-    # Sort routes by distance
-    sorted_routes = sorted(enumerate(all_routes), key=lambda x: x[1]['distance_km'])
+    # Routes in ranking order (best first)
+    route_order = st.session_state.route_order or list(range(len(all_routes)))
+    sorted_routes = [(idx, all_routes[idx]) for idx in route_order]
     
+    if map_mode == MAP_MODE_SINGLE:
+        # cards pick the highlighted route
+        embed_html(routes_map_html(origin, all_routes, best_index, st.session_state.selected_route_id), height=500)
+    
+    # vertices dropped by map simplification on this render
+    vertices_total = 0
+    vertices_removed = 0
+
     # Display in rows of 3 columns
     for i in range(0, len(sorted_routes), 3):
         cols = st.columns(3)
@@ -343,90 +525,46 @@ if st.session_state.routes_generated:
                 with col:
                     # Determine if this is the best route
                     is_best = original_idx == best_index
-                    border_color = "#FF8C00" if is_best else "#D2691E"
+                    route_color = "#FF8C00" if is_best else "#D2691E"
                     
-                    st.markdown(f"""
-                    <div style="border: 3px solid {border_color}; 
-                                border-radius: 12px; 
-                                padding: 1rem; 
-                                background-color: #FFF8F0;
-                                margin-bottom: 1rem;
-                                height: 100%;">
-                        <h4 style="color: #3E2723; margin-top: 0;">
-                            {'⭐ ' if is_best else ''}Route {route['route_id']}
-                        </h4>
-                        <div style="margin: 0.5rem 0;">
-                            <strong>📏 Distance:</strong> {route['distance_km']} km<br>
-                            <strong>⏱️ Duration:</strong> {route['duration_min']} min<br>
-                            <strong>🔥 Calories:</strong> {route['calories']} kcal<br>
-                            <strong>🛣️ Via:</strong> {route['summary'] if route['summary'] else 'Direct route'}
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                    st.markdown(route_card_html(
+                        route['route_id'], route['distance_km'], route['duration_min'],
+                        route['calories'], route['summary'], is_best
+                    ), unsafe_allow_html=True)
+                    st.image(route_thumbnail(route['polyline'], origin, route_color))
                     
-                    # Generate map preview for this route using Folium
-                    try:
-                        # Create a small folium map for this route
-                        route_map = folium.Map(
-                            location=[origin_lat, origin_lng],
-                            zoom_start=13,
-                            tiles='OpenStreetMap',
-                            width=400,
-                            height=300
+                    if map_mode == MAP_MODE_SINGLE:
+                        is_selected = route['route_id'] == (st.session_state.selected_route_id or best_route['route_id'])
+                        st.button(
+                            "📍 Highlighted on map" if is_selected else "📍 Highlight on map",
+                            key=f"select_route_{route['route_id']}",
+                            on_click=select_route,
+                            args=(route['route_id'],),
+                            disabled=is_selected,
+                            use_container_width=True
                         )
+                    elif st.checkbox("Show interactive map", key=f"show_map_{route['route_id']}"):
+                        # Interactive map preview for this route, loaded on demand
+                        try:
+                            map_html, total, removed = route_preview_map(route['polyline'], origin, route_color)
+                            vertices_total += total
+                            vertices_removed += removed
+                            embed_html(map_html, height=300)
                         
-                        # Add start marker
-                        folium.Marker(
-                            [origin_lat, origin_lng],
-                            popup="Start",
-                            icon=folium.Icon(color="green", icon="play", prefix='fa')
-                        ).add_to(route_map)
-                        
-                        # Decode and add route polyline
-                        route_coords = decode_polyline(route['polyline'])
-                        if route_coords:
-                            route_color = "#FF8C00" if is_best else "#D2691E"
-                            folium.PolyLine(
-                                locations=route_coords,
-                                color=route_color,
-                                weight=4,
-                                opacity=0.8
-                            ).add_to(route_map)
-                            
-                            # Fit bounds to show entire route
-                            route_map.fit_bounds(route_coords)
-                        
-                        # Display the map
-                        st_folium(route_map, width=400, height=300, key=f"route_map_{route['route_id']}", returned_objects=[])
-                        
-                    except Exception as e:
-                        # Fallback: show placeholder
-                        st.markdown(f"""
-                        <div style="background: #f0f0f0; height: 300px; display: flex; 
-                                    align-items: center; justify-content: center; 
-                                    border-radius: 8px; color: #666;">
-                            <div style="text-align: center;">
-                                <div style="font-size: 3rem;">🗺️</div>
-                                <div>Map preview unavailable</div>
+                        except Exception as e:
+                            # Fallback: show placeholder
+                            st.markdown(f"""
+                            <div style="background: #f0f0f0; height: 300px; display: flex; 
+                                        align-items: center; justify-content: center; 
+                                        border-radius: 8px; color: #666;">
+                                <div style="text-align: center;">
+                                    <div style="font-size: 3rem;">🗺️</div>
+                                    <div>Map preview unavailable</div>
+                                </div>
                             </div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Decode polyline to get waypoints for directions URL
-                    waypoints = get_waypoints_from_polyline(route['polyline'], num_waypoints=3)
+                            """, unsafe_allow_html=True)
                     
-                    # Create Google Maps directions URL with waypoints (for a loop route)
-                    if len(waypoints) >= 2:
-                        # For a round trip: origin -> waypoint -> origin
-                        mid_point = waypoints[len(waypoints)//2]
-                        maps_link = create_google_maps_url(
-                            origin=(origin_lat, origin_lng),
-                            destination=(origin_lat, origin_lng),
-                            waypoints=[mid_point],
-                            mode='walking'
-                        )
-                    else:
-                        maps_link = f"https://www.google.com/maps/dir/?api=1&origin={origin_lat},{origin_lng}&destination={origin_lat},{origin_lng}&travelmode=walking"
+                    maps_link = route_maps_link(route['polyline'], route.get('waypoints'), origin)
                     st.markdown(f"""
                     <a href="{maps_link}" target="_blank" 
                         style="display: inline-block; 
@@ -442,9 +580,28 @@ if st.session_state.routes_generated:
                     </a>
                     """, unsafe_allow_html=True)
 
+    if vertices_total:
+        st.caption(f"Map previews simplified: {vertices_removed} of {vertices_total} route vertices removed.")
+
+
+# Display results if routes have been generated
+if st.session_state.routes_generated:
+    show_results(map_mode)
 else:
     st.info("Set your running goals in the sidebar and click 'Generate Route'.")
 
+if SHOW_DEBUG_PANEL:
+    # drawn last so it already includes this run's generation
+    with st.sidebar.expander("Debug: metrics"):
+        if st.session_state.last_generation:
+            st.caption("Last generation")
+            st.code(st.session_state.last_generation, language="json")
+        snapshot = metrics.snapshot()
+        st.caption("Mean seconds per stage / upstream call")
+        st.json({name: round(h["mean"], 4) for name, h in snapshot["histograms"].items()})
+        st.caption("Counters and cache gauges")
+        st.json({**snapshot["counters"], **snapshot["gauges"]})
+
 # -----------------------------------------------------------
 # FOOTER
 # -----------------------------------------------------------
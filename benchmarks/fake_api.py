@@ -0,0 +1,232 @@
+"""
+Local stand-in for the Google Geocoding / Directions and OpenWeather APIs.
+
+Serves synthetic responses (or recorded JSON bodies, if a directory of them is
+given) from a threaded HTTP server on 127.0.0.1, with configurable latency and
+injected failures, so the route pipeline can be exercised without network access.
+
+    with FakeApiServer(latency_ms=120, error_rate=0.05) as server:
+        server.patch(utils.api_handler)
+        ...
+        print(server.calls)
+
+Recorded responses: put geocode.json, directions.json and/or weather.json in a
+directory and pass it as recorded_dir; those endpoints then return that body
+verbatim instead of a synthetic one.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from utils.calculations import cumulative_distances
+from utils.geometry import encode_coords
+
+PATHS = {
+    "/maps/api/geocode/json": "geocode",
+    "/maps/api/directions/json": "directions",
+    "/data/2.5/weather": "weather",
+}
+# synthetic geocodes land around this point (Yogyakarta)
+BASE_LOCATION = (-7.7569, 110.4003)
+WALKING_SPEED_MPS = 5.0 / 3.6
+
+
+def _parse_point(text):
+    lat, lng = text.split(",")
+    return float(lat), float(lng)
+
+
+def synthetic_path(points, n_points, wiggle, phase=0.0):
+    # street-like path through points: straight legs with a sideways wave, n_points vertices
+    points = np.asarray(points, dtype=float)
+    legs = max(len(points) - 1, 1)
+    per_leg = max(n_points // legs, 2)
+    parts = []
+    for a, b in zip(points[:-1], points[1:]):
+        t = np.linspace(0.0, 1.0, per_leg)
+        line = a + t[:, None] * (b - a)
+        # offset perpendicular to the leg (in degrees), zero at both ends
+        normal = np.array([-(b - a)[1], (b - a)[0]])
+        offset = np.sin(t * math.pi * 3 + phase) * np.sin(t * math.pi) * wiggle
+        parts.append(line + offset[:, None] * normal)
+    return np.vstack(parts) if parts else points
+
+
+class FakeApiServer:
+    """
+    Threaded local HTTP server answering Geocoding, Directions and OpenWeather requests.
+
+    Args:
+        latency_ms: Mean response delay
+        jitter_ms: Delay is uniform in latency_ms +/- jitter_ms
+        tail_rate: Share of requests delayed by tail_ms on top (slow outliers)
+        tail_ms: Extra delay of the slow outliers
+        error_rate: Share of requests answered with HTTP 500
+        quota_rate: Share of Google requests answered with status OVER_QUERY_LIMIT
+        polyline_points: Vertices per synthetic Directions route
+        max_alternatives: Routes per Directions response when alternatives=true
+        recorded_dir: Directory of recorded response bodies (geocode.json, ...)
+        seed: Random seed for delays and failures
+    """
+
+    def __init__(self, latency_ms=80.0, jitter_ms=40.0, tail_rate=0.0, tail_ms=1500.0, error_rate=0.0,
+                 quota_rate=0.0, polyline_points=200, max_alternatives=3, recorded_dir=None, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.polyline_points = polyline_points
+        self.max_alternatives = max_alternatives
+        self.recorded = {}
+        if recorded_dir:
+            for endpoint in set(PATHS.values()):
+                path = os.path.join(recorded_dir, f"{endpoint}.json")
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as file:
+                        self.recorded[endpoint] = json.load(file)
+        # (endpoint, status) -> number of requests
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+        self.base_url = None
+
+    # ---- lifecycle ----
+    def start(self) -> "FakeApiServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def patch(self, api_handler) -> None:
+        # point the module's endpoint constants at this server
+        api_handler.GEOCODE_URL = self.base_url + "/maps/api/geocode/json"
+        api_handler.DIRECTIONS_URL = self.base_url + "/maps/api/directions/json"
+        api_handler.OWM_URL = self.base_url + "/data/2.5/weather"
+
+    def reset_calls(self) -> Counter:
+        with self._lock:
+            calls, self.calls = self.calls, Counter()
+        return calls
+
+    # ---- request handling ----
+    def _draw(self):
+        with self._lock:
+            delay = max(0.0, self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms))
+            if self._random.random() < self.tail_rate:
+                delay += self.tail_ms
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return delay, "http_500"
+        if roll < self.error_rate + self.quota_rate:
+            return delay, "quota"
+        return delay, "ok"
+
+    def _handle(self, request) -> None:
+        url = urlparse(request.path)
+        endpoint = PATHS.get(url.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if endpoint is None:
+            self._send(request, 404, {"error": "unknown path"})
+            return
+        delay, outcome = self._draw()
+        time.sleep(delay / 1000.0)
+        if outcome == "http_500":
+            status, body = 500, {"error": "injected failure"}
+        elif outcome == "quota" and endpoint != "weather":
+            status, body = 200, {"status": "OVER_QUERY_LIMIT", "results": [], "routes": []}
+        elif endpoint in self.recorded:
+            status, body = 200, self.recorded[endpoint]
+        else:
+            status, body = 200, getattr(self, f"_{endpoint}")(params)
+        with self._lock:
+            self.calls[(endpoint, body.get("status", body.get("cod", status)))] += 1
+        self._send(request, status, body)
+
+    def _send(self, request, status, body) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    # ---- synthetic responses ----
+    def _geocode(self, params):
+        # stable pseudo-location per address, within ~5 km of BASE_LOCATION
+        digest = hashlib.sha256(params.get("address", "").encode("utf-8")).digest()
+        dlat = (digest[0] / 255.0 - 0.5) * 0.09
+        dlng = (digest[1] / 255.0 - 0.5) * 0.09
+        lat, lng = BASE_LOCATION[0] + dlat, BASE_LOCATION[1] + dlng
+        return {
+            "status": "OK",
+            "results": [{
+                "formatted_address": params.get("address", ""),
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+            }],
+        }
+
+    def _directions(self, params):
+        origin = _parse_point(params["origin"])
+        destination = _parse_point(params["destination"])
+        waypoints = [_parse_point(p) for p in params["waypoints"].split("|")] if params.get("waypoints") else []
+        points = [origin] + waypoints + [destination]
+        n_routes = self.max_alternatives if params.get("alternatives") == "true" and not waypoints else 1
+        routes = []
+        for k in range(n_routes):
+            coords = synthetic_path(points, self.polyline_points, wiggle=0.05 + 0.04 * k, phase=k * 1.3)
+            distance_m = int(round(cumulative_distances(coords)[-1] * 1000.0))
+            routes.append({
+                "summary": f"Synthetic Rd {k + 1}",
+                "legs": [{
+                    "distance": {"value": distance_m},
+                    "duration": {"value": int(round(distance_m / WALKING_SPEED_MPS))},
+                }],
+                "overview_polyline": {"points": encode_coords(coords)},
+            })
+        return {"status": "OK", "routes": routes}
+
+    def _weather(self, params):
+        return {
+            "cod": 200,
+            "name": "Benchmark Town",
+            "main": {"temp": 28.5, "humidity": 74},
+            "weather": [{"main": "Clouds"}],
+        }
@@ -0,0 +1,90 @@
+"""
+Import-time measurement for the app's startup path.
+
+Each module is imported in a fresh interpreter with ``python -X importtime`` and
+its cumulative import time is reported, split into what app.py imports on every
+run and what it defers until routes are drawn.
+
+    python benchmarks/import_time.py            # table
+    python benchmarks/import_time.py --json     # one JSON object, for tracking over time
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported at the top of app.py on every script run (utils.engine pulls in
+# utils.routes and utils.route_search)
+STARTUP_MODULES = [
+    "streamlit",
+    "utils.api_handler",
+    "utils.calculations",
+    "utils.engine",
+    "utils.metrics",
+]
+# imported only when the results section renders
+DEFERRED_MODULES = [
+    "folium",
+    "utils.map_renderer",
+    "utils.thumbnails",
+]
+
+
+def import_time_us(module: str) -> int:
+    # cumulative microseconds for `import module` in a fresh interpreter
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    for line in reversed(proc.stderr.splitlines()):
+        # "import time:  self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1].strip())
+    return 0
+
+
+def measure(repeat: int = 3) -> dict:
+    results = {}
+    for group, modules in (("startup", STARTUP_MODULES), ("deferred", DEFERRED_MODULES)):
+        results[group] = {}
+        for module in modules:
+            try:
+                results[group][module] = statistics.median(import_time_us(module) for _ in range(repeat)) / 1000.0
+            except RuntimeError as exc:
+                print(exc, file=sys.stderr)
+                results[group][module] = None
+    # a fresh interpreter importing the whole startup set at once (shared deps counted once)
+    startup = "; ".join(f"import {m}" for m in STARTUP_MODULES)
+    proc = subprocess.run([sys.executable, "-c", f"import time; t = time.perf_counter(); {startup}; print(time.perf_counter() - t)"],
+                          cwd=ROOT, capture_output=True, text=True)
+    results["startup_total_ms"] = float(proc.stdout.strip()) * 1000.0 if proc.returncode == 0 else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true", help="print a single JSON object")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module (median is reported)")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    if args.json:
+        print(json.dumps(results))
+        return
+    for group in ("startup", "deferred"):
+        print(f"{group} imports (cumulative ms, median of {args.repeat})")
+        for module, ms in results[group].items():
+            print(f"  {module:<24} {'failed' if ms is None else f'{ms:8.1f}'}")
+    total = results["startup_total_ms"]
+    print(f"startup set in one interpreter: {'failed' if total is None else f'{total:.1f} ms'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+End-to-end route generation benchmark against the local fake APIs (no network).
+
+Drives geocode_address -> fixed candidate search (get_directions + weather) ->
+route records, duplicate merging and ranking -> the consolidated folium map, for
+every combination of bearing count, alternatives and polyline size given, and
+reports p50/p95/p99 latency per stage, upstream calls per run and peak memory.
+
+    python benchmarks/pipeline.py
+    python benchmarks/pipeline.py --bearings 8 16 --points 100 1000 --runs 30 --error-rate 0.05
+    python benchmarks/pipeline.py --json > bench.json
+
+Caches live in a temporary directory and every run starts from a new address,
+so each run pays for its upstream calls (cold path). The fake server has no
+rate limits, so the process-wide token buckets and daily quotas are switched
+off unless --rate-limits is given; "rate_wait" is the time requests spent
+queued for a token, summed over each run's requests.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# must be set before utils.cache is imported
+os.environ.setdefault("WONDER_RUN_CACHE_DIR", tempfile.mkdtemp(prefix="wonder-run-bench-"))
+
+from fake_api import FakeApiServer  # noqa: E402
+
+STAGES = ("geocode", "directions", "rank", "map", "total", "rate_wait")
+PERCENTILES = (50, 95, 99)
+GOAL_TYPE = "Distance (km)"
+
+
+def limiter_wait_s():
+    # seconds requests have spent waiting for a rate-limit token so far
+    from utils.metrics import metrics
+
+    histograms = metrics.snapshot()["histograms"]
+    return sum(h["sum"] for key, h in histograms.items() if key.startswith("wonder_run_rate_limit_wait_seconds"))
+
+
+def run_once(run_id, n_bearings, alternatives, target_km, weight_kg=60.0):
+    # one generate click; returns seconds per stage
+    from utils.api_handler import geocode_address
+    from utils.calculations import dedupe_routes, rank_routes_top_k
+    from utils.map_renderer import render_routes_map
+    from utils.route_search import fixed_route_search
+    from utils.routes import routes_from_directions
+
+    timings = {}
+    waited = limiter_wait_s()
+    started = time.perf_counter()
+    geocode = geocode_address(f"Benchmark Start {run_id}", "fake-key")
+    timings["geocode"] = time.perf_counter() - started
+    if geocode is None:
+        return None
+    origin = (geocode["lat"], geocode["lng"])
+
+    t = time.perf_counter()
+    search = fixed_route_search(origin, target_km, "fake-key", "fake-weather-key",
+                                n_bearings=n_bearings, alternatives=alternatives)
+    timings["directions"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    routes = []
+    for candidate in search["candidates"]:
+        routes += routes_from_directions(candidate["index"], candidate["directions"], weight_kg)
+    routes = [routes[i] for i in dedupe_routes(routes, GOAL_TYPE, target_km)]
+    order = rank_routes_top_k(routes, GOAL_TYPE, target_km)
+    timings["rank"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    if routes:
+        render_routes_map(origin, routes, best_index=order[0]).get_root().render()
+    timings["map"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - started
+    timings["rate_wait"] = limiter_wait_s() - waited
+    return timings
+
+
+def run_scenario(server, n_bearings, alternatives, n_points, runs, target_km, run_ids):
+    server.polyline_points = n_points
+    server.reset_calls()
+    samples = {stage: [] for stage in STAGES}
+    failed = 0
+    for _ in range(runs):
+        timings = run_once(next(run_ids), n_bearings, alternatives, target_km)
+        if timings is None:
+            failed += 1
+            continue
+        for stage in STAGES:
+            samples[stage].append(timings[stage])
+    calls = server.reset_calls()
+
+    # one extra traced run for peak memory; tracemalloc would skew the timings above
+    tracemalloc.start()
+    run_once(next(run_ids), n_bearings, alternatives, target_km)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    server.reset_calls()
+
+    result = {
+        "bearings": n_bearings,
+        "alternatives": alternatives,
+        "polyline_points": n_points,
+        "runs": runs,
+        "failed_geocodes": failed,
+        "latency_ms": {
+            stage: {f"p{q}": float(np.percentile(values, q)) * 1000.0 for q in PERCENTILES} if values else None
+            for stage, values in samples.items()
+        },
+        "calls_per_run": {},
+        "peak_memory_mb": peak / (1024 * 1024),
+    }
+    for (endpoint, status), count in sorted(calls.items(), key=str):
+        result["calls_per_run"][f"{endpoint}:{status}"] = count / runs
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bearings", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--alternatives", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 1000], help="vertices per synthetic route")
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per scenario")
+    parser.add_argument("--target-km", type=float, default=5.0)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--tail-rate", type=float, default=0.02, help="share of slow outlier responses")
+    parser.add_argument("--tail-ms", type=float, default=1500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 responses")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="share of OVER_QUERY_LIMIT responses")
+    parser.add_argument("--recorded", help="directory of recorded geocode/directions/weather JSON bodies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the production token buckets and daily quotas (numbers then include throttling)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    import utils.api_handler as api_handler
+
+    if not args.rate_limits:
+        # measure the pipeline, not the limiter: no buckets, quotas only counted
+        api_handler.rate_governor.buckets.clear()
+        api_handler.rate_governor.quota.limits.clear()
+
+    alternatives = {"on": [True], "off": [False], "both": [False, True]}[args.alternatives]
+    server = FakeApiServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate,
+                           tail_ms=args.tail_ms, error_rate=args.error_rate, quota_rate=args.quota_rate,
+                           recorded_dir=args.recorded, seed=args.seed)
+    results = []
+    run_ids = itertools.count()
+    with server:
+        server.patch(api_handler)
+        # warm-up: imports and first-connection setup stay out of the numbers
+        run_once(next(run_ids), 2, False, args.target_km)
+        server.reset_calls()
+        for n_bearings, alt, n_points in itertools.product(args.bearings, alternatives, args.points):
+            results.append(run_scenario(server, n_bearings, alt, n_points, args.runs, args.target_km, run_ids))
+            if not args.json:
+                print_result(results[-1])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+def print_result(result):
+    print(f"bearings={result['bearings']} alternatives={result['alternatives']} "
+          f"points={result['polyline_points']} runs={result['runs']} "
+          f"peak={result['peak_memory_mb']:.1f} MB")
+    for stage, pct in result["latency_ms"].items():
+        if pct:
+            print(f"  {stage:<11}" + "".join(f" p{q}={pct[f'p{q}']:8.1f} ms" for q in PERCENTILES))
+    calls = ", ".join(f"{k}={v:.1f}" for k, v in result["calls_per_run"].items())
+    print(f"  calls/run   {calls}")
+    if result["failed_geocodes"]:
+        print(f"  failed geocodes: {result['failed_geocodes']}")
+
+
+if __name__ == "__main__":
+    main()
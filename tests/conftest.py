@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# must be set before utils.cache is imported: tests never touch the real .cache
+os.environ.setdefault("WONDER_RUN_CACHE_DIR", tempfile.mkdtemp(prefix="wonder-run-tests-"))
@@ -0,0 +1,107 @@
+import json
+import threading
+
+import pytest
+
+import utils.batch as batch
+from utils.batch import JsonlSink, ParquetSink, parse_row, process_row, read_rows, run_batch
+from utils.routes import Route
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_read_csv_and_jsonl_rows(tmp_path):
+    csv_path = write(tmp_path / "in.csv", "id,start_location,target_value,lat\na,Tugu, 5 ,\n,Malioboro,,\n")
+    assert list(read_rows(csv_path)) == [
+        {"id": "a", "start_location": "Tugu", "target_value": "5"},
+        {"start_location": "Malioboro", "id": "1"},
+    ]
+    jsonl_path = write(tmp_path / "in.jsonl", '{"id": 7, "lat": 1.5, "lng": 2}\n\n{"start_location": "x"}\n')
+    assert list(read_rows(jsonl_path)) == [{"id": 7, "lat": 1.5, "lng": 2}, {"start_location": "x", "id": "1"}]
+
+
+def test_parse_row():
+    args = parse_row({"id": "1", "lat": "-7.79", "lng": "110.37", "target_value": "3", "shape": "loop"})
+    assert args["origin"] == (-7.79, 110.37)
+    assert args["target_value"] == 3.0 and args["weight_kg"] == 60.0 and args["shape"] == "loop"
+    for bad in ({"id": "1"}, {"start_location": "x", "goal_type": "Steps"}, {"start_location": "x", "search": "?"},
+                {"start_location": "x", "target_value": "five"}):
+        with pytest.raises(ValueError):
+            parse_row(bad)
+
+
+def fake_generate(calls=None, fail_on=()):
+    route = Route("0-0", "_p~iF~ps|U", 5.0, 37.5, 310.8, "Jalan")
+
+    def generate_routes(start_location=None, origin=None, **kwargs):
+        if calls is not None:
+            calls.append(start_location)
+        if start_location in fail_on:
+            return {"error": "geocode", "origin": None, "geocode": None, "target_km": 5.0, "summary": "",
+                    "weather": None, "api_calls": 0, "stage_s": {}}
+        return {"error": None, "origin": (1.0, 2.0), "geocode": {"formatted_address": start_location},
+                "target_km": 5.0, "summary": "ok", "weather": None, "api_calls": 8, "stage_s": {"rank": 0.001},
+                "routes": [route], "route_order": [0]}
+    return generate_routes
+
+
+def test_process_row_records_failures(monkeypatch):
+    monkeypatch.setattr(batch, "generate_routes", fake_generate(fail_on={"nowhere"}))
+    ok = process_row({"id": "1", "start_location": "Tugu"}, "k", None)
+    assert ok["status"] == "ok" and ok["routes"][0]["route_id"] == "0-0" and ok["origin"] == [1.0, 2.0]
+    failed = process_row({"id": "2", "start_location": "nowhere"}, "k", None)
+    assert failed["status"] == "error" and failed["error"] == "geocode"
+    invalid = process_row({"id": "3"}, "k", None)
+    assert invalid["status"] == "error" and invalid["error"].startswith("ValueError")
+
+
+def test_jsonl_resume_skips_only_successful_rows(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(batch, "generate_routes", fake_generate(calls, fail_on={"B"}))
+    rows = write(tmp_path / "in.csv", "id,start_location\n1,A\n2,B\n3,C\n")
+    out = str(tmp_path / "out.jsonl")
+    assert run_batch(rows, out, "k", workers=2) == {"ok": 2, "error": 1, "skipped": 0}
+    # an interrupted write leaves a partial line behind; it is ignored
+    with open(out, "a", encoding="utf-8") as file:
+        file.write('{"id": "3", "sta')
+    assert JsonlSink.completed_ids(out) == {"1", "3"}
+    calls.clear()
+    assert run_batch(rows, out, "k", workers=2) == {"ok": 0, "error": 1, "skipped": 2}
+    assert calls == ["B"]
+    assert run_batch(rows, out, "k", resume=False)["skipped"] == 0
+
+
+def test_parquet_sink_parts_and_resume(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(batch, "PARQUET_ROWS_PER_FILE", 2)
+    monkeypatch.setattr(batch, "generate_routes", fake_generate(fail_on={"C"}))
+    rows = write(tmp_path / "in.jsonl", "".join(json.dumps({"id": i, "start_location": s}) + "\n"
+                                                for i, s in enumerate("ABCDE")))
+    out = str(tmp_path / "parts")
+    sink = ParquetSink(out, rows_per_file=2)
+    for row in read_rows(rows):
+        sink.write(process_row(row, "k", None))
+    sink.close()
+    parts = sorted((tmp_path / "parts").glob("part-*.parquet"))
+    assert len(parts) == 3
+    table = pq.read_table(parts[0])
+    assert table.column("best_distance_km").to_pylist() == [5.0, 5.0]
+    assert json.loads(table.column("routes")[0].as_py())[0]["route_id"] == "0-0"
+    # an unreadable part (e.g. half-written by another tool) is ignored
+    (tmp_path / "parts" / "part-99999.parquet").write_bytes(b"not parquet")
+    assert ParquetSink.completed_ids(out) == {"0", "1", "3", "4"}
+    assert run_batch(rows, out, "k", output_format="parquet") == {"ok": 0, "error": 1, "skipped": 4}
+
+
+def test_stop_event_stops_reading_new_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "generate_routes", fake_generate())
+    rows = write(tmp_path / "in.csv", "start_location\n" + "\n".join(f"p{i}" for i in range(50)) + "\n")
+    stop = threading.Event()
+    stop.set()
+    counts = run_batch(rows, str(tmp_path / "out.jsonl"), "k", workers=2, stop_event=stop)
+    assert counts == {"ok": 0, "error": 0, "skipped": 0}
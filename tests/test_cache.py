@@ -0,0 +1,83 @@
+import pytest
+
+import utils.cache as cache_module
+from utils.cache import SQLiteCache
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("ttl_s", 60)
+    kwargs.setdefault("max_entries", 100)
+    return SQLiteCache("test", path=str(tmp_path / "cache.sqlite"), **kwargs)
+
+
+def test_roundtrip_json_values(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("a", {"routes": [1, 2.5, "x"]})
+    assert cache.get("a") == {"routes": [1, 2.5, "x"]}
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_s=60)
+    cache.set("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.set("a", 1)
+    clock.now += 1
+    cache.set("b", 2)
+    clock.now += 1
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    clock.now += 1
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_persists_across_instances(tmp_path, clock):
+    make_cache(tmp_path).set("a", [1, 2])
+    assert make_cache(tmp_path).get("a") == [1, 2]
+
+
+def test_items_lists_live_entries_with_expiry(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_s=60)
+    cache.set("old", 1)
+    clock.now += 30
+    cache.set("new", 2)
+    clock.now += 40
+    assert cache.items() == [("new", 2, clock.now - 40 + 60)]
+
+
+def test_stale_entries_only_for_callers_that_allow_them(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_s=60, stale_s=300)
+    cache.set("a", 1)
+    clock.now += 120
+    assert cache.get("a") is None
+    assert cache.get("a", allow_stale=True) == 1
+    assert cache.items() == []
+    clock.now += 241
+    assert cache.get("a", allow_stale=True) is None
+    assert len(cache) == 0
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import utils.api_handler as api_handler
+
+
+def fake_directions(sleep_s, active, peak, lock):
+    def get_directions(origin, destination, api_key, alternatives=True, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(sleep_s)
+        with lock:
+            active[0] -= 1
+        return [{"distance_m": 1000, "destination": destination}]
+    return get_directions
+
+
+def drain(events):
+    out = {"directions": {}, "weather": [], "done": None}
+    for kind, idx, payload in events:
+        if kind == "directions":
+            out["directions"][idx] = payload
+        elif kind == "weather":
+            out["weather"].append(payload)
+        else:
+            out["done"] = payload
+    return out
+
+
+def test_max_workers_bounds_primary_requests(monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+    monkeypatch.setattr(api_handler, "get_directions", fake_directions(0.05, active, peak, lock))
+    destinations = [(0.0, i * 0.01) for i in range(6)]
+    out = drain(api_handler.stream_routes_with_deadline((0.0, 0.0), destinations, "k", max_workers=2, budget_s=5.0))
+    assert peak[0] == 2
+    assert sorted(out["directions"]) == list(range(6))
+    assert out["done"]["dropped"] == []
+
+
+def test_slow_weather_does_not_hold_the_batch(monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+    monkeypatch.setattr(api_handler, "get_directions", fake_directions(0.02, active, peak, lock))
+    monkeypatch.setattr(api_handler, "get_weather_by_coords", lambda **kwargs: time.sleep(2.0) or {"temp": 20})
+    started = time.perf_counter()
+    out = drain(api_handler.stream_routes_with_deadline((0.0, 0.0), [(0.0, 0.01)], "k", "w", budget_s=10.0))
+    assert time.perf_counter() - started < 1.0
+    assert out["weather"] == []
+    assert out["directions"][0] is not None
+
+
+def test_fast_weather_is_delivered(monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+    monkeypatch.setattr(api_handler, "get_directions", fake_directions(0.05, active, peak, lock))
+    monkeypatch.setattr(api_handler, "get_weather_by_coords", lambda **kwargs: {"temp": 20})
+    out = drain(api_handler.stream_routes_with_deadline((0.0, 0.0), [(0.0, 0.01)], "k", "w", budget_s=5.0))
+    assert out["weather"] == [{"temp": 20}]
+
+
+def test_unanswered_candidates_are_dropped_at_the_deadline(monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+    monkeypatch.setattr(api_handler, "get_directions", fake_directions(1.0, active, peak, lock))
+    monkeypatch.setattr(api_handler, "hedge_delay", lambda: 10.0)
+    out = drain(api_handler.stream_routes_with_deadline((0.0, 0.0), [(0.0, 0.01), (0.0, 0.02)], "k", budget_s=0.2))
+    assert out["directions"] == {}
+    assert out["done"]["dropped"] == [0, 1]
+
+
+def test_results_that_landed_before_the_deadline_survive_a_slow_consumer(monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+    monkeypatch.setattr(api_handler, "get_directions", fake_directions(0.05, active, peak, lock))
+    monkeypatch.setattr(api_handler, "hedge_delay", lambda: 10.0)
+    destinations = [(0.0, i * 0.01) for i in range(4)]
+    yielded = []
+    done = None
+    for kind, idx, payload in api_handler.stream_routes_with_deadline((0.0, 0.0), destinations, "k", budget_s=0.5):
+        if kind == "directions":
+            yielded.append(idx)
+            time.sleep(0.3)  # e.g. a provisional render
+        elif kind == "done":
+            done = payload
+    assert sorted(yielded) == [0, 1, 2, 3]
+    assert done["dropped"] == []
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from utils.calculations import (
+    KM_PER_DEG_LAT, PathIndex, dedupe_routes, hausdorff_distance, resample_path,
+)
+from utils.geometry import encode_coords
+
+ORIGIN = (-7.79, 110.37)
+
+
+def straight(bearing_east_km, north_km, n=20, offset_km=0.0):
+    # a straight path from ORIGIN (shifted north by offset_km) to the given end point
+    lat0 = ORIGIN[0] + offset_km / KM_PER_DEG_LAT
+    km_per_deg_lng = KM_PER_DEG_LAT * np.cos(np.radians(ORIGIN[0]))
+    t = np.linspace(0.0, 1.0, n)
+    return np.column_stack((lat0 + t * north_km / KM_PER_DEG_LAT, ORIGIN[1] + t * bearing_east_km / km_per_deg_lng))
+
+
+def route(coords, distance_km):
+    return {"polyline": encode_coords(coords), "distance_km": distance_km, "duration_min": distance_km * 7.5}
+
+
+def test_hausdorff_of_parallel_offset_paths():
+    a = straight(2.0, 0.0)
+    b = straight(2.0, 0.0, offset_km=0.05)
+    assert hausdorff_distance(a, b) == pytest.approx(0.05, rel=0.02)
+    assert hausdorff_distance(a, a) == 0.0
+    assert hausdorff_distance(a, b) == hausdorff_distance(b, a)
+
+
+def test_hausdorff_sees_a_detour():
+    a = straight(2.0, 0.0)
+    detour = np.concatenate((a[:10], [[ORIGIN[0] + 0.5 / KM_PER_DEG_LAT, a[10, 1]]], a[10:]))
+    assert hausdorff_distance(a, detour) == pytest.approx(0.5, rel=0.05)
+
+
+def test_resample_path_is_evenly_spaced():
+    path = np.array([(0.0, 0.0), (0.0, 0.001), (0.0, 0.01)])
+    samples = resample_path(path, 11)
+    assert len(samples) == 11
+    legs = np.diff(PathIndex(samples).cumulative)
+    np.testing.assert_allclose(legs, legs[0], rtol=1e-6)
+    np.testing.assert_allclose(samples[[0, -1]], path[[0, -1]])
+
+
+def test_near_duplicates_collapse_into_the_best_route():
+    routes = [
+        route(straight(2.0, 0.0), 2.3),                  # east
+        route(straight(2.0, 0.0, offset_km=0.03), 2.05),  # same street, closer to target
+        route(straight(0.0, 2.0), 2.4),                  # north
+        route(straight(-2.0, 0.0), 1.2),                 # west
+    ]
+    assert dedupe_routes(routes, "Distance (km)", 2.0) == [1, 2, 3]
+
+
+def test_threshold_controls_what_counts_as_duplicate():
+    routes = [route(straight(2.0, 0.0), 2.0), route(straight(2.0, 0.0, offset_km=0.2), 2.1)]
+    assert dedupe_routes(routes, "Distance (km)", 2.0) == [0, 1]
+    assert dedupe_routes(routes, "Distance (km)", 2.0, threshold_km=0.25) == [0]
+
+
+def test_dedupe_edge_cases():
+    assert dedupe_routes([], "Distance (km)", 2.0) == []
+    one = [route(straight(1.0, 0.0), 1.0)]
+    assert dedupe_routes(one, "Distance (km)", 2.0) == [0]
+    # routes without geometry are never merged
+    empty = [{"polyline": None, "distance_km": 2.0}, {"polyline": "", "distance_km": 2.0}]
+    assert dedupe_routes(empty, "Distance (km)", 2.0) == [0, 1]
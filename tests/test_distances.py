@@ -0,0 +1,88 @@
+from math import radians, sin, cos, asin, sqrt, atan2, degrees
+
+import numpy as np
+import pytest
+
+from utils.calculations import (
+    EARTH_R, cumulative_distances, destination_grid, destination_point, destination_points, haversine_distance, haversine_distances,
+    pairwise_distances, segment_distances,
+)
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    # the original per-pair implementation the vectorized one replaced
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return EARTH_R * 2 * asin(min(1, sqrt(a)))
+
+
+def scalar_destination(lat, lon, bearing_deg, distance_km):
+    lat1, lon1, bearing = radians(lat), radians(lon), radians(bearing_deg)
+    dr = distance_km / EARTH_R
+    lat2 = asin(sin(lat1) * cos(dr) + cos(lat1) * sin(dr) * cos(bearing))
+    lon2 = lon1 + atan2(sin(bearing) * sin(dr) * cos(lat1), cos(dr) - sin(lat1) * sin(lat2))
+    return degrees(lat2), (degrees(lon2) + 540) % 360 - 180
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-80, 80, size=(200, 2))
+    lon = rng.uniform(-180, 180, size=(200, 2))
+    # include identical and antipodal pairs
+    lat[0] = [10.0, 10.0]
+    lon[0] = [20.0, 20.0]
+    lat[1] = [0.0, 0.0]
+    lon[1] = [0.0, 180.0]
+    return lat, lon
+
+
+def test_vectorized_haversine_matches_scalar(points):
+    lat, lon = points
+    vectorized = haversine_distances(lat[:, 0], lon[:, 0], lat[:, 1], lon[:, 1])
+    expected = [scalar_haversine(a, b, c, d) for a, b, c, d in zip(lat[:, 0], lon[:, 0], lat[:, 1], lon[:, 1])]
+    np.testing.assert_allclose(vectorized, expected, rtol=1e-12, atol=1e-9)
+    assert haversine_distance(lat[5, 0], lon[5, 0], lat[5, 1], lon[5, 1]) == pytest.approx(expected[5])
+    assert vectorized[1] == pytest.approx(np.pi * EARTH_R)
+
+
+def test_haversine_broadcasts_one_to_many():
+    lats = np.array([-7.80, -7.79, -7.78])
+    lons = np.array([110.36, 110.37, 110.38])
+    d = haversine_distances(-7.79, 110.37, lats, lons)
+    assert d.shape == (3,)
+    assert d[1] == 0.0
+    assert d[0] == pytest.approx(scalar_haversine(-7.79, 110.37, -7.80, 110.36))
+
+
+def test_destination_points_match_scalar():
+    bearings = np.arange(0, 360, 45.0)
+    lats, lons = destination_points(-7.79, 110.37, bearings, 2.5)
+    for b, lat, lon in zip(bearings, lats, lons):
+        assert (lat, lon) == pytest.approx(scalar_destination(-7.79, 110.37, b, 2.5))
+    # and the point really is 2.5 km away
+    np.testing.assert_allclose(haversine_distances(-7.79, 110.37, lats, lons), 2.5, rtol=1e-9)
+    assert destination_point(0.0, 179.99, 90.0, 5.0)[1] < -179.9  # wraps across the antimeridian
+
+
+def test_destination_grid_matches_scalar():
+    bearings = np.arange(0, 360, 45.0)
+    radii = [0.5, 1.0, 2.5, 10.0]
+    lats, lons = destination_grid(-7.79, 110.37, bearings, radii)
+    assert lats.shape == lons.shape == (len(bearings), len(radii))
+    for i, b in enumerate(bearings):
+        for j, r in enumerate(radii):
+            assert (lats[i, j], lons[i, j]) == pytest.approx(destination_point(-7.79, 110.37, b, r), abs=1e-12)
+            assert (lats[i, j], lons[i, j]) == pytest.approx(scalar_destination(-7.79, 110.37, b, r), abs=1e-11)
+
+
+def test_path_distances():
+    coords = [(0.0, 0.0), (0.0, 0.01), (0.01, 0.01)]
+    legs = segment_distances(coords)
+    assert legs == pytest.approx([scalar_haversine(0, 0, 0, 0.01), scalar_haversine(0, 0.01, 0.01, 0.01)])
+    assert cumulative_distances(coords) == pytest.approx([0.0, legs[0], legs.sum()])
+    assert segment_distances([(1.0, 2.0)]).size == 0
+    matrix = pairwise_distances(coords)
+    assert matrix.shape == (3, 3)
+    np.testing.assert_allclose(matrix, matrix.T)
+    assert matrix[0, 2] == pytest.approx(scalar_haversine(0, 0, 0.01, 0.01))
@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+import utils.engine as engine
+from utils.engine import SHAPE_LOOP, SEARCH_ADAPTIVE, generate_routes, iter_generation, target_distance_km
+from utils.geometry import encode_coords
+from utils.metrics import metrics
+
+ORIGIN = (-7.79, 110.37)
+
+
+def leg(east_deg, north_deg=0.0, n=10):
+    return encode_coords([(ORIGIN[0] + north_deg * i / n, ORIGIN[1] + east_deg * i / n) for i in range(n + 1)])
+
+
+def fake_search(candidates, weather=None, dropped=()):
+    # stands in for the iter_*_routes generators: candidate events, weather, summary
+    def search(origin, target_km, api_key, weather_api_key=None, **kwargs):
+        for index, (bearing, directions) in enumerate(candidates):
+            yield "candidate", {"index": index, "bearing": bearing, "directions": directions}
+        if weather is not None:
+            yield "weather", weather
+        yield "summary", {"api_calls": len(candidates), "rounds": 1, "within_tolerance": 1, "dropped": list(dropped)}
+    return search
+
+
+def directions(distance_km, polyline):
+    return {"route_index": 0, "distance_m": distance_km * 1000.0, "duration_s": distance_km * 450.0,
+            "polyline": polyline, "summary": "Jalan"}
+
+
+@pytest.fixture
+def geocode(monkeypatch):
+    monkeypatch.setattr(engine, "geocode_address",
+                        lambda address, key: {"lat": ORIGIN[0], "lng": ORIGIN[1], "formatted_address": address.title()})
+
+
+def test_target_distance_for_each_goal():
+    assert target_distance_km("Distance (km)", 5, 60, 8) == 5.0
+    assert target_distance_km("Duration (minutes)", 30, 60, 8) == 4.0
+    assert target_distance_km("Calories", 310.8, 60, 8) == pytest.approx(5.0)
+
+
+def test_events_and_ranked_result(monkeypatch, geocode):
+    candidates = [
+        (0.0, [directions(5.0, leg(0.0, 0.045))]),     # north, on target
+        (90.0, [directions(3.0, leg(0.027))]),         # east, short
+        (180.0, None),                                 # failed
+        (270.0, [directions(5.4, leg(-0.049))]),       # west
+    ]
+    monkeypatch.setattr(engine, "iter_fixed_routes", fake_search(candidates, weather={"temp": 28}, dropped=[2]))
+    events = list(iter_generation("tugu", "Distance (km)", 5.0, 60.0, 8.0, "k", "w", fit_routes=False))
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["geocode", "routes", "routes", "routes", "result"]
+    result = events[-1][1]
+    assert result["error"] is None
+    assert result["origin"] == ORIGIN and result["geocode"]["formatted_address"] == "Tugu"
+    assert result["weather"] == {"temp": 28}
+    assert result["candidates"] == 4 and result["dropped_bearings"] == [180.0]
+    assert [result["routes"][i].distance_km for i in result["route_order"]] == [5.0, 5.4, 3.0]
+    assert result["best_index"] == result["route_order"][0]
+    assert result["outcomes"] == {"returned": 3, "dropped": 1, "merged": 0, "fitted": 0}
+    assert '"event": "generation"' in result["log_line"]
+    assert "search" in result["stage_s"] and "rank" in result["stage_s"]
+
+
+def test_off_target_routes_are_fitted(monkeypatch, geocode):
+    candidates = [(0.0, [directions(7.0, leg(0.0, 0.063))]), (90.0, [directions(3.0, leg(0.027))])]
+    monkeypatch.setattr(engine, "iter_fixed_routes", fake_search(candidates))
+    result = generate_routes("tugu", "Distance (km)", 5.0, 60.0, 8.0, "k")
+    assert result["outcomes"]["fitted"] == 2
+    assert sorted(r.distance_km for r in result["routes"]) == [5.0, 5.0]
+    assert "2 route(s) fitted" in result["summary"]
+
+
+def test_geocode_failure(monkeypatch):
+    monkeypatch.setattr(engine, "geocode_address", lambda address, key: None)
+    events = list(iter_generation("nowhere", "Distance (km)", 5.0, 60.0, 8.0, "k"))
+    assert [kind for kind, _ in events] == ["geocode", "result"]
+    assert events[-1][1]["error"] == "geocode"
+
+
+def test_no_routes(monkeypatch, geocode):
+    monkeypatch.setattr(engine, "iter_fixed_routes", fake_search([(0.0, None), (90.0, [])]))
+    result = generate_routes("tugu", "Distance (km)", 5.0, 60.0, 8.0, "k")
+    assert result["error"] == "no_routes" and result["routes"] == []
+
+
+def test_origin_skips_geocoding_and_mode_picks_the_search(monkeypatch):
+    def no_geocode(*args):
+        raise AssertionError("geocoded despite a given origin")
+    monkeypatch.setattr(engine, "geocode_address", no_geocode)
+    calls = []
+    for name in ("iter_fixed_routes", "iter_adaptive_routes", "iter_loop_routes"):
+        def search(*args, _name=name, **kwargs):
+            calls.append(_name)
+            return fake_search([(0.0, [directions(5.0, leg(0.0, 0.045))])])(*args, **kwargs)
+        monkeypatch.setattr(engine, name, search)
+    generate_routes(None, "Distance (km)", 5.0, 60.0, 8.0, "k", origin=ORIGIN, search_mode=SEARCH_ADAPTIVE)
+    generate_routes(None, "Distance (km)", 5.0, 60.0, 8.0, "k", origin=ORIGIN, shape=SHAPE_LOOP)
+    assert calls == ["iter_adaptive_routes", "iter_loop_routes"]
+
+
+def test_consumer_time_is_not_counted_as_search(monkeypatch, geocode):
+    candidates = [(b, [directions(5.0, leg(0.0, 0.045))]) for b in (0.0, 90.0, 180.0)]
+    monkeypatch.setattr(engine, "iter_fixed_routes", fake_search(candidates))
+    for kind, payload in iter_generation("tugu", "Distance (km)", 5.0, 60.0, 8.0, "k", fit_routes=False):
+        if kind == "routes":
+            with metrics.timer("provisional_render"):
+                time.sleep(0.05)
+        elif kind == "result":
+            result = payload
+    stages = result["stage_s"]
+    assert stages["provisional_render"] >= 0.15
+    assert stages["search"] < 0.05
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from utils.calculations import PathIndex, calculate_calories, haversine_distance
+from utils.geometry import encode_coords
+from utils.routes import Route, fit_route_to_distance
+
+# an L-shaped street: about 1 km east, then 1 km north (5 decimals, so the polyline is exact)
+CORNER = (-7.79, 110.37907)
+PATH = np.array([(-7.79, 110.37), CORNER, (-7.78101, 110.37907)])
+
+
+def make_route(distance_km=None, duration_min=None, summary="Jalan Test"):
+    length = PathIndex(PATH).length_km
+    distance_km = length if distance_km is None else distance_km
+    return Route("3-0", encode_coords(PATH), distance_km, duration_min or distance_km * 7.5, 100.0, summary)
+
+
+def test_path_index_lookup_and_truncate():
+    index = PathIndex(PATH)
+    first_leg = haversine_distance(*PATH[0], *PATH[1])
+    assert index.point_at(first_leg) == pytest.approx(CORNER)
+    assert index.point_at(first_leg / 2)[1] == pytest.approx((110.37 + CORNER[1]) / 2)
+    assert PathIndex(index.truncate(1.5)).length_km == pytest.approx(1.5, rel=1e-3)
+    assert PathIndex(index.out_and_back(1.0)).length_km == pytest.approx(1.0, rel=1e-3)
+    assert index.point_at(-1.0) == pytest.approx(tuple(PATH[0]))
+    assert index.point_at(99.0) == pytest.approx(tuple(PATH[-1]))
+
+
+def test_routes_within_tolerance_are_unchanged():
+    route = make_route()
+    assert fit_route_to_distance(route, route.distance_km * 1.05, 60.0) is route
+
+
+def test_overshooting_route_is_trimmed():
+    route = make_route()
+    fitted = fit_route_to_distance(route, 1.5, 60.0)
+    assert fitted.route_id == "3-0t"
+    assert fitted.distance_km == 1.5
+    assert fitted.summary == "Jalan Test (trimmed)"
+    assert fitted.calories == pytest.approx(calculate_calories(1.5, 60.0), abs=0.1)
+    # same pace as the original
+    assert fitted.duration_min == pytest.approx(route.duration_min * 1.5 / route.distance_km, abs=0.1)
+    assert PathIndex(fitted.coords).length_km == pytest.approx(1.5, rel=1e-3)
+    assert fitted.waypoints is None
+
+
+def test_short_route_becomes_out_and_back():
+    route = make_route()
+    target = route.distance_km * 1.5
+    fitted = fit_route_to_distance(route, target, 60.0)
+    assert fitted.route_id == "3-0b"
+    assert fitted.summary == "Jalan Test (out and back)"
+    coords = fitted.coords
+    np.testing.assert_allclose(coords[0], coords[-1], atol=1e-5)
+    assert PathIndex(coords).length_km == pytest.approx(target, rel=1e-3)
+    # the turnaround is the single waypoint, at half the target along the street
+    (turn,) = fitted.waypoints
+    assert turn == pytest.approx(PathIndex(PATH).point_at(target / 2.0), abs=1e-6)
+
+
+def test_reported_distance_scales_the_cut():
+    # the API says 2.4 km for a geometry of ~2 km: cuts happen in geometry km
+    route = make_route(distance_km=2.4)
+    fitted = fit_route_to_distance(route, 1.2, 60.0)
+    assert fitted.distance_km == 1.2
+    assert PathIndex(fitted.coords).length_km == pytest.approx(1.2 * PathIndex(PATH).length_km / 2.4, rel=1e-3)
+
+
+def test_routes_too_short_to_fit_are_unchanged():
+    route = make_route()
+    assert fit_route_to_distance(route, route.distance_km * 3, 60.0) is route
+    empty = Route("0-0", "", 0.0, 0.0, 0.0)
+    assert fit_route_to_distance(empty, 2.0, 60.0) is empty
@@ -0,0 +1,61 @@
+import numpy as np
+import polyline
+import pytest
+
+from utils.geometry import GeometryCache, _decode_array, decode_coords, encode_coords
+
+# Google's documented example
+EXAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+EXAMPLE_COORDS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def test_decode_matches_reference():
+    np.testing.assert_allclose(_decode_array(EXAMPLE), EXAMPLE_COORDS)
+    assert _decode_array("").shape == (0, 2)
+
+
+def test_encode_matches_reference():
+    assert encode_coords(EXAMPLE_COORDS) == EXAMPLE
+    assert encode_coords([]) == ""
+
+
+def test_roundtrip_random_paths():
+    rng = np.random.default_rng(1)
+    for n in (1, 2, 50, 1000):
+        coords = np.round(np.cumsum(rng.normal(0, 0.01, size=(n, 2)), axis=0) + [-7.79, 110.37], 5)
+        encoded = encode_coords(coords)
+        assert encoded == polyline.encode([tuple(c) for c in coords.tolist()])
+        np.testing.assert_allclose(_decode_array(encoded), coords, atol=1e-9)
+
+
+def test_precision_6_roundtrip():
+    coords = np.array([[51.123456, -0.654321], [51.2, -0.6]])
+    np.testing.assert_allclose(_decode_array(encode_coords(coords, precision=6), precision=6), coords, atol=1e-9)
+
+
+@pytest.mark.parametrize("bad", ["_p~iF~ps|U_", "abc é", " "])
+def test_invalid_polylines_raise(bad):
+    with pytest.raises((ValueError, UnicodeEncodeError)):
+        _decode_array(bad)
+
+
+def test_cache_returns_shared_read_only_arrays():
+    cache = GeometryCache()
+    first = cache.get(EXAMPLE)
+    assert cache.get(EXAMPLE) is first
+    assert not first.flags.writeable
+    assert cache.stats()["hits"] == 1
+    assert cache.get("_p~iF~ps|U_").shape == (0, 2)  # bad input decodes to an empty path
+
+
+def test_cache_stays_within_byte_budget():
+    coords = [encode_coords([(i * 0.001, 0.0), (i * 0.001, 0.001)]) for i in range(10)]
+    cache = GeometryCache(max_bytes=3 * 32)  # three 2-point paths
+    for c in coords:
+        cache.get(c)
+    assert len(cache) == 3 and cache.nbytes <= 96
+
+
+def test_decode_coords_handles_missing_input():
+    assert decode_coords(None).shape == (0, 2)
+    np.testing.assert_allclose(decode_coords(EXAMPLE), EXAMPLE_COORDS)
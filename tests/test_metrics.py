@@ -0,0 +1,128 @@
+import json
+import threading
+import urllib.request
+
+import pytest
+
+import utils.api_handler as api_handler
+from utils.metrics import MetricsRegistry, log_generation, metrics, start_metrics_server
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(buckets=(0.1, 1.0))
+
+
+def test_counters_and_histograms(registry):
+    registry.inc("requests_total", endpoint="geocode")
+    registry.inc("requests_total", 2, endpoint="geocode")
+    registry.observe("latency_seconds", 0.05, endpoint="geocode")
+    registry.observe("latency_seconds", 0.5, endpoint="geocode")
+    registry.observe("latency_seconds", 5.0, endpoint="geocode")
+    snap = registry.snapshot()
+    assert snap["counters"] == {'requests_total{endpoint="geocode"}': 3.0}
+    hist = snap["histograms"]['latency_seconds{endpoint="geocode"}']
+    assert hist["count"] == 3 and hist["sum"] == pytest.approx(5.55)
+    registry.reset()
+    assert registry.snapshot()["counters"] == {}
+
+
+def test_prometheus_rendering(registry):
+    registry.inc("wonder_run_generations_total", shape="out", search='say "hi"')
+    registry.observe("wonder_run_stage_seconds", 0.05, stage="rank")
+    registry.observe("wonder_run_stage_seconds", 0.5, stage="rank")
+    registry.register_collector(lambda: [("wonder_run_cache_hit_ratio", {"cache": "geocode"}, 0.75)])
+    text = registry.render_prometheus()
+    lines = text.splitlines()
+    assert "# TYPE wonder_run_generations_total counter" in lines
+    assert 'wonder_run_generations_total{search="say \\"hi\\"",shape="out"} 1' in lines
+    assert "# TYPE wonder_run_stage_seconds histogram" in lines
+    # buckets are cumulative and end with +Inf == count
+    assert 'wonder_run_stage_seconds_bucket{stage="rank",le="0.1"} 1' in lines
+    assert 'wonder_run_stage_seconds_bucket{stage="rank",le="1"} 2' in lines
+    assert 'wonder_run_stage_seconds_bucket{stage="rank",le="+Inf"} 2' in lines
+    assert 'wonder_run_stage_seconds_count{stage="rank"} 2' in lines
+    assert 'wonder_run_cache_hit_ratio{cache="geocode"} 0.75' in lines
+    assert text.endswith("\n")
+
+
+def test_failing_collector_does_not_break_export(registry):
+    def broken():
+        raise RuntimeError("boom")
+    registry.register_collector(broken)
+    registry.inc("x_total")
+    assert "x_total 1" in registry.render_prometheus()
+
+
+def test_collect_stages_is_per_thread(registry):
+    seen = {}
+
+    def other():
+        with registry.timer("elsewhere"):
+            pass
+
+    with registry.collect_stages() as stages:
+        with registry.timer("geocode"):
+            pass
+        with registry.timer("geocode"):
+            pass
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        with registry.collect_stages() as inner:
+            with registry.timer("rank"):
+                pass
+        seen.update(inner)
+    assert set(stages) == {"geocode", "rank"}
+    assert set(seen) == {"rank"}
+    assert registry.snapshot()["histograms"]['wonder_run_stage_seconds{stage="geocode"}']["count"] == 2
+
+
+def test_collectors_can_be_handed_to_workers(registry):
+    def worker(collectors):
+        with registry.collect_into(collectors), registry.timer("upstream"):
+            pass
+
+    with registry.collect_stages() as stages:
+        threads = [threading.Thread(target=worker, args=(registry.stage_collectors(),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert set(stages) == {"upstream"}
+    with registry.timer("after"):
+        pass
+    assert "after" not in stages
+
+
+def test_request_context_reaches_pool_threads():
+    seen = []
+
+    def work():
+        with metrics.timer("in_worker"):
+            seen.append(api_handler.current_priority())
+
+    with api_handler.request_priority(api_handler.PRIORITY_BACKGROUND), metrics.collect_stages() as stages:
+        context = api_handler._capture_context()
+        thread = threading.Thread(target=api_handler._call_in_context, args=(context, work))
+        thread.start()
+        thread.join()
+    assert seen == [api_handler.PRIORITY_BACKGROUND]
+    assert "in_worker" in stages
+
+
+def test_log_generation_returns_the_json_line():
+    line = log_generation({"api_calls": 8, "routes": {"returned": 3}})
+    record = json.loads(line)
+    assert record["event"] == "generation" and record["api_calls"] == 8
+
+
+def test_metrics_endpoint():
+    server = start_metrics_server(0)
+    assert start_metrics_server(0) is server  # only one server per process
+    metrics.inc("wonder_run_generations_total", shape="out", search="test")
+    port = server.server_address[1]
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+        body = response.read().decode("utf-8")
+        assert response.headers["Content-Type"].startswith("text/plain")
+    assert 'wonder_run_generations_total{search="test",shape="out"}' in body
@@ -0,0 +1,120 @@
+import heapq
+import math
+import os
+
+import numpy as np
+import pytest
+
+from utils.calculations import haversine_distance
+from utils.geometry import decode_coords
+from utils.offline_router import OfflineRouter
+from utils.route_search import loop_waypoints
+
+HERE = os.path.dirname(__file__)
+TINY = os.path.join(HERE, "fixtures", "tiny_walk.osm")
+SAMPLE = os.path.join(HERE, "..", "assets", "sample_walk.osm")
+
+
+@pytest.fixture(scope="module")
+def tiny():
+    return OfflineRouter(TINY)
+
+
+@pytest.fixture(scope="module")
+def sample():
+    return OfflineRouter(SAMPLE)
+
+
+def node(router, lat, lng):
+    # graph index of the node at exactly these coordinates
+    return int(np.flatnonzero((router.coords == (lat, lng)).all(axis=1))[0])
+
+
+def dijkstra(router, source, target):
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u == target:
+            return d
+        if d > dist[u]:
+            continue
+        for i in range(router.indptr[u], router.indptr[u + 1]):
+            v, nd = int(router.indices[i]), d + float(router.weights[i])
+            if nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return math.inf
+
+
+def test_loads_only_walkable_ways(tiny):
+    # nodes 1-8 (9 is on no way); 5 walkable segments + the detached one, both directions
+    assert tiny.stats()["nodes"] == 8
+    assert tiny.stats()["edges"] == 2 * 7
+    a, b = node(tiny, -7.79, 110.371), node(tiny, -7.789, 110.371)
+    assert b not in tiny.indices[tiny.indptr[a]:tiny.indptr[a + 1]].tolist()  # motorway / private
+
+
+def test_components(tiny):
+    labels = tiny.components()
+    island = {node(tiny, -7.789, 110.375), node(tiny, -7.789, 110.376)}
+    assert len(set(labels.tolist())) == 2
+    assert len({labels[i] for i in island}) == 1
+    assert sorted(tiny._largest_component().tolist()) == sorted(set(range(8)) - island)
+
+
+def test_nearest_node_snaps_to_the_main_network(tiny):
+    assert tiny.nearest_node(-7.789, 110.371) == node(tiny, -7.789, 110.371)
+    assert tiny.nearest_node(-7.7893, 110.3702) == node(tiny, -7.789, 110.370)
+    # the detached footway is never snapped to, even when it is closer
+    assert tiny.nearest_node(-7.789, 110.3751) == node(tiny, -7.789, 110.372)
+
+
+def test_nearest_node_outside_the_extract(tiny):
+    assert tiny.nearest_node(-6.2, 106.8) is None
+    assert tiny.nearest_node(-7.789, 110.3751, max_distance_m=100.0) is None
+
+
+def test_shortest_path_avoids_unwalkable_ways(tiny):
+    source, target = node(tiny, -7.79, 110.371), node(tiny, -7.789, 110.371)
+    path, dist = tiny.shortest_path(source, target)
+    expected = tiny.coords[path]
+    assert len(path) == 4  # 2 -> 1 -> 4 -> 5 (or the mirror image via 3 and 6)
+    legs = sum(haversine_distance(*a, *b) for a, b in zip(expected[:-1], expected[1:])) * 1000.0
+    assert dist == pytest.approx(legs)
+    assert tiny.shortest_path(source, source) == ([source], 0.0)
+
+
+def test_astar_matches_dijkstra(sample):
+    rng = np.random.default_rng(3)
+    nodes = sample._largest_component()
+    for source, target in rng.choice(nodes, size=(25, 2)).tolist():
+        _, dist = sample.shortest_path(source, target)
+        assert dist == pytest.approx(dijkstra(sample, source, target))
+
+
+def test_route_shape_and_summary(tiny):
+    routes = tiny.get_directions((-7.79, 110.37), (-7.79, 110.372))
+    assert len(routes) == 1
+    route = routes[0]
+    assert route["route_index"] == 0
+    assert route["summary"] == "Jalan Selatan"
+    assert route["distance_m"] == round(haversine_distance(-7.79, 110.37, -7.79, 110.372) * 1000.0)
+    assert route["duration_s"] == pytest.approx(route["distance_m"] * 3.6 / 5.0, abs=1)
+    np.testing.assert_allclose(decode_coords(route["polyline"]), [(-7.79, 110.37), (-7.79, 110.371), (-7.79, 110.372)])
+
+
+def test_unroutable_points_give_no_routes(tiny):
+    assert tiny.get_directions((-7.79, 110.37), (-6.2, 106.8)) == []
+
+
+def test_loops_return_to_the_start(sample):
+    center = tuple(sample.coords.mean(axis=0).tolist())
+    start = sample.coords[sample.nearest_node(*center)]
+    for corners in loop_waypoints(center, 2.0, n_loops=4):
+        routes = sample.get_directions(center, center, waypoints=corners)
+        assert len(routes) == 1
+        path = decode_coords(routes[0]["polyline"])
+        np.testing.assert_allclose(path[0], start, atol=1e-5)
+        np.testing.assert_allclose(path[-1], start, atol=1e-5)
+        assert routes[0]["distance_m"] > 500
@@ -0,0 +1,50 @@
+import time
+
+from utils.cache import PrefixIndex
+
+
+def test_exact_and_prefix_lookup():
+    index = PrefixIndex()
+    later = time.time() + 60
+    for key in ("tugu jogja", "tugu pal putih", "malioboro", "tugu"):
+        index.add(key, key.upper(), later)
+    assert index.get("malioboro") == "MALIOBORO"
+    assert index.get("malio") is None
+    assert [k for k, _ in index.prefix("tugu")] == ["tugu", "tugu jogja", "tugu pal putih"]
+    assert index.prefix("tugu j") == [("tugu jogja", "TUGU JOGJA")]
+    assert index.prefix("zzz") == []
+
+
+def test_prefix_respects_limit():
+    index = PrefixIndex()
+    later = time.time() + 60
+    for i in range(10):
+        index.add(f"jalan {i}", i, later)
+    assert len(index.prefix("jalan", limit=3)) == 3
+
+
+def test_expired_entries_are_skipped():
+    index = PrefixIndex()
+    index.add("stale", 1, time.time() - 1)
+    index.add("stale but", 2, time.time() + 60)
+    assert index.get("stale") is None
+    assert index.prefix("stale") == [("stale but", 2)]
+
+
+def test_readding_a_key_replaces_value():
+    index = PrefixIndex()
+    index.add("a", 1, time.time() + 60)
+    index.add("a", 2, time.time() + 60)
+    assert len(index) == 1
+    assert index.get("a") == 2
+
+
+def test_drops_earliest_expiring_entry_above_max():
+    index = PrefixIndex(max_entries=2)
+    now = time.time()
+    index.add("a", 1, now + 10)
+    index.add("b", 2, now + 30)
+    index.add("c", 3, now + 20)
+    assert len(index) == 2
+    assert index.get("a") is None
+    assert index.prefix("") == [("b", 2), ("c", 3)]
@@ -0,0 +1,40 @@
+import numpy as np
+
+from utils.calculations import rank_routes, rank_routes_top_k, score_routes, top_k_indices
+
+
+def route(distance_km, duration_min=30.0, calories=300.0, **extra):
+    return dict(distance_km=distance_km, duration_min=duration_min, calories=calories, **extra)
+
+
+ROUTES = [route(4.0, 24.0), route(5.2, 31.0), route(5.0, 35.0), route(7.0, 40.0), route(4.8, 28.0)]
+
+
+def test_ranks_by_distance_to_target():
+    assert rank_routes_top_k(ROUTES, "Distance (km)", 5.0) == [2, 4, 1, 0, 3]
+    assert rank_routes(ROUTES, "Distance (km)", 5.0, 60.0, 8.0) == 2
+
+
+def test_top_k_is_a_prefix_of_the_full_order():
+    full = rank_routes_top_k(ROUTES, "Distance (km)", 5.0)
+    for k in range(1, len(ROUTES) + 2):
+        assert rank_routes_top_k(ROUTES, "Distance (km)", 5.0, k=k) == full[:k]
+    assert rank_routes_top_k(ROUTES, "Distance (km)", 5.0, k=0) == []
+
+
+def test_goal_types_use_their_column():
+    assert rank_routes_top_k(ROUTES, "Duration (minutes)", 30.0, k=1) == [1]
+    routes = [route(5.0, calories=250.0), route(5.0, calories=410.0)]
+    assert rank_routes_top_k(routes, "Calories", 400.0, k=1) == [1]
+
+
+def test_ties_keep_original_order():
+    assert top_k_indices([1.0, 0.5, 0.5, 0.5, 2.0], k=2) == [1, 2]
+    assert top_k_indices([3.0, 3.0, 3.0]) == [0, 1, 2]
+
+
+def test_extra_objectives_are_weighted_fields():
+    routes = [route(5.0, overlap=0.8), route(5.0, overlap=0.1), route(5.0)]
+    scores = score_routes(routes, "Distance (km)", 5.0, weights={"target": 1.0, "overlap": 2.0})
+    np.testing.assert_allclose(scores, [1.6, 0.2, 0.0])
+    assert score_routes([], "Distance (km)", 5.0).size == 0
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from utils.api_handler import (
+    _quota_from_env, PRIORITY_BACKGROUND, PRIORITY_HEDGE, PRIORITY_INTERACTIVE, ApiClient, DailyQuota, RateGovernor, RateLimited,
+    TokenBucket, request_priority,
+)
+
+
+def test_bucket_bursts_then_refills():
+    bucket = TokenBucket(rate=50.0, burst=3)
+    assert all(bucket.acquire() for _ in range(3))
+    assert not bucket.acquire()
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1.0)
+    assert 0.01 < time.monotonic() - started < 0.5
+
+
+def test_bucket_serves_waiters_by_priority():
+    bucket = TokenBucket(rate=20.0, burst=1)
+    assert bucket.acquire()
+    order = []
+
+    def wait(priority):
+        if bucket.acquire(priority, timeout=2.0):
+            order.append(priority)
+
+    threads = [threading.Thread(target=wait, args=(PRIORITY_BACKGROUND,))]
+    threads[0].start()
+    while bucket.queued() < 1:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=wait, args=(PRIORITY_INTERACTIVE,)))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+    assert order == [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+
+
+def test_pause_empties_the_bucket_and_stops_refill():
+    bucket = TokenBucket(rate=1000.0, burst=5)
+    bucket.pause(0.2)
+    assert not bucket.acquire(timeout=0.1)
+    assert bucket.acquire(timeout=0.5)
+
+
+def test_quota_limit_and_interactive_reserve(tmp_path):
+    quota = DailyQuota({"geocode": 10, "weather": None}, reserve=0.2, path=str(tmp_path / "q.sqlite"))
+    assert sum(quota.try_consume("geocode", PRIORITY_BACKGROUND) for _ in range(10)) == 8
+    assert quota.try_consume("geocode", PRIORITY_INTERACTIVE)
+    assert quota.try_consume("geocode", PRIORITY_INTERACTIVE)
+    assert not quota.try_consume("geocode", PRIORITY_INTERACTIVE)
+    assert quota.used("geocode") == 10
+    assert all(quota.try_consume("weather", PRIORITY_HEDGE) for _ in range(50))
+    assert quota.used("weather") == 50
+
+
+def test_quota_persists_and_rolls_over_daily(tmp_path, monkeypatch):
+    path = str(tmp_path / "q.sqlite")
+    monkeypatch.setattr(DailyQuota, "today", staticmethod(lambda: "2026-01-01"))
+    DailyQuota({"geocode": 2}, path=path).try_consume("geocode")
+    quota = DailyQuota({"geocode": 2}, path=path)
+    assert quota.used("geocode") == 1
+    assert quota.try_consume("geocode") and not quota.try_consume("geocode")
+    monkeypatch.setattr(DailyQuota, "today", staticmethod(lambda: "2026-01-02"))
+    assert quota.used("geocode") == 0 and quota.try_consume("geocode")
+
+
+def test_quota_overrides_from_env(monkeypatch, caplog):
+    monkeypatch.delenv("WONDER_RUN_DAILY_QUOTA_GEOCODE", raising=False)
+    assert _quota_from_env("geocode", 2000) == 2000
+    monkeypatch.setenv("WONDER_RUN_DAILY_QUOTA_GEOCODE", "50")
+    assert _quota_from_env("geocode", 2000) == 50
+    monkeypatch.setenv("WONDER_RUN_DAILY_QUOTA_GEOCODE", "0")
+    assert _quota_from_env("geocode", 2000) is None
+    monkeypatch.setenv("WONDER_RUN_DAILY_QUOTA_GEOCODE", "5k")
+    assert _quota_from_env("geocode", 2000) == 2000
+    assert "WONDER_RUN_DAILY_QUOTA_GEOCODE" in caplog.text
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body if body is not None else {}
+
+    def json(self):
+        return self._body
+
+
+def make_client(tmp_path, monkeypatch, responses, quota=100):
+    governor = RateGovernor(limits={"geocode": (1000.0, 100)}, quotas={"geocode": quota})
+    governor.quota = DailyQuota({"geocode": quota}, path=str(tmp_path / "q.sqlite"))
+    client = ApiClient(max_retries=3, backoff_base_s=0.001, backoff_max_s=0.002, governor=governor)
+    replies = iter(responses)
+
+    def get(url, params=None, timeout=None):
+        reply = next(replies)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(client.session, "get", get)
+    sleeps = []
+    monkeypatch.setattr("utils.api_handler.time.sleep", sleeps.append)
+    return client, governor, sleeps
+
+
+def test_retries_charge_the_quota_once(tmp_path, monkeypatch):
+    client, governor, _ = make_client(tmp_path, monkeypatch, [
+        requests.ConnectionError(), FakeResponse(503), FakeResponse(200, {"status": "UNKNOWN_ERROR"}),
+        FakeResponse(200, {"status": "OK"}),
+    ])
+    assert client.get_json("geocode", "https://x", {}) == {"status": "OK"}
+    assert governor.quota.used("geocode") == 1
+
+
+def test_retry_after_is_honoured_within_the_priority_wait(tmp_path, monkeypatch):
+    client, governor, sleeps = make_client(tmp_path, monkeypatch, [
+        FakeResponse(429, headers={"Retry-After": "10"}), FakeResponse(200, {"status": "OK"}),
+    ])
+    governor.buckets["geocode"].pause = lambda seconds: None  # keep the test fast; only the sleep is checked
+    with request_priority(PRIORITY_BACKGROUND):
+        assert client.get_json("geocode", "https://x", {}) == {"status": "OK"}
+    assert sleeps == [10.0]
+
+
+def test_retry_after_longer_than_the_priority_wait_gives_up(tmp_path, monkeypatch):
+    client, governor, sleeps = make_client(tmp_path, monkeypatch, [
+        FakeResponse(429, headers={"Retry-After": "10"}), FakeResponse(200, {"status": "OK"}),
+    ])
+    with pytest.raises(RateLimited) as excinfo:
+        client.get_json("geocode", "https://x", {})
+    assert excinfo.value.reason == "retry_after"
+    assert sleeps == []
+    assert governor.buckets["geocode"].queued() == 0
+
+
+def test_spent_quota_is_not_admitted(tmp_path, monkeypatch):
+    client, _, _ = make_client(tmp_path, monkeypatch, [FakeResponse(200, {"status": "OK"})] * 2, quota=1)
+    client.get_json("geocode", "https://x", {})
+    with pytest.raises(RateLimited) as excinfo:
+        client.get_json("geocode", "https://x", {})
+    assert excinfo.value.reason == "quota"
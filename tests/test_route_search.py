@@ -0,0 +1,98 @@
+import pytest
+
+import utils.route_search as route_search
+from utils.calculations import destination_point, haversine_distance
+from utils.route_search import (
+    DEFAULT_ROAD_FACTOR, LOOP_APEX_DEG, adaptive_route_search, fetch_loop_routes, fixed_route_search, iter_loop_routes,
+    loop_waypoints,
+)
+
+ORIGIN = (-7.79, 110.37)
+
+
+def fake_stream(road_km_for, calls):
+    # stands in for stream_routes_with_deadline: road distance = road_km_for(straight-line km)
+    def stream(origin, destinations, api_key, weather_api_key=None, alternatives=True, budget_s=None, waypoints=None):
+        calls.append(list(destinations))
+        for idx, dest in enumerate(destinations):
+            km = road_km_for(haversine_distance(origin[0], origin[1], dest[0], dest[1]))
+            yield "directions", idx, [{"distance_m": km * 1000.0, "duration_s": km * 450.0}]
+        yield "done", None, {"dropped": [], "hedged": [], "elapsed_s": 0.0}
+    return stream
+
+
+def test_fixed_search_aims_road_distance_at_target(monkeypatch):
+    calls = []
+    monkeypatch.setattr(route_search, "stream_routes_with_deadline", fake_stream(lambda km: km * DEFAULT_ROAD_FACTOR, calls))
+    result = fixed_route_search(ORIGIN, 5.0, "k")
+    assert result["within_tolerance"] == 8
+    for dest in calls[0]:
+        assert haversine_distance(*ORIGIN, *dest) == pytest.approx(5.0 / DEFAULT_ROAD_FACTOR)
+
+
+def test_adaptive_search_stops_mid_round_once_enough_routes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(route_search, "stream_routes_with_deadline", fake_stream(lambda km: km * DEFAULT_ROAD_FACTOR, calls))
+    result = adaptive_route_search(ORIGIN, 5.0, "k", k=2)
+    assert len(calls) == 1
+    assert len(result["candidates"]) == 2  # the other two probes of the round were abandoned
+    assert result["rounds"] == 1 and result["within_tolerance"] == 2
+
+
+def test_adaptive_search_corrects_radius_from_observed_road_factor(monkeypatch):
+    calls = []
+    # streets here are much windier than the default assumption
+    monkeypatch.setattr(route_search, "stream_routes_with_deadline", fake_stream(lambda km: km * 2.0, calls))
+    result = adaptive_route_search(ORIGIN, 5.0, "k", k=3)
+    assert result["rounds"] == 2
+    assert result["within_tolerance"] >= 3
+    # second round probes at target / observed factor
+    assert haversine_distance(*ORIGIN, *calls[1][0]) == pytest.approx(2.5, rel=1e-6)
+
+
+def straight_km(points):
+    return sum(haversine_distance(*a, *b) for a, b in zip(points, points[1:]))
+
+
+def test_loop_waypoints_form_closed_triangles_of_the_target_length():
+    loops = loop_waypoints(ORIGIN, 6.0, n_loops=6)
+    assert len(loops) == 6
+    radius = haversine_distance(*ORIGIN, *loops[0][0])
+    for i, (a, b) in enumerate(loops):
+        # both corners at the same distance from the origin, on the loop's bearing and apex further
+        assert haversine_distance(*ORIGIN, *a) == pytest.approx(radius, abs=1e-3)
+        assert haversine_distance(*ORIGIN, *b) == pytest.approx(radius, abs=1e-3)
+        assert a == pytest.approx(destination_point(*ORIGIN, i * 60.0, radius), abs=1e-6)
+        assert b == pytest.approx(destination_point(*ORIGIN, i * 60.0 + LOOP_APEX_DEG, radius), abs=1e-6)
+        # origin -> A -> B -> origin, stretched by the road factor, comes back to the target
+        assert straight_km([ORIGIN, a, b, ORIGIN]) * DEFAULT_ROAD_FACTOR == pytest.approx(6.0, rel=1e-3)
+
+
+def test_loop_routes_send_one_closed_request_per_loop(monkeypatch):
+    requests = []
+
+    def stream(origin, destinations, api_key, weather_api_key=None, alternatives=True, budget_s=None, waypoints=None):
+        requests.append((list(destinations), alternatives, waypoints))
+        for idx, stops in enumerate(waypoints):
+            if idx == 3:
+                continue  # timed out
+            km = straight_km([origin] + list(stops) + [destinations[idx]]) * (1.0 if idx % 2 else DEFAULT_ROAD_FACTOR)
+            yield "directions", idx, [{"distance_m": km * 1000.0, "duration_s": km * 450.0}]
+        yield "weather", None, {"temp": 30}
+        yield "done", None, {"dropped": [3], "hedged": [], "elapsed_s": 0.0}
+
+    monkeypatch.setattr(route_search, "stream_routes_with_deadline", stream)
+    events = list(iter_loop_routes(ORIGIN, 5.0, "k", n_loops=4))
+    (destinations, alternatives, waypoints), = requests
+    assert destinations == [ORIGIN] * 4 and alternatives is False
+    assert waypoints == loop_waypoints(ORIGIN, 5.0, 4)
+    candidates = [payload for kind, payload in events if kind == "candidate"]
+    assert sorted(c["index"] for c in candidates) == [0, 1, 2, 3]
+    for c in candidates:
+        assert c["destination"] == ORIGIN and c["waypoints"] == waypoints[c["index"]]
+        for route in c["directions"] or []:
+            assert route["waypoints"] == waypoints[c["index"]]
+    assert next(c for c in candidates if c["index"] == 3)["directions"] is None
+    assert events[-1] == ("summary", {"api_calls": 4, "rounds": 1, "within_tolerance": 2, "dropped": [3]})
+    result = fetch_loop_routes(ORIGIN, 5.0, "k", n_loops=4)
+    assert result["weather"] == {"temp": 30} and len(result["candidates"]) == 4
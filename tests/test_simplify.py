@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from utils.calculations import pairwise_distances
+from utils.map_renderer import simplify_coords, zoom_tolerance_m
+from utils.metrics import metrics
+
+
+def test_collinear_points_collapse_to_endpoints():
+    line = np.column_stack((np.linspace(-7.80, -7.78, 50), np.full(50, 110.37)))
+    simplified, removed = simplify_coords(line, tolerance_m=1.0)
+    np.testing.assert_array_equal(simplified, line[[0, -1]])
+    assert removed == 48
+
+
+def test_corners_are_kept():
+    path = [(0.0, 0.0), (0.0, 0.005), (0.0, 0.01), (0.005, 0.01), (0.01, 0.01)]
+    simplified, removed = simplify_coords(path, tolerance_m=1.0)
+    np.testing.assert_array_equal(simplified, [(0.0, 0.0), (0.0, 0.01), (0.01, 0.01)])
+    assert removed == 2
+
+
+@pytest.mark.parametrize("tolerance_m", [0.5, 5.0, 50.0])
+def test_dropped_vertices_stay_within_tolerance(tolerance_m):
+    rng = np.random.default_rng(2)
+    path = np.cumsum(rng.normal(0, 0.0003, size=(400, 2)), axis=0) + [-7.79, 110.37]
+    simplified, removed = simplify_coords(path, tolerance_m=tolerance_m)
+    assert removed == len(path) - len(simplified)
+    np.testing.assert_array_equal(simplified[[0, -1]], path[[0, -1]])
+    # every original vertex lies near the simplified line (checked against a densified copy)
+    dense = np.concatenate([np.linspace(a, b, 200) for a, b in zip(simplified[:-1], simplified[1:])])
+    assert pairwise_distances(path, dense).min(axis=1).max() * 1000.0 <= tolerance_m * 1.05
+
+
+def test_short_paths_unchanged():
+    for path in ([], [(1.0, 2.0)], [(1.0, 2.0), (1.1, 2.1)]):
+        simplified, removed = simplify_coords(path)
+        assert len(simplified) == len(path) and removed == 0
+
+
+def test_zoom_tolerance_halves_per_zoom_level():
+    assert zoom_tolerance_m(16, 0.0) == pytest.approx(zoom_tolerance_m(15, 0.0) / 2)
+    assert zoom_tolerance_m(15, 60.0) == pytest.approx(zoom_tolerance_m(15, 0.0) / 2)
+
+
+def test_removed_vertices_are_counted():
+    before = metrics.snapshot()["counters"].get('wonder_run_simplify_vertices_total{outcome="removed"}', 0.0)
+    line = np.column_stack((np.linspace(0, 0.01, 10), np.zeros(10)))
+    simplify_coords(line, tolerance_m=1.0)
+    after = metrics.snapshot()["counters"]['wonder_run_simplify_vertices_total{outcome="removed"}']
+    assert after - before == 8
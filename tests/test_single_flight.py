@@ -0,0 +1,145 @@
+import threading
+import time
+
+import pytest
+
+import utils.api_handler as api
+from utils.api_handler import (
+    PRIORITY_BACKGROUND, PRIORITY_HEDGE, PRIORITY_INTERACTIVE, SingleFlight, SingleFlightTimeout, request_priority,
+)
+
+WAITS = {PRIORITY_INTERACTIVE: 2.0, PRIORITY_BACKGROUND: 2.0, PRIORITY_HEDGE: 0.0}
+
+
+def run_leader(flight, release, func=None, priority=PRIORITY_INTERACTIVE, key=("k",)):
+    # starts a leader that blocks until release is set; returns (thread, results)
+    calls, results = [], []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return func() if func else {"value": [1]}
+
+    def lead():
+        with request_priority(priority):
+            try:
+                results.append(flight.do("ep", key, slow))
+            except Exception as exc:
+                results.append(exc)
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    while not calls:
+        time.sleep(0.001)
+    return thread, calls, results
+
+
+def join(flight, results, priority=PRIORITY_INTERACTIVE, func=lambda: "own call", key=("k",)):
+    def follow():
+        with request_priority(priority):
+            try:
+                results.append(flight.do("ep", key, func))
+            except Exception as exc:
+                results.append(exc)
+    thread = threading.Thread(target=follow)
+    thread.start()
+    return thread
+
+
+def test_followers_share_one_call_and_get_their_own_copy():
+    flight, release = SingleFlight(max_wait_s=WAITS), threading.Event()
+    leader, calls, results = run_leader(flight, release)
+    followers = [join(flight, results, func=lambda: pytest.fail("ran twice")) for _ in range(3)]
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"value": [1]}] * 4
+    assert len({id(result) for result in results}) == 4
+    results[1]["value"].append(2)
+    assert results[0] == {"value": [1]}
+    assert flight.in_flight() == 0
+
+
+def test_leader_error_reaches_every_follower():
+    flight, release = SingleFlight(max_wait_s=WAITS), threading.Event()
+
+    def boom():
+        raise ValueError("upstream broke")
+
+    leader, _, results = run_leader(flight, release, func=boom)
+    follower = join(flight, results)
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert [type(result) for result in results] == [ValueError, ValueError]
+
+
+def test_follower_waits_for_one_attempt_of_its_own_call():
+    flight = SingleFlight(timeout_s=5.0, max_wait_s={PRIORITY_INTERACTIVE: 0.05}, request_timeouts={"ep": (0.05, 0.3)})
+    assert flight.follower_wait_s("ep", PRIORITY_INTERACTIVE) == pytest.approx(0.4)
+    # a leader slower than the token wait but within the request timeout still serves the follower
+    release = threading.Event()
+    leader, calls, results = run_leader(flight, release)
+    follower = join(flight, results)
+    time.sleep(0.2)
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(calls) == 1 and results == [{"value": [1]}] * 2
+    # a leader stuck past it does not hold the follower any longer
+    release = threading.Event()
+    leader, _, results = run_leader(flight, release)
+    started = time.monotonic()
+    join(flight, results).join()
+    assert isinstance(results[0], SingleFlightTimeout)
+    assert time.monotonic() - started < 1.0
+    release.set()
+    leader.join()
+
+
+def test_callers_that_may_not_wait_never_coalesce():
+    flight, release = SingleFlight(max_wait_s=WAITS), threading.Event()
+    assert flight.follower_wait_s("ep", PRIORITY_HEDGE) == 0.0
+    first, calls, results = run_leader(flight, release, priority=PRIORITY_HEDGE)
+    second, second_calls, second_results = run_leader(flight, release, priority=PRIORITY_HEDGE)
+    assert flight.in_flight() == 0
+    release.set()
+    first.join()
+    second.join()
+    assert len(calls) == len(second_calls) == 1
+    assert results == second_results == [{"value": [1]}]
+
+
+def test_interactive_callers_do_not_join_background_flights():
+    flight, release = SingleFlight(max_wait_s=WAITS), threading.Event()
+    leader, _, results = run_leader(flight, release, priority=PRIORITY_BACKGROUND)
+    join(flight, results, priority=PRIORITY_INTERACTIVE).join()
+    release.set()
+    leader.join()
+    assert results == ["own call", {"value": [1]}]
+
+
+def test_background_callers_join_interactive_flights():
+    flight, release = SingleFlight(max_wait_s=WAITS), threading.Event()
+    leader, calls, results = run_leader(flight, release, priority=PRIORITY_INTERACTIVE)
+    follower = join(flight, results, priority=PRIORITY_BACKGROUND)
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(calls) == 1 and results == [{"value": [1]}] * 2
+
+
+def test_timed_out_geocode_falls_back_to_stale_cache(monkeypatch):
+    monkeypatch.setattr(api, "lookup_cached_address",
+                        lambda address, allow_stale=False: {"lat": 1.0, "lng": 2.0} if allow_stale else None)
+
+    def timeout(*args, **kwargs):
+        raise SingleFlightTimeout("slow")
+
+    monkeypatch.setattr(api.single_flight, "do", timeout)
+    assert api.geocode_address("Tugu", "key") == {"lat": 1.0, "lng": 2.0}
+    assert api.geocode_address("Tugu", "key", use_cache=False) is None
@@ -0,0 +1,73 @@
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+import utils.thumbnails as thumbnails
+from utils.geometry import encode_coords
+from utils.thumbnails import DEFAULT_STYLE, get_route_thumbnail, prune_thumbnails, render_thumbnail
+
+ROUTE = [(-7.79, 110.37), (-7.785, 110.37), (-7.785, 110.376), (-7.79, 110.376)]
+
+
+def pixels(png):
+    image = Image.open(io.BytesIO(png))
+    assert image.format == "PNG"
+    return np.asarray(image.convert("RGB")).astype(int)
+
+
+def has_color(image, hex_color, tolerance=40):
+    rgb = np.array([int(hex_color[i:i + 2], 16) for i in (1, 3, 5)])
+    return bool((np.abs(image - rgb).sum(axis=2) < tolerance).any())
+
+
+def test_render_draws_route_and_start_marker():
+    image = pixels(render_thumbnail(ROUTE, style={"width": 200, "height": 150}))
+    assert image.shape == (150, 200, 3)
+    assert has_color(image, DEFAULT_STYLE["line_color"])
+    assert has_color(image, DEFAULT_STYLE["start_color"])
+    # the route is fitted inside the padding
+    pad = DEFAULT_STYLE["padding"] // 2
+    assert not has_color(image[:pad], DEFAULT_STYLE["line_color"])
+
+
+def test_render_handles_empty_and_single_point_routes():
+    assert pixels(render_thumbnail([])).shape == (300, 400, 3)
+    assert has_color(pixels(render_thumbnail([(-7.79, 110.37)])), DEFAULT_STYLE["start_color"])
+
+
+def test_second_call_is_served_from_disk(tmp_path, monkeypatch):
+    polyline = encode_coords(ROUTE)
+    first = get_route_thumbnail(polyline, origin=ROUTE[0], cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.png"))) == 1
+
+    def no_render(*args, **kwargs):
+        raise AssertionError("rendered again despite a cached file")
+
+    monkeypatch.setattr(thumbnails, "render_thumbnail", no_render)
+    assert get_route_thumbnail(polyline, origin=ROUTE[0], cache_dir=str(tmp_path)) == first
+    # a different style is a different file
+    monkeypatch.undo()
+    get_route_thumbnail(polyline, origin=ROUTE[0], style={"line_color": "#000000"}, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.png"))) == 2
+
+
+def test_prune_drops_old_then_least_recently_used(tmp_path):
+    now = time.time()
+    for i, age in enumerate([10, 20, 30, 40, 30 * 24 * 3600]):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(b"png")
+        os.utime(path, (now - age, now - age))
+    (tmp_path / "keep.tmp").write_bytes(b"partial")
+    assert prune_thumbnails(str(tmp_path), max_files=3, max_age_s=24 * 3600) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["0.png", "1.png", "2.png", "keep.tmp"]
+
+
+def test_writes_trigger_pruning(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_PRUNE_EVERY", 1)
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_MAX_FILES", 2)
+    for i in range(4):
+        get_route_thumbnail(encode_coords(ROUTE[:2 + i % 3]), origin=(-7.79, 110.37 + i), cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.png"))) == 2
@@ -1,19 +1,677 @@
+import copy
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional, Tuple, List, Dict
 import polyline
+from utils.cache import SQLiteCache, PrefixIndex, CACHE_DB_PATH
+from utils.metrics import metrics
+
+logger = logging.getLogger("wonder_run.api")
 
 GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
 OWM_URL = "https://api.openweathermap.org/data/2.5/weather"
 
-def geocode_address(address: str, api_key: str) -> Optional[dict]:
+# upper bound on upstream requests in flight for a single generation
+MAX_CONCURRENT_REQUESTS = 8
+
+# Directions cache: origin/destination are snapped to a grid of this many degrees
+# (0.0005 deg is roughly 55 m), so nearby starts share one cached response
+DIRECTIONS_CACHE_GRID_DEG = 0.0005
+DIRECTIONS_CACHE_TTL_S = 7 * 24 * 3600
+DIRECTIONS_CACHE_MAX_ENTRIES = 20000
+# expired directions stay usable this long when upstream is rate limited
+DIRECTIONS_CACHE_STALE_S = 30 * 24 * 3600
+
+# Geocode cache: keyed by the normalized address string
+GEOCODE_CACHE_TTL_S = 30 * 24 * 3600
+GEOCODE_CACHE_MAX_ENTRIES = 5000
+GEOCODE_CACHE_STALE_S = 90 * 24 * 3600
+
+# Weather cache: keyed by coordinates rounded to WEATHER_CACHE_GRID_DEG (~1 km)
+WEATHER_CACHE_GRID_DEG = 0.01
+WEATHER_CACHE_TTL_S = 10 * 60
+WEATHER_CACHE_STALE_S = 6 * 3600
+WEATHER_CACHE_MAX_ENTRIES = 2000
+
+# Shared HTTP client: one keep-alive connection pool for every upstream call
+HTTP_POOL_SIZE = 16
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_BASE_S = 0.25
+HTTP_BACKOFF_MAX_S = 4.0
+# (connect, read) timeouts in seconds per endpoint
+ENDPOINT_TIMEOUTS = {
+    "geocode": (3.05, 10),
+    "directions": (3.05, 10),
+    "weather": (3.05, 8),
+}
+RETRYABLE_HTTP_STATUS = {429, 500, 502, 503, 504}
+# Google puts rate limiting and transient server errors in the JSON body with HTTP 200
+RETRYABLE_API_STATUS = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+# Process-wide rate limiting. Requests are admitted by priority: interactive
+# clicks first, batch jobs next, speculative hedges only when a token is free.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_HEDGE = 2
+# (sustained requests per second, burst) per endpoint, shared by every session
+RATE_LIMITS = {
+    "geocode": (20.0, 40),
+    "directions": (20.0, 40),
+    "weather": (1.0, 10),
+}
+# how long a request may queue for a token before it gives up, by priority
+RATE_LIMIT_MAX_WAIT_S = {PRIORITY_INTERACTIVE: 3.0, PRIORITY_BACKGROUND: 30.0, PRIORITY_HEDGE: 0.0}
+# a bucket pauses this long after OVER_QUERY_LIMIT / HTTP 429 (unless Retry-After says otherwise)
+OVER_LIMIT_PAUSE_S = 2.0
+# requests per UTC day, counted in the cache database across restarts and processes;
+# override with WONDER_RUN_DAILY_QUOTA_<ENDPOINT> (0 disables the limit)
+def _quota_from_env(endpoint: str, default: int) -> Optional[int]:
+    # a malformed override falls back to the default instead of failing at import
+    name = f"WONDER_RUN_DAILY_QUOTA_{endpoint.upper()}"
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value) or None
+    except ValueError:
+        logger.warning("ignoring %s=%r (not an integer), using %d", name, value, default)
+        return default
+
+
+DAILY_QUOTAS = {
+    endpoint: _quota_from_env(endpoint, default)
+    for endpoint, default in (("geocode", 2000), ("directions", 10000), ("weather", 30000))
+}
+# share of each daily quota only interactive requests may use
+QUOTA_INTERACTIVE_RESERVE = 0.1
+
+# Concurrent identical requests (same place, same moment, several sessions)
+# share one upstream call; callers joining a call give up after this long
+SINGLE_FLIGHT_TIMEOUT_S = 20.0
+
+# Deadline-aware generation: total time budget per click, and hedging of slow
+# directions calls (a duplicate is sent once a call is slower than the observed p95)
+GENERATION_BUDGET_S = 12.0
+HEDGE_DEFAULT_DELAY_S = 2.0
+HEDGE_MIN_SAMPLES = 20
+MAX_HEDGES = 3
+# once every directions call has settled the weather gets this much longer, then the
+# click goes ahead without it (a late answer still lands in the weather cache)
+WEATHER_GRACE_S = 0.25
+
+# Optional offline routing: point this at a local .osm / .osm.pbf extract and
+# get_directions routes on it (utils.offline_router) instead of calling Google
+OSM_EXTRACT_PATH = os.environ.get("WONDER_RUN_OSM_EXTRACT")
+
+_directions_cache = None
+_geocode_cache = None
+_weather_cache = None
+_geocode_index = None
+_local_router = None
+_local_router_lock = threading.Lock()
+
+class RateLimited(Exception):
+    """
+    Raised by ApiClient.get_json when a request is not admitted (no token in
+    time, the daily quota is spent, or upstream's Retry-After is longer than
+    the caller may wait); callers fall back to cached answers.
+    """
+
+    def __init__(self, endpoint: str, reason: str):
+        super().__init__(f"{endpoint} request not admitted ({reason})")
+        self.endpoint = endpoint
+        self.reason = reason
+
+
+_request_context = threading.local()
+
+
+@contextmanager
+def request_priority(priority: int):
+    # upstream calls made by this thread inside the block use this priority
+    previous = current_priority()
+    _request_context.priority = priority
+    try:
+        yield
+    finally:
+        _request_context.priority = previous
+
+
+def current_priority() -> int:
+    return getattr(_request_context, "priority", PRIORITY_INTERACTIVE)
+
+
+def _capture_context(priority: int = None) -> tuple:
+    # what a pool thread needs to act for the submitting thread: its request
+    # priority (unless overridden) and its per-generation stage collectors
+    return (current_priority() if priority is None else priority, metrics.stage_collectors())
+
+
+def _call_in_context(context: tuple, func, *args, **kwargs):
+    # runs func in a pool thread under a context from _capture_context
+    priority, collectors = context
+    with request_priority(priority), metrics.collect_into(collectors):
+        return func(*args, **kwargs)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with priority admission.
+
+    Waiting requests form a priority queue: only the head of the queue may take
+    the next token, so a saturated bucket serves interactive requests before
+    background ones instead of whoever polls first.
+
+    Args:
+        rate: Tokens added per second
+        burst: Bucket capacity
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, timeout: float = 0.0) -> bool:
+        # True once a token is taken; False if none could be had within timeout seconds
+        deadline = time.monotonic() + timeout
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    at_head = self._waiters[0] == entry
+                    if at_head and self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return True
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return False
+                    if at_head:
+                        next_token = max(self._paused_until - now, 0.0) + (1.0 - self._tokens) / self.rate
+                        remaining = min(remaining, next_token)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        # upstream said slow down: empty the bucket and stop refilling for a while
+        with self._cond:
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def queued(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+
+class DailyQuota:
+    """
+    Per-endpoint request counter for the current UTC day, stored in the cache
+    database so it survives restarts and is shared by processes on one host.
+
+    Args:
+        limits: Mapping endpoint -> requests per day (None: count only)
+        reserve: Share of each limit that only interactive requests may use
+        path: SQLite file path (default: CACHE_DB_PATH)
+    """
+
+    def __init__(self, limits: Dict[str, Optional[int]], reserve: float = QUOTA_INTERACTIVE_RESERVE, path: str = None):
+        self.limits = dict(limits)
+        self.reserve = reserve
+        self.path = path or CACHE_DB_PATH
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            import sqlite3
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_quota ("
+                "endpoint TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (endpoint, day))"
+            )
+        return self._conn
+
+    @staticmethod
+    def today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def try_consume(self, endpoint: str, priority: int = PRIORITY_INTERACTIVE) -> bool:
+        # counts one request; False (and nothing counted) once the day's allowance is spent
+        limit = self.limits.get(endpoint)
+        if limit is not None and priority != PRIORITY_INTERACTIVE:
+            limit = int(limit * (1.0 - self.reserve))
+        day = self.today()
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR IGNORE INTO api_quota (endpoint, day, used) VALUES (?, ?, 0)", (endpoint, day))
+            if limit is None:
+                db.execute("UPDATE api_quota SET used = used + 1 WHERE endpoint = ? AND day = ?", (endpoint, day))
+                return True
+            # a single conditional UPDATE, so concurrent processes cannot overshoot the limit
+            cur = db.execute(
+                "UPDATE api_quota SET used = used + 1 WHERE endpoint = ? AND day = ? AND used < ?", (endpoint, day, limit)
+            )
+            return cur.rowcount == 1
+
+    def used(self, endpoint: str) -> int:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT used FROM api_quota WHERE endpoint = ? AND day = ?", (endpoint, self.today())
+            ).fetchone()
+        return row[0] if row else 0
+
+
+class RateGovernor:
+    """
+    Admission control in front of every upstream request: a token bucket per
+    endpoint for the request rate plus the persisted daily quota.
+
+    Args:
+        limits: Mapping endpoint -> (requests per second, burst)
+        quotas: Mapping endpoint -> requests per UTC day (None: unlimited)
+        max_wait_s: Mapping priority -> longest wait for a token
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None, quotas: Dict[str, Optional[int]] = None,
+                 max_wait_s: Dict[int, float] = None):
+        limits = RATE_LIMITS if limits is None else limits
+        self.buckets = {endpoint: TokenBucket(rate, burst) for endpoint, (rate, burst) in limits.items()}
+        self.quota = DailyQuota(DAILY_QUOTAS if quotas is None else quotas)
+        self.max_wait_s = RATE_LIMIT_MAX_WAIT_S if max_wait_s is None else max_wait_s
+
+    def admit(self, endpoint: str, priority: int = None, charge_quota: bool = True) -> None:
+        # returns once the request may be sent; raises RateLimited otherwise. Retries of
+        # one logical request take a token each but pass charge_quota=False
+        priority = current_priority() if priority is None else priority
+        bucket = self.buckets.get(endpoint)
+        if bucket is not None:
+            started = time.perf_counter()
+            admitted = bucket.acquire(priority, self.max_wait_s.get(priority, 0.0))
+            metrics.observe("wonder_run_rate_limit_wait_seconds", time.perf_counter() - started, endpoint=endpoint)
+            if not admitted:
+                metrics.inc("wonder_run_rate_limited_total", endpoint=endpoint, reason="rate", priority=priority)
+                raise RateLimited(endpoint, "rate")
+        if charge_quota and not self.quota.try_consume(endpoint, priority):
+            metrics.inc("wonder_run_rate_limited_total", endpoint=endpoint, reason="quota", priority=priority)
+            raise RateLimited(endpoint, "quota")
+
+    def wait_allowed(self, endpoint: str, seconds: float, priority: int = None) -> bool:
+        # whether a request of this priority may sit out an upstream Retry-After
+        priority = current_priority() if priority is None else priority
+        if seconds <= self.max_wait_s.get(priority, 0.0):
+            return True
+        metrics.inc("wonder_run_rate_limited_total", endpoint=endpoint, reason="retry_after", priority=priority)
+        return False
+
+    def over_limit(self, endpoint: str, retry_after: Optional[str] = None) -> None:
+        # upstream rejected us for rate: every session backs off together
+        pause = OVER_LIMIT_PAUSE_S
+        if retry_after:
+            try:
+                pause = max(pause, float(retry_after))
+            except ValueError:
+                pass
+        bucket = self.buckets.get(endpoint)
+        if bucket is not None:
+            bucket.pause(pause)
+
+
+rate_governor = RateGovernor()
+
+
+class SingleFlightTimeout(TimeoutError):
+    """
+    Raised to a caller that joined an in-flight request which did not finish in time.
+    """
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and get a copy of its result, or the same exception
+    if it failed. Nothing is kept once the call finishes, so a later caller
+    starts a new one (the response caches cover repeated requests).
+
+    Flights are kept per request priority and a caller only joins a flight of
+    its own or a higher priority, so a click never queues behind a batch row.
+    A joining caller waits as long as one attempt of its own call could take:
+    its priority's wait for a rate token (RATE_LIMIT_MAX_WAIT_S) plus the
+    endpoint's connect and read timeouts, and never longer than ``timeout_s``.
+    Priorities that may not wait for a token at all (hedges) never coalesce.
+
+    Args:
+        timeout_s: Upper bound on a joining caller's wait before SingleFlightTimeout
+        max_wait_s: Mapping priority -> longest wait for a rate token
+        request_timeouts: Mapping endpoint -> (connect, read) timeout
+    """
+
+    def __init__(self, timeout_s: float = SINGLE_FLIGHT_TIMEOUT_S, max_wait_s: Dict[int, float] = None,
+                 request_timeouts: Dict[str, tuple] = None):
+        self.timeout_s = timeout_s
+        self.max_wait_s = RATE_LIMIT_MAX_WAIT_S if max_wait_s is None else max_wait_s
+        self.request_timeouts = ENDPOINT_TIMEOUTS if request_timeouts is None else request_timeouts
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def follower_wait_s(self, endpoint: str, priority: int) -> float:
+        token_wait = self.max_wait_s.get(priority, 0.0)
+        if token_wait <= 0:
+            return 0.0
+        return min(self.timeout_s, token_wait + sum(self.request_timeouts.get(endpoint, (3.05, 10))))
+
+    def do(self, endpoint: str, key: tuple, func, *args, **kwargs):
+        # func(*args, **kwargs), run at most once at a time per (endpoint, key, priority)
+        priority = current_priority()
+        wait_s = self.follower_wait_s(endpoint, priority)
+        if wait_s <= 0:
+            return func(*args, **kwargs)
+        flight_key = (endpoint, key, priority)
+        with self._lock:
+            flight = next((self._flights[(endpoint, key, p)] for p in range(PRIORITY_INTERACTIVE, priority + 1)
+                           if (endpoint, key, p) in self._flights), None)
+            leader = flight is None
+            if leader:
+                flight = self._flights.setdefault(flight_key, _Flight())
+        if not leader:
+            metrics.inc("wonder_run_coalesced_total", endpoint=endpoint)
+            if not flight.done.wait(wait_s):
+                raise SingleFlightTimeout(f"{endpoint} request in flight for more than {wait_s:g}s")
+            if flight.error is not None:
+                raise flight.error
+            # every caller gets its own copy, so nobody mutates a shared result
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = func(*args, **kwargs)
+            return flight.result
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
+            flight.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+single_flight = SingleFlight()
+
+
+class ApiClient:
+    """
+    Pooled HTTP client shared by all upstream API calls.
+
+    Keeps connections alive across calls and threads, and retries transient
+    failures (connection errors, timeouts, 429/5xx responses and Google's
+    OVER_QUERY_LIMIT / UNKNOWN_ERROR statuses) with bounded exponential
+    backoff and full jitter. Every attempt is admitted by the rate governor
+    first, at the calling thread's priority (see request_priority); the daily
+    quota is charged once per call, not per attempt. A Retry-After header is
+    honoured as given, or the call gives up with RateLimited when it asks for a
+    longer wait than the caller's priority allows.
+
+    Args:
+        pool_size: Maximum number of kept-alive connections per host
+        max_retries: Retries after the first attempt
+        backoff_base_s: Backoff before the first retry (doubles each retry)
+        backoff_max_s: Upper bound for a single backoff (not applied to Retry-After)
+        timeouts: Mapping endpoint name -> (connect, read) timeout
+        governor: Rate governor admitting each attempt (default: the process-wide one)
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_base_s: float = HTTP_BACKOFF_BASE_S, backoff_max_s: float = HTTP_BACKOFF_MAX_S,
+                 timeouts: Dict[str, tuple] = None, governor: RateGovernor = None):
+        self.governor = governor or rate_governor
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.timeouts = dict(ENDPOINT_TIMEOUTS if timeouts is None else timeouts)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+
+    def get_json(self, endpoint: str, url: str, params: dict) -> dict:
+        # returns the decoded JSON body; raises the last error if every attempt failed,
+        # or RateLimited if an attempt was not admitted
+        timeout = self.timeouts.get(endpoint, (3.05, 10))
+        attempt = 0
+        while True:
+            retry_after = None
+            self.governor.admit(endpoint, charge_quota=attempt == 0)
+            started = time.perf_counter()
+            try:
+                r = self.session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                metrics.observe("wonder_run_upstream_seconds", time.perf_counter() - started,
+                                endpoint=endpoint, status=type(exc).__name__)
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if r.status_code in RETRYABLE_HTTP_STATUS and attempt < self.max_retries:
+                    metrics.observe("wonder_run_upstream_seconds", time.perf_counter() - started,
+                                    endpoint=endpoint, status=f"http_{r.status_code}")
+                    retry_after = r.headers.get("Retry-After")
+                    if r.status_code == 429:
+                        self.governor.over_limit(endpoint, retry_after)
+                else:
+                    data = r.json()
+                    # Google reports errors in "status", OpenWeather in "cod"
+                    status = data.get("status", data.get("cod", r.status_code)) if isinstance(data, dict) else r.status_code
+                    metrics.observe("wonder_run_upstream_seconds", time.perf_counter() - started,
+                                    endpoint=endpoint, status=status)
+                    retryable = isinstance(data, dict) and data.get("status") in RETRYABLE_API_STATUS
+                    if status == "OVER_QUERY_LIMIT":
+                        self.governor.over_limit(endpoint)
+                    if not retryable or attempt >= self.max_retries:
+                        return data
+            delay = self.backoff(attempt, retry_after)
+            if retry_after and not self.governor.wait_allowed(endpoint, delay):
+                raise RateLimited(endpoint, "retry_after")
+            time.sleep(delay)
+            attempt += 1
+
+
+http_client = ApiClient()
+
+
+class LatencyWindow:
+    """
+    Rolling window of the most recent upstream latencies (seconds).
+
+    Args:
+        maxlen: Number of samples kept
+    """
+
+    def __init__(self, maxlen: int = 200):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100.0 * len(samples)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+directions_latency = LatencyWindow()
+
+def _cache_gauges():
+    # hit ratio and size of the caches that exist so far, for the metrics export
+    from utils.geometry import geometry_cache
+    caches = {"geocode": _geocode_cache, "directions": _directions_cache, "weather": _weather_cache,
+              "geometry": geometry_cache}
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        stats = cache.stats()
+        yield "wonder_run_cache_hit_ratio", {"cache": name}, stats["hit_ratio"]
+        yield "wonder_run_cache_entries", {"cache": name}, stats.get("entries", stats.get("size", 0))
+    yield "wonder_run_requests_in_flight", {}, single_flight.in_flight()
+    for endpoint, bucket in rate_governor.buckets.items():
+        yield "wonder_run_rate_limit_queued", {"endpoint": endpoint}, bucket.queued()
+        yield "wonder_run_quota_used", {"endpoint": endpoint}, rate_governor.quota.used(endpoint)
+
+
+metrics.register_collector(_cache_gauges)
+
+def normalize_address(address: str) -> str:
+    # case, punctuation and whitespace insensitive: "Jl. Kaliurang,  KM 5" -> "jl kaliurang km 5"
+    if not address:
+        return ""
+    return " ".join(re.sub(r"[^\w\s]", " ", address.lower()).split())
+
+def get_geocode_cache() -> SQLiteCache:
+    global _geocode_cache
+    if _geocode_cache is None:
+        _geocode_cache = SQLiteCache("geocode", ttl_s=GEOCODE_CACHE_TTL_S, max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+                                     stale_s=GEOCODE_CACHE_STALE_S)
+    return _geocode_cache
+
+def get_geocode_index() -> PrefixIndex:
+    # in-memory mirror of the geocode cache, warmed from disk on first use
+    global _geocode_index
+    if _geocode_index is None:
+        index = PrefixIndex(max_entries=GEOCODE_CACHE_MAX_ENTRIES)
+        try:
+            for key, value, expires_at in get_geocode_cache().items():
+                index.add(key, value, expires_at)
+        except Exception:
+            pass
+        _geocode_index = index
+    return _geocode_index
+
+def _remember_geocode(address: str, result: dict) -> None:
+    # store under both the query and the resolved formatted address, so picking a
+    # previously resolved place never needs the network
+    expires_at = time.time() + GEOCODE_CACHE_TTL_S
+    for key in {normalize_address(address), normalize_address(result.get("formatted_address", ""))}:
+        if not key:
+            continue
+        get_geocode_index().add(key, result, expires_at)
+        try:
+            get_geocode_cache().set(key, result)
+        except Exception:
+            pass
+
+def lookup_cached_address(address: str, allow_stale: bool = False) -> Optional[dict]:
+    key = normalize_address(address)
+    if not key:
+        return None
+    hit = get_geocode_index().get(key)
+    if hit is not None:
+        return hit
+    try:
+        return get_geocode_cache().get(key, allow_stale=allow_stale)
+    except Exception:
+        return None
+
+def suggest_addresses(prefix: str, limit: int = 5) -> List[dict]:
+    # previously resolved places whose normalized address starts with prefix
+    key = normalize_address(prefix)
+    if not key:
+        return []
+    seen = set()
+    suggestions = []
+    for _, result in get_geocode_index().prefix(key, limit=limit * 2):
+        if result["formatted_address"] in seen:
+            continue
+        seen.add(result["formatted_address"])
+        suggestions.append(result)
+        if len(suggestions) >= limit:
+            break
+    return suggestions
+
+def geocode_address(address: str, api_key: str, use_cache: bool = True) -> Optional[dict]:
+    if use_cache:
+        cached = lookup_cached_address(address)
+        if cached is not None:
+            return cached
+    # the key is part of the flight key: callers with different keys never share an answer
+    key = (normalize_address(address) or address, api_key, use_cache)
+    try:
+        return single_flight.do("geocode", key, _fetch_geocode, address, api_key, use_cache)
+    except SingleFlightTimeout:
+        # the shared call is slow: answer from the stale cache like a rate-limited call would
+        return lookup_cached_address(address, allow_stale=True) if use_cache else None
+    except Exception:
+        return None
+
+def _fetch_geocode(address: str, api_key: str, use_cache: bool) -> Optional[dict]:
     params = {"address": address, "key": api_key}
     try:
-        r = requests.get(GEOCODE_URL, params=params, timeout=10)
-        data = r.json()
+        data = http_client.get_json("geocode", GEOCODE_URL, params)
         if data.get("status") == "OK" and data.get("results"):
             loc = data["results"][0]["geometry"]["location"]
-            return {"lat": loc["lat"], "lng": loc["lng"], "formatted_address": data["results"][0]["formatted_address"]}
+            result = {"lat": loc["lat"], "lng": loc["lng"], "formatted_address": data["results"][0]["formatted_address"]}
+            if use_cache:
+                _remember_geocode(address, result)
+            return result
+    except RateLimited:
+        # an expired answer beats none while the API is saturated
+        return lookup_cached_address(address, allow_stale=True) if use_cache else None
     except Exception:
         return None
     return None
@@ -39,7 +697,77 @@ def parse_directions_response(json_data: dict) -> List[dict]:
         })
     return routes
 
-def get_directions(origin: Tuple[float, float], destination: Tuple[float, float], api_key: str, alternatives: bool = True) -> Optional[List[dict]]:
+def get_directions_cache() -> SQLiteCache:
+    global _directions_cache
+    if _directions_cache is None:
+        _directions_cache = SQLiteCache("directions", ttl_s=DIRECTIONS_CACHE_TTL_S, max_entries=DIRECTIONS_CACHE_MAX_ENTRIES,
+                                        stale_s=DIRECTIONS_CACHE_STALE_S)
+    return _directions_cache
+
+def _snap(value: float, grid: float) -> str:
+    return f"{round(value / grid) * grid + 0.0:.6f}"
+
+def directions_cache_key(origin: Tuple[float, float], destination: Tuple[float, float], mode: str = "walking", alternatives: bool = True, grid: float = None, waypoints: Optional[List[Tuple[float, float]]] = None) -> str:
+    grid = grid or DIRECTIONS_CACHE_GRID_DEG
+    parts = [
+        _snap(origin[0], grid), _snap(origin[1], grid),
+        _snap(destination[0], grid), _snap(destination[1], grid),
+        mode, str(bool(alternatives)).lower()
+    ]
+    if waypoints:
+        parts.append(";".join(f"{_snap(lat, grid)},{_snap(lng, grid)}" for lat, lng in waypoints))
+    return "|".join(parts)
+
+def use_local_router(router) -> None:
+    # route every get_directions call on this OfflineRouter (None goes back to Google)
+    global _local_router
+    _local_router = router
+
+def get_local_router():
+    global _local_router
+    if _local_router is None and OSM_EXTRACT_PATH:
+        with _local_router_lock:
+            if _local_router is None:
+                from utils.offline_router import OfflineRouter
+                _local_router = OfflineRouter(OSM_EXTRACT_PATH)
+    return _local_router
+
+def get_directions(origin: Tuple[float, float], destination: Tuple[float, float], api_key: str, alternatives: bool = True, mode: str = "walking", use_cache: bool = True, waypoints: Optional[List[Tuple[float, float]]] = None, coalesce: bool = True) -> Optional[List[dict]]:
+    # waypoints are stopovers visited in order; with origin == destination this is a loop
+    # fetched in a single request (Google ignores alternatives when waypoints are given).
+    # coalesce=False always sends its own request (hedges must not join the call they back up)
+    router = get_local_router()
+    if router is not None:
+        return router.get_directions(origin, destination, api_key, alternatives, mode, use_cache, waypoints=waypoints)
+    cache_key = directions_cache_key(origin, destination, mode, alternatives, waypoints=waypoints)
+    if use_cache:
+        try:
+            cached = get_directions_cache().get(cache_key)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return cached
+    if not coalesce:
+        return _fetch_directions(origin, destination, api_key, alternatives, mode, use_cache, waypoints, cache_key)
+    # cached calls share a flight per cache cell (the answer they would share anyway);
+    # uncached ones only when the coordinates match exactly
+    exact = (tuple(origin), tuple(destination), mode, alternatives, tuple(map(tuple, waypoints or ())))
+    key = (cache_key if use_cache else exact, api_key, use_cache)
+    try:
+        return single_flight.do("directions", key, _fetch_directions, origin, destination, api_key, alternatives,
+                                mode, use_cache, waypoints, cache_key)
+    except SingleFlightTimeout:
+        if not use_cache:
+            return None
+        try:
+            return get_directions_cache().get(cache_key, allow_stale=True)
+        except Exception:
+            return None
+    except Exception:
+        return None
+
+def _fetch_directions(origin: Tuple[float, float], destination: Tuple[float, float], api_key: str, alternatives: bool,
+                      mode: str, use_cache: bool, waypoints: Optional[List[Tuple[float, float]]], cache_key: str) -> Optional[List[dict]]:
     origin_str = f"{origin[0]},{origin[1]}"
     dest_str = f"{destination[0]},{destination[1]}"
     params = {
@@ -47,14 +775,43 @@ def get_directions(origin: Tuple[float, float], destination: Tuple[float, float]
         "destination": dest_str,
         "key": api_key,
         "alternatives": str(alternatives).lower(),
-        "mode": "walking"  # walking/jogging is closer to running
+        "mode": mode  # walking/jogging is closer to running
     }
+    if waypoints:
+        params["waypoints"] = "|".join(f"{lat},{lng}" for lat, lng in waypoints)
     try:
-        r = requests.get(DIRECTIONS_URL, params=params, timeout=10)
-        data = r.json()
-        return parse_directions_response(data)
+        started = time.perf_counter()
+        data = http_client.get_json("directions", DIRECTIONS_URL, params)
+        directions_latency.record(time.perf_counter() - started)
+        routes = parse_directions_response(data)
+    except RateLimited:
+        if not use_cache:
+            return None
+        try:
+            return get_directions_cache().get(cache_key, allow_stale=True)
+        except Exception:
+            return None
     except Exception:
         return None
+    # only definitive answers are cached; quota/denied errors must be retried later
+    if use_cache and data.get("status") in ("OK", "ZERO_RESULTS"):
+        try:
+            get_directions_cache().set(cache_key, routes)
+        except Exception:
+            pass
+    return routes
+
+def get_weather_cache() -> SQLiteCache:
+    global _weather_cache
+    if _weather_cache is None:
+        _weather_cache = SQLiteCache("weather", ttl_s=WEATHER_CACHE_TTL_S, max_entries=WEATHER_CACHE_MAX_ENTRIES,
+                                     stale_s=WEATHER_CACHE_STALE_S)
+    return _weather_cache
+
+def weather_cache_key(lat: float = None, lon: float = None, city: str = None) -> str:
+    if city:
+        return "city|" + normalize_address(city)
+    return f"{_snap(lat, WEATHER_CACHE_GRID_DEG)}|{_snap(lon, WEATHER_CACHE_GRID_DEG)}"
 
 def get_weather_by_coords(lat: float = None, lon: float = None, city: str = None, api_key: str = None) -> Optional[dict]:
     if not api_key:
@@ -67,16 +824,169 @@ def get_weather_by_coords(lat: float = None, lon: float = None, city: str = None
         params["lon"] = lon
     else:
         return None
+    cache_key = weather_cache_key(lat, lon, city)
+    try:
+        cached = get_weather_cache().get(cache_key)
+    except Exception:
+        cached = None
+    if cached is not None:
+        return cached
+    try:
+        return single_flight.do("weather", (cache_key, api_key), _fetch_weather, params, cache_key)
+    except SingleFlightTimeout:
+        try:
+            return get_weather_cache().get(cache_key, allow_stale=True)
+        except Exception:
+            return None
+    except Exception:
+        return None
+
+def _fetch_weather(params: dict, cache_key: str) -> Optional[dict]:
     try:
-        r = requests.get(OWM_URL, params=params, timeout=8)
-        data = r.json()
+        data = http_client.get_json("weather", OWM_URL, params)
         if data.get("cod") in (200, "200"):
-            return {
+            weather = {
                 "name": data.get("name"),
                 "temp": data.get("main", {}).get("temp"),
                 "humidity": data.get("main", {}).get("humidity"),
                 "condition": data.get("weather", [{}])[0].get("main")
             }
+            try:
+                get_weather_cache().set(cache_key, weather)
+            except Exception:
+                pass
+            return weather
+    except RateLimited:
+        # weather is decoration: a few hours old is fine when the quota is tight
+        try:
+            return get_weather_cache().get(cache_key, allow_stale=True)
+        except Exception:
+            return None
     except Exception:
         return None
     return None
+
+
+def hedge_delay() -> float:
+    # p95 of recent upstream directions latency, or a fixed delay until enough samples exist
+    if len(directions_latency) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_S
+    return directions_latency.percentile(95)
+
+def stream_routes_with_deadline(origin: Tuple[float, float], destinations: List[Tuple[float, float]], api_key: str, weather_api_key: str = None, alternatives: bool = True, budget_s: float = GENERATION_BUDGET_S, max_workers: int = MAX_CONCURRENT_REQUESTS, max_hedges: int = MAX_HEDGES, waypoints: Optional[List[List[Tuple[float, float]]]] = None):
+    """
+    Fetch directions for every destination (plus weather) within a total time budget,
+    yielding each result as soon as it lands.
+
+    Any directions call still running after the hedge delay (observed p95) gets one
+    duplicate request; whichever copy answers first wins. When the budget runs out
+    the candidates that have not answered are dropped instead of stalling the click.
+    Weather never holds the click up: once every candidate has settled it gets
+    WEATHER_GRACE_S more, then it is dropped.
+
+    Args:
+        origin: (lat, lng) start point
+        destinations: Candidate (lat, lng) destinations
+        api_key: Google Maps API key
+        weather_api_key: OpenWeatherMap API key (weather is skipped if missing)
+        alternatives: Ask Directions for alternative routes
+        budget_s: Total wall-clock budget in seconds
+        max_workers: Concurrent primary directions requests
+        max_hedges: Upper bound on duplicate requests for the whole batch (at most one per candidate)
+        waypoints: Optional per-destination waypoint lists (see get_directions)
+
+    Yields:
+        Tuples (kind, index, payload): ("directions", candidate index, parsed routes or
+        None) once per settled candidate, ("weather", None, weather) when the weather
+        arrives in time, and finally ("done", None, dict with 'dropped' (candidate
+        indices that ran out of time), 'hedged' (indices that got a duplicate request)
+        and 'elapsed_s')
+    """
+    started = time.perf_counter()
+    deadline = started + budget_s
+    delay = hedge_delay()
+    # primaries and the side requests (hedges, weather) get separate pools, so
+    # max_workers bounds the primaries and a hedge never queues behind them
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(destinations))))
+    side_pool = ThreadPoolExecutor(max_workers=max_hedges + 1)
+    owner = {}  # future -> candidate index ("weather" for the weather call)
+    # pool threads inherit the caller's priority and stage collectors; hedges are
+    # only sent when a token is free
+    context = _capture_context()
+    hedge_context = _capture_context(PRIORITY_HEDGE)
+    if weather_api_key:
+        owner[side_pool.submit(_call_in_context, context, get_weather_by_coords,
+                               lat=origin[0], lon=origin[1], api_key=weather_api_key)] = "weather"
+    waypoints = waypoints or [None] * len(destinations)
+    primaries = []
+    for idx, dest in enumerate(destinations):
+        primaries.append(pool.submit(_call_in_context, context, get_directions, origin, dest, api_key, alternatives,
+                                     waypoints=waypoints[idx]))
+        owner[primaries[-1]] = idx
+    done_idx = set()
+    hedged = []
+    pending = set(owner)
+    try:
+        while pending:
+            now = time.perf_counter()
+            # past the deadline only calls that already finished are collected (a slow
+            # consumer must not turn landed results into dropped ones); nothing is awaited
+            expired = now >= deadline
+            next_hedge = started + delay
+            if expired:
+                timeout = 0
+            elif now >= next_hedge or len(hedged) >= max_hedges:
+                timeout = deadline - now
+            else:
+                timeout = min(deadline, next_hedge) - now
+            finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if expired and not finished:
+                break
+            for f in finished:
+                idx = owner[f]
+                try:
+                    result = f.result()
+                except Exception:
+                    result = None
+                if idx == "weather":
+                    yield "weather", None, result
+                    continue
+                if idx in done_idx:
+                    continue
+                # a failed copy only settles the candidate once no other copy is in flight
+                if result is not None or not any(owner[p] == idx for p in pending):
+                    done_idx.add(idx)
+                    yield "directions", idx, result
+            if len(done_idx) == len(destinations):
+                # only the weather (or losing hedge copies) can be left: give the
+                # weather a short grace instead of the rest of the budget
+                weather = [p for p in pending if owner[p] == "weather"]
+                if weather:
+                    finished, _ = wait(weather, timeout=max(0.0, min(WEATHER_GRACE_S, deadline - time.perf_counter())))
+                    for f in finished:
+                        try:
+                            yield "weather", None, f.result()
+                        except Exception:
+                            yield "weather", None, None
+                break
+            if not expired and time.perf_counter() >= started + delay:
+                for idx, dest in enumerate(destinations):
+                    if len(hedged) >= max_hedges:
+                        break
+                    # a primary still queued for a worker is not slow, just waiting
+                    if idx in done_idx or idx in hedged or not primaries[idx].running():
+                        continue
+                    hedge = side_pool.submit(_call_in_context, hedge_context, get_directions, origin, dest, api_key,
+                                             alternatives, waypoints=waypoints[idx], coalesce=False)
+                    owner[hedge] = idx
+                    pending.add(hedge)
+                    hedged.append(idx)
+    finally:
+        # stragglers finish in the background; nobody waits for them
+        pool.shutdown(wait=False, cancel_futures=True)
+        side_pool.shutdown(wait=False, cancel_futures=True)
+    yield "done", None, {
+        "dropped": [i for i in range(len(destinations)) if i not in done_idx],
+        "hedged": hedged,
+        "elapsed_s": time.perf_counter() - started,
+    }
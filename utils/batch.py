@@ -0,0 +1,364 @@
+"""
+Headless batch route generation for many start locations.
+
+Reads a CSV or JSONL file of start locations and goals, generates routes for
+each row with a bounded pool of workers and streams one record per row to
+JSONL (or Parquet, with pyarrow installed) as soon as it finishes. Re-running
+with the same output skips rows that already succeeded, so an interrupted run
+picks up where it stopped.
+
+Input columns (CSV header or JSON keys); only a start is required:
+    id              row key for resuming (default: row number)
+    start_location  address to geocode, or
+    lat, lng        start coordinates (no geocoding call)
+    goal_type       "Distance (km)" (default), "Duration (minutes)" or "Calories"
+    target_value    target in the goal's unit (default 5)
+    weight_kg       default 60
+    speed_kmh       default 8
+    shape           "out" (default) or "loop"
+    search          "fixed" (default) or "adaptive"
+
+    python -m utils.batch meeting_points.csv -o suggestions.jsonl --workers 4
+    python -m utils.batch meeting_points.jsonl -o suggestions_parquet --format parquet
+
+API keys come from GOOGLE_MAPS_API_KEY / OPENWEATHERMAP_API_KEY, or from
+.streamlit/secrets.toml like the app. Batch requests run at background
+priority: a saturated API serves interactive app users first, and batch rows
+stop short of the daily quota share reserved for them.
+"""
+import argparse
+import csv
+import glob
+import importlib.util
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional, Set
+
+from utils.api_handler import request_priority, PRIORITY_BACKGROUND
+from utils.engine import generate_routes, GOAL_TYPES, SHAPE_OUT, SHAPE_LOOP, SEARCH_FIXED, SEARCH_ADAPTIVE
+
+DEFAULT_WORKERS = 4
+# rows per Parquet part file; an interrupted run loses at most the open part
+PARQUET_ROWS_PER_FILE = 50
+# routes kept per row in the output, best first
+DEFAULT_TOP_K = 5
+
+DEFAULTS = {
+    "goal_type": "Distance (km)",
+    "target_value": 5.0,
+    "weight_kg": 60.0,
+    "speed_kmh": 8.0,
+    "shape": SHAPE_OUT,
+    "search": SEARCH_FIXED,
+}
+
+logger = logging.getLogger("wonder_run.batch")
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    # CSV (with header) or JSONL rows, each with an "id" (row number when missing)
+    if path.endswith((".jsonl", ".ndjson", ".json")):
+        with open(path, "r", encoding="utf-8") as file:
+            lines = (line for line in file if line.strip())
+            for n, line in enumerate(lines):
+                row = json.loads(line)
+                row.setdefault("id", str(n))
+                yield row
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            for n, row in enumerate(csv.DictReader(file)):
+                row = {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ""}
+                row.setdefault("id", str(n))
+                yield row
+
+
+def parse_row(row: dict) -> dict:
+    # row -> generate_routes keyword arguments; raises ValueError on bad input
+    args = {key: row.get(key, default) for key, default in DEFAULTS.items()}
+    if args["goal_type"] not in GOAL_TYPES:
+        raise ValueError(f"unknown goal_type {args['goal_type']!r}")
+    if args["shape"] not in (SHAPE_OUT, SHAPE_LOOP):
+        raise ValueError(f"unknown shape {args['shape']!r}")
+    if args["search"] not in (SEARCH_FIXED, SEARCH_ADAPTIVE):
+        raise ValueError(f"unknown search {args['search']!r}")
+    for key in ("target_value", "weight_kg", "speed_kmh"):
+        args[key] = float(args[key])
+    origin = None
+    if row.get("lat") not in (None, "") and row.get("lng") not in (None, ""):
+        origin = (float(row["lat"]), float(row["lng"]))
+    elif not row.get("start_location"):
+        raise ValueError("row needs start_location or lat/lng")
+    return dict(
+        start_location=row.get("start_location"),
+        goal_type=args["goal_type"],
+        target_value=args["target_value"],
+        weight_kg=args["weight_kg"],
+        speed_kmh=args["speed_kmh"],
+        shape=args["shape"],
+        search_mode=args["search"],
+        origin=origin,
+    )
+
+
+def process_row(row: dict, api_key: str, weather_api_key: Optional[str], top_k: int = DEFAULT_TOP_K) -> dict:
+    # one output record; failures are recorded, not raised
+    record = {"id": str(row["id"]), "input": row, "status": "error", "error": None}
+    try:
+        kwargs = parse_row(row)
+        with request_priority(PRIORITY_BACKGROUND):
+            result = generate_routes(api_key=api_key, weather_api_key=weather_api_key, **kwargs)
+    except Exception as exc:
+        record["error"] = f"{type(exc).__name__}: {exc}"
+        return record
+    record.update(
+        origin=list(result["origin"]) if result["origin"] else None,
+        formatted_address=(result["geocode"] or {}).get("formatted_address"),
+        target_km=result["target_km"],
+        summary=result["summary"],
+        weather=result["weather"],
+        api_calls=result["api_calls"],
+        stage_s=result["stage_s"],
+    )
+    if result["error"]:
+        record["error"] = result["error"]
+        return record
+    record["status"] = "ok"
+    record["routes"] = [result["routes"][i].to_dict() for i in result["route_order"][:top_k]]
+    return record
+
+
+class JsonlSink:
+    """
+    Appends one JSON record per line, flushed as each row finishes.
+
+    Args:
+        path: Output file (appended to, so earlier runs are kept)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def completed_ids(path: str) -> Set[str]:
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a line cut short by an interruption
+                    continue
+                if record.get("status") == "ok":
+                    done.add(str(record["id"]))
+        return done
+
+    def write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Writes records as Parquet part files in a directory (requires pyarrow).
+
+    Nested fields (routes, weather, input, stage_s) are stored as JSON strings.
+    Each part is closed after `rows_per_file` rows, so an interruption loses at
+    most the part being written; unreadable parts are ignored when resuming.
+
+    Args:
+        path: Output directory
+        rows_per_file: Rows per part file
+    """
+
+    COLUMNS = ["id", "status", "error", "formatted_address", "origin", "target_km", "summary", "api_calls",
+               "best_route_id", "best_distance_km", "best_duration_min", "best_calories",
+               "routes", "weather", "input", "stage_s"]
+
+    def __init__(self, path: str, rows_per_file: int = PARQUET_ROWS_PER_FILE):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("Parquet output requires the 'pyarrow' package (pip install pyarrow)")
+        self.path = path
+        self.rows_per_file = rows_per_file
+        os.makedirs(path, exist_ok=True)
+        self._rows: List[dict] = []
+        self._part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+
+    @staticmethod
+    def completed_ids(path: str) -> Set[str]:
+        import pyarrow.parquet as pq
+
+        done = set()
+        for part in sorted(glob.glob(os.path.join(path, "part-*.parquet"))):
+            try:
+                table = pq.read_table(part, columns=["id", "status"])
+            except Exception:
+                continue
+            for row_id, status in zip(table.column("id").to_pylist(), table.column("status").to_pylist()):
+                if status == "ok":
+                    done.add(str(row_id))
+        return done
+
+    def _flatten(self, record: dict) -> dict:
+        routes = record.get("routes") or []
+        best = routes[0] if routes else {}
+        flat = {key: record.get(key) for key in ("id", "status", "error", "formatted_address", "target_km",
+                                                  "summary", "api_calls")}
+        flat.update(
+            origin=json.dumps(record.get("origin")),
+            best_route_id=best.get("route_id"),
+            best_distance_km=best.get("distance_km"),
+            best_duration_min=best.get("duration_min"),
+            best_calories=best.get("calories"),
+            routes=json.dumps(routes),
+            weather=json.dumps(record.get("weather")),
+            input=json.dumps(record.get("input"), default=str),
+            stage_s=json.dumps(record.get("stage_s")),
+        )
+        return flat
+
+    def write(self, record: dict) -> None:
+        self._rows.append(self._flatten(record))
+        if len(self._rows) >= self.rows_per_file:
+            self._flush()
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=pa.schema([
+            (c, pa.float64() if c in ("target_km", "best_distance_km", "best_duration_min", "best_calories")
+             else pa.int64() if c == "api_calls" else pa.string()) for c in self.COLUMNS
+        ]))
+        final = os.path.join(self.path, f"part-{self._part:05d}.parquet")
+        tmp = final + ".tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, final)
+        self._part += 1
+        self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+
+
+def run_batch(input_path: str, output_path: str, api_key: str, weather_api_key: Optional[str] = None,
+              output_format: str = "jsonl", workers: int = DEFAULT_WORKERS, top_k: int = DEFAULT_TOP_K,
+              resume: bool = True, stop_event: Optional[threading.Event] = None) -> dict:
+    """
+    Generate routes for every input row and stream the records to the output.
+
+    At most `workers` rows are in flight (and only a few more are read ahead),
+    so memory stays flat however large the input is.
+
+    Args:
+        input_path: CSV or JSONL of start locations and goals
+        output_path: JSONL file, or directory for Parquet parts
+        api_key: Google Maps API key
+        weather_api_key: Optional OpenWeatherMap API key
+        output_format: "jsonl" or "parquet"
+        workers: Rows processed in parallel
+        top_k: Routes kept per row, best first
+        resume: Skip rows already written with status "ok"
+        stop_event: Set it to stop after the rows in flight
+
+    Returns:
+        Dict with counts: 'ok', 'error', 'skipped'
+    """
+    sink_cls = ParquetSink if output_format == "parquet" else JsonlSink
+    done = sink_cls.completed_ids(output_path) if resume else set()
+    sink = sink_cls(output_path)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    stop_event = stop_event or threading.Event()
+    rows = read_rows(input_path)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                # keep the pool busy with a small read-ahead, never the whole file
+                while not exhausted and not stop_event.is_set() and len(pending) < workers * 2:
+                    row = next(rows, None)
+                    if row is None:
+                        exhausted = True
+                    elif str(row["id"]) in done:
+                        counts["skipped"] += 1
+                    else:
+                        pending.add(pool.submit(process_row, row, api_key, weather_api_key, top_k))
+                if stop_event.is_set():
+                    exhausted = True
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    sink.write(record)
+                    counts[record["status"]] += 1
+                    logger.info("%s %s %s", record["id"], record["status"], record.get("error") or "")
+    finally:
+        sink.close()
+    return counts
+
+
+def _load_keys():
+    google = os.environ.get("GOOGLE_MAPS_API_KEY")
+    weather = os.environ.get("OPENWEATHERMAP_API_KEY")
+    secrets_path = os.path.join(".streamlit", "secrets.toml")
+    if (not google or not weather) and os.path.exists(secrets_path):
+        try:
+            import tomllib
+        except ImportError:
+            return google, weather
+        with open(secrets_path, "rb") as file:
+            secrets = tomllib.load(file)
+        google = google or secrets.get("GOOGLE_MAPS_API_KEY")
+        weather = weather or secrets.get("OPENWEATHERMAP_API_KEY")
+    return google, weather
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL of start locations")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file, or directory for --format parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="rows processed in parallel")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="routes kept per row")
+    parser.add_argument("--no-resume", action="store_true", help="process every row even if already written")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    api_key, weather_api_key = _load_keys()
+    if not api_key:
+        parser.error("GOOGLE_MAPS_API_KEY is not set (environment or .streamlit/secrets.toml)")
+
+    # first Ctrl+C finishes the rows in flight and exits cleanly; a second one aborts
+    stop_event = threading.Event()
+
+    def on_interrupt(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt
+        logger.warning("stopping after the rows in flight (Ctrl+C again to abort)")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, on_interrupt)
+    counts = run_batch(args.input, args.output, api_key, weather_api_key, output_format=args.format,
+                       workers=args.workers, top_k=args.top_k, resume=not args.no_resume, stop_event=stop_event)
+    logger.info("done: %(ok)d ok, %(error)d failed, %(skipped)d already done", counts)
+    return 0 if not counts["error"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
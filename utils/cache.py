@@ -0,0 +1,176 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+# all on-disk caches share one SQLite file (one table each)
+CACHE_DIR = os.environ.get("WONDER_RUN_CACHE_DIR", ".cache")
+CACHE_DB_PATH = os.path.join(CACHE_DIR, "wonder_run.sqlite")
+
+
+class SQLiteCache:
+    """
+    Small persistent key/value cache on top of SQLite.
+
+    Values are stored as JSON. Entries expire after ``ttl_s`` seconds and the
+    table is kept at ``max_entries`` rows by evicting the least recently used
+    entries. Expired entries are kept ``stale_s`` seconds longer for callers
+    that would rather have an old answer than none (``get(key, allow_stale=True)``).
+    Safe to share between the threads of one process.
+
+    Args:
+        table: Table name inside the cache database
+        ttl_s: Time to live of an entry in seconds
+        max_entries: Maximum number of rows kept in the table
+        path: SQLite file path (default: CACHE_DB_PATH)
+        stale_s: Extra seconds an expired entry stays available as a fallback
+    """
+
+    def __init__(self, table: str, ttl_s: float, max_entries: int, path: str = None, stale_s: float = 0.0):
+        self.table = table
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self.path = path or CACHE_DB_PATH
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        now = time.time()
+        max_age = self.ttl_s + (self.stale_s if allow_stale else 0.0)
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > max_age:
+                if row is not None and now - row[1] > self.ttl_s + self.stale_s:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        # drop expired rows first, then least recently used ones above the size bound
+        cur = self._conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl_s - self.stale_s,))
+        self.evictions += max(cur.rowcount, 0)
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += max(cur.rowcount, 0)
+
+    def items(self) -> List[Tuple[str, Any, float]]:
+        # all live entries as (key, value, expires_at)
+        cutoff = time.time() - self.ttl_s
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value, created FROM {self.table} WHERE created >= ?", (cutoff,)
+            ).fetchall()
+        return [(key, json.loads(value), created + self.ttl_s) for key, value, created in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self),
+        }
+
+
+class PrefixIndex:
+    """
+    In-memory sorted-array index for exact and prefix lookups on string keys.
+
+    Keys are kept in a sorted list so a prefix query is one binary search
+    followed by a short scan. Each entry carries an expiry timestamp and
+    expired entries are skipped on lookup.
+
+    Args:
+        max_entries: Oldest-expiring entries are dropped above this size
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._keys: List[str] = []
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            if key not in self._values:
+                bisect.insort(self._keys, key)
+            self._values[key] = (value, expires_at)
+            if len(self._keys) > self.max_entries:
+                oldest = min(self._values, key=lambda k: self._values[k][1])
+                self._remove(oldest)
+
+    def _remove(self, key: str) -> None:
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+        self._values.pop(key, None)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._values.get(key)
+        if entry is None or entry[1] < time.time():
+            return None
+        return entry[0]
+
+    def prefix(self, prefix: str, limit: int = 10) -> List[Tuple[str, Any]]:
+        now = time.time()
+        matches = []
+        with self._lock:
+            i = bisect.bisect_left(self._keys, prefix)
+            while i < len(self._keys) and len(matches) < limit:
+                key = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                value, expires_at = self._values[key]
+                if expires_at >= now:
+                    matches.append((key, value))
+                i += 1
+        return matches
+
+    def __len__(self) -> int:
+        return len(self._keys)
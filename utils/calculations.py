@@ -1,27 +1,130 @@
-from math import radians, sin, cos, asin, sqrt, atan2, degrees
 import math
+import numpy as np
+
+from utils.geometry import decode_coords
+from utils.metrics import metrics
 
 EARTH_R = 6371.0  # km
+KM_PER_DEG_LAT = math.pi * EARTH_R / 180.0
+# routes whose shapes stay within this distance of each other everywhere count as duplicates
+DEDUPE_THRESHOLD_KM = 0.075
+# points per route, evenly spaced along its length, used for shape comparison
+DEDUPE_SAMPLES = 48
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    # returns distance in km
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+def haversine_distances(lat1, lon1, lat2, lon2):
+    # vectorized haversine: array-like inputs broadcast against each other, returns km
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
     dlat = lat2 - lat1
     dlon = lon2 - lon1
-    a = sin(dlat/2)**2 + cos(lat1)*cos(lat2)*sin(dlon/2)**2
-    c = 2 * asin(min(1, sqrt(a)))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.minimum(1, np.sqrt(a)))
     return EARTH_R * c
 
+def haversine_distance(lat1, lon1, lat2, lon2):
+    # returns distance in km
+    return float(haversine_distances(lat1, lon1, lat2, lon2))
+
+def destination_points(lat, lon, bearings_deg, distances_km):
+    # vectorized destination_point: bearings and distances broadcast against each other
+    # returns (lat2, lon2) arrays in degrees, lon normalized to [-180,180]
+    lat1 = np.radians(np.asarray(lat, dtype=float))
+    lon1 = np.radians(np.asarray(lon, dtype=float))
+    bearing = np.radians(np.asarray(bearings_deg, dtype=float))
+    dr = np.asarray(distances_km, dtype=float) / EARTH_R
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(dr) + np.cos(lat1) * np.sin(dr) * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(np.sin(bearing) * np.sin(dr) * np.cos(lat1), np.cos(dr) - np.sin(lat1) * np.sin(lat2))
+    return np.degrees(lat2), (np.degrees(lon2) + 540) % 360 - 180
+
+def destination_grid(lat, lon, bearings_deg, radii_km):
+    # every bearing x every radius in one call: arrays of shape (len(bearings), len(radii))
+    bearings = np.asarray(bearings_deg, dtype=float)[:, None]
+    radii = np.asarray(radii_km, dtype=float)[None, :]
+    return destination_points(lat, lon, bearings, radii)
+
 def destination_point(lat, lon, bearing_deg, distance_km):
     # returns lat2, lon2 of point at distance_km and bearing from start (in degrees)
     # Using spherical Earth projected
-    lat1 = radians(lat)
-    lon1 = radians(lon)
-    bearing = radians(bearing_deg)
-    dr = distance_km / EARTH_R
-    lat2 = asin(sin(lat1) * cos(dr) + cos(lat1) * sin(dr) * cos(bearing))
-    lon2 = lon1 + atan2(sin(bearing) * sin(dr) * cos(lat1), cos(dr) - sin(lat1) * sin(lat2))
-    return degrees(lat2), (degrees(lon2) + 540) % 360 - 180  # normalize to [-180,180]
+    lat2, lon2 = destination_points(lat, lon, bearing_deg, distance_km)
+    return float(lat2), float(lon2)
+
+def segment_distances(coords):
+    # coords: (N, 2) array-like of (lat, lng); returns the N-1 consecutive leg lengths in km
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) < 2:
+        return np.zeros(0)
+    return haversine_distances(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+def cumulative_distances(coords):
+    # distance along the path from the first point to each point, km (first entry is 0)
+    legs = segment_distances(coords)
+    return np.concatenate(([0.0], np.cumsum(legs)))
+
+def pairwise_distances(coords_a, coords_b=None):
+    # (N, M) matrix of distances in km between every point of coords_a and of coords_b
+    a = np.asarray(coords_a, dtype=float).reshape(-1, 2)
+    b = a if coords_b is None else np.asarray(coords_b, dtype=float).reshape(-1, 2)
+    return haversine_distances(a[:, 0, None], a[:, 1, None], b[None, :, 0], b[None, :, 1])
+
+class PathIndex:
+    """
+    Cumulative-length index over a path, for "where is km X" queries.
+
+    Built once per route (one vectorized haversine pass); lookups binary-search
+    the cumulative distances and interpolate within the segment.
+
+    Args:
+        coords: (N, 2) array-like of (lat, lng)
+    """
+
+    def __init__(self, coords):
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.cumulative = cumulative_distances(self.coords)
+
+    @property
+    def length_km(self):
+        return float(self.cumulative[-1]) if len(self.coords) else 0.0
+
+    def points_at(self, km):
+        # (lat, lng) at each distance along the path; distances are clamped to the path
+        km = np.clip(np.asarray(km, dtype=float), 0.0, self.length_km)
+        if len(self.coords) < 2:
+            first = self.coords[0] if len(self.coords) else np.full(2, np.nan)
+            return np.broadcast_to(first, km.shape + (2,)).copy()
+        i = np.clip(np.searchsorted(self.cumulative, km, side="right") - 1, 0, len(self.coords) - 2)
+        seg = self.cumulative[i + 1] - self.cumulative[i]
+        t = np.divide(km - self.cumulative[i], seg, out=np.zeros_like(km), where=seg > 0)
+        return self.coords[i] + t[..., None] * (self.coords[i + 1] - self.coords[i])
+
+    def point_at(self, km):
+        lat, lng = self.points_at(km).tolist()
+        return lat, lng
+
+    def truncate(self, km):
+        # the path from its start to exactly km along it
+        km = min(max(float(km), 0.0), self.length_km)
+        end = int(np.searchsorted(self.cumulative, km, side="left"))
+        return np.vstack((self.coords[:end], self.points_at(km)[None, :]))
+
+    def out_and_back(self, total_km):
+        # out along the path to total_km / 2, then back the same way
+        out = self.truncate(total_km / 2.0)
+        return np.vstack((out, out[-2::-1]))
+
+def resample_path(coords, n):
+    # n points evenly spaced by distance along the path (its first and last points included)
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) < 2:
+        return np.repeat(coords, n, axis=0) if len(coords) else coords
+    along = cumulative_distances(coords)
+    stations = np.linspace(0.0, along[-1], n)
+    return np.column_stack((np.interp(stations, along, coords[:, 0]), np.interp(stations, along, coords[:, 1])))
+
+def hausdorff_distance(coords_a, coords_b):
+    # symmetric Hausdorff distance in km: the farthest any point of one path is from the other path
+    d = pairwise_distances(coords_a, coords_b)
+    if d.size == 0:
+        return math.inf
+    return float(max(d.min(axis=1).max(), d.min(axis=0).max()))
 
 def calculate_calories(distance_km, weight_kg):
     # Simple estimate: calories = distance_km * weight_kg * 1.036
@@ -33,20 +136,112 @@ def calculate_time_from_speed(distance_km, speed_kmh):
     hours = distance_km / speed_kmh
     return hours * 60.0
 
-def rank_routes(routes, goal_type, target_value, weight_kg, speed_kmh):
+# route dict column scored against the target for each goal type
+GOAL_COLUMNS = {
+    "Distance (km)": "distance_km",
+    "Duration (minutes)": "duration_min",
+    "Calories": "calories",
+}
+
+# default objective weights: target error, plus a small tie-breaker preferring shorter duration.
+# Any other key names a numeric route field (e.g. "overlap", "elevation_gain_m")
+# whose value is added to the score with that weight; missing fields count as 0.
+DEFAULT_OBJECTIVE_WEIGHTS = {"target": 1.0, "duration": 0.01}
+
+def route_column(routes, key, default=0.0):
+    # one numeric field of every route as a float array
+    return np.fromiter((r.get(key, default) or default for r in routes), dtype=float, count=len(routes))
+
+def score_routes(routes, goal_type, target_value, weights=None):
+    # lower is better; all routes are scored at once over columnar arrays
+    weights = DEFAULT_OBJECTIVE_WEIGHTS if weights is None else weights
+    n = len(routes)
+    scores = np.zeros(n)
+    if n == 0:
+        return scores
+    column = GOAL_COLUMNS.get(goal_type, "calories")
+    for objective, w in weights.items():
+        if not w:
+            continue
+        if objective == "target":
+            scores += w * np.abs(route_column(routes, column) - float(target_value))
+        elif objective == "duration":
+            scores += w * route_column(routes, "duration_min")
+        else:
+            scores += w * route_column(routes, objective)
+    return scores
+
+def top_k_indices(scores, k=None):
+    # indices of the k lowest scores, best first; ties keep the original order
+    scores = np.asarray(scores, dtype=float)
+    n = len(scores)
+    if k is None or k >= n:
+        candidates = np.arange(n)
+    elif k <= 0:
+        return []
+    else:
+        # partial sort: only routes scoring at most the k-th best value get fully ordered
+        kth = np.partition(scores, k - 1)[k - 1]
+        candidates = np.flatnonzero(scores <= kth)
+    order = np.lexsort((candidates, scores[candidates]))
+    return [int(i) for i in candidates[order][:k]]
+
+def rank_routes_top_k(routes, goal_type, target_value, k=None, weights=None):
+    # returns indices of the k best routes, best first (all routes if k is None)
+    return top_k_indices(score_routes(routes, goal_type, target_value, weights), k)
+
+@metrics.timed("dedupe")
+def dedupe_routes(routes, goal_type, target_value, threshold_km=DEDUPE_THRESHOLD_KM, samples=DEDUPE_SAMPLES, weights=None):
+    """
+    Drop near-duplicate routes, keeping the best-scoring one of each group.
+
+    Routes are visited best first and kept unless their shape lies within
+    threshold_km of an already kept route (symmetric Hausdorff distance over
+    paths resampled to `samples` evenly spaced points). Bounding boxes are
+    compared first, so clearly different routes skip the point comparison.
+
+    Args:
+        routes: Route records or dicts with a "polyline" and the scored fields
+        goal_type: Goal used for scoring (see GOAL_COLUMNS)
+        target_value: Target of that goal
+        threshold_km: Largest shape difference still counted as a duplicate
+        samples: Points per resampled route
+        weights: Objective weights for score_routes
+
+    Returns:
+        List: Indices of the kept routes, in their original order
+    """
+    n = len(routes)
+    if n < 2:
+        return list(range(n))
+    shapes = [resample_path(decode_coords(r.get("polyline")), samples) for r in routes]
+    empty = np.array([len(s) == 0 for s in shapes])
+    boxes = np.array([np.concatenate((s.min(axis=0), s.max(axis=0))) if len(s) else np.zeros(4) for s in shapes])
+    # bounding boxes grown by the threshold (conservatively at the highest latitude)
+    max_lat = np.radians(np.minimum(np.abs(boxes[:, [0, 2]]).max(axis=1), 89.0))
+    pad = np.column_stack((
+        np.full(n, threshold_km / KM_PER_DEG_LAT),
+        threshold_km / (KM_PER_DEG_LAT * np.cos(max_lat)),
+    ))
+    lo, hi = boxes[:, :2], boxes[:, 2:]
+
+    kept = []
+    for i in top_k_indices(score_routes(routes, goal_type, target_value, weights)):
+        duplicate = False
+        if not empty[i] and kept:
+            others = np.array(kept)
+            # a duplicate lies inside the grown box of the other route, and vice versa
+            close = (np.all(lo[i] >= lo[others] - pad[others], axis=1) & np.all(hi[i] <= hi[others] + pad[others], axis=1)
+                     & np.all(lo[others] >= lo[i] - pad[i], axis=1) & np.all(hi[others] <= hi[i] + pad[i], axis=1)
+                     & ~empty[others])
+            duplicate = any(hausdorff_distance(shapes[i], shapes[j]) <= threshold_km for j in others[close].tolist())
+        if not duplicate:
+            kept.append(i)
+    return sorted(kept)
+
+def rank_routes(routes, goal_type, target_value, weight_kg, speed_kmh, weights=None):
     # routes: list of dicts with keys distance_km, duration_min, calories
     # returns index of best route
-    scores = []
-    for r in routes:
-        if goal_type == "Distance (km)":
-            score = abs(r["distance_km"] - float(target_value))
-        elif goal_type == "Duration (minutes)":
-            score = abs(r["duration_min"] - float(target_value))
-        else:  # Calories
-            score = abs(r["calories"] - float(target_value))
-        # small tie-breaker prefer shorter duration
-        score += r["duration_min"] * 0.01
-        scores.append(score)
-    # return index of minimum score
-    best_index = int(min(range(len(scores)), key=lambda i: scores[i]))
+    scores = score_routes(routes, goal_type, target_value, weights)
+    best_index = int(np.argmin(scores))
     return best_index
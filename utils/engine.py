@@ -0,0 +1,186 @@
+import time
+from typing import Iterator, Optional, Tuple
+
+from utils.api_handler import geocode_address
+from utils.calculations import dedupe_routes, rank_routes_top_k
+from utils.metrics import metrics, log_generation
+from utils.route_search import iter_adaptive_routes, iter_fixed_routes, iter_loop_routes, DEFAULT_TOLERANCE
+from utils.routes import fit_route_to_distance, routes_from_directions
+
+GOAL_TYPES = ("Distance (km)", "Duration (minutes)", "Calories")
+SHAPE_OUT = "out"
+SHAPE_LOOP = "loop"
+SEARCH_FIXED = "fixed"
+SEARCH_ADAPTIVE = "adaptive"
+
+SEARCH_LABELS = {
+    (SHAPE_OUT, SEARCH_FIXED): "Fixed search",
+    (SHAPE_OUT, SEARCH_ADAPTIVE): "Adaptive search",
+    (SHAPE_LOOP, SEARCH_FIXED): "Loops",
+    (SHAPE_LOOP, SEARCH_ADAPTIVE): "Loops",
+}
+
+
+def target_distance_km(goal_type: str, target_value: float, weight_kg: float, speed_kmh: float) -> float:
+    # distance the search aims for, whatever the goal is expressed in
+    if goal_type == "Distance (km)":
+        return float(target_value)
+    if goal_type == "Duration (minutes)":
+        # convert duration to distance using preferred speed
+        return (float(target_value) / 60.0) * speed_kmh
+    # Calories: calories = distance_km * weight * 1.036
+    return float(target_value) / (weight_kg * 1.036)
+
+
+def iter_generation(start_location: Optional[str], goal_type: str, target_value: float, weight_kg: float,
+                    speed_kmh: float, api_key: str, weather_api_key: str = None, shape: str = SHAPE_OUT,
+                    search_mode: str = SEARCH_FIXED, fit_routes: bool = True,
+                    origin: Optional[Tuple[float, float]] = None) -> Iterator[tuple]:
+    """
+    Run one route generation (geocode -> candidate search -> fit -> dedupe -> rank) as a stream of events.
+
+    Yields ("geocode", result or None) once, then ("routes", routes so far) each
+    time a candidate adds routes, and finally ("result", dict). The result has
+    'error' set ("geocode" or "no_routes") when nothing could be suggested;
+    otherwise 'routes', 'route_order' (best first) and 'best_index', plus
+    'origin', 'target_km', 'weather', 'summary', 'candidates', 'dropped_bearings',
+    'outcomes', 'api_calls', 'stage_s' and 'log_line' in both cases.
+
+    Args:
+        start_location: Address to geocode (ignored when origin is given)
+        goal_type: One of GOAL_TYPES
+        target_value: Target in the goal's unit
+        weight_kg: Runner weight
+        speed_kmh: Preferred average speed
+        api_key: Google Maps API key
+        weather_api_key: Optional OpenWeatherMap API key
+        shape: SHAPE_OUT or SHAPE_LOOP
+        search_mode: SEARCH_FIXED or SEARCH_ADAPTIVE (out routes only)
+        fit_routes: Fit off-target out routes to the exact target distance
+        origin: Optional (lat, lng) start, skips geocoding
+    """
+    result = {
+        "error": None, "origin": origin, "geocode": None, "target_km": None, "routes": [],
+        "route_order": [], "best_index": None, "weather": None, "summary": "",
+        "candidates": 0, "dropped_bearings": [], "outcomes": {}, "api_calls": 0, "stage_s": {}, "log_line": None,
+    }
+    # every metrics.timer() run below (here and inside the utils) adds into stage_s
+    with metrics.collect_stages() as stage_s:
+        result["stage_s"] = stage_s
+        if origin is None:
+            with metrics.timer("geocode"):
+                geocode = geocode_address(start_location, api_key)
+            yield "geocode", geocode
+            if not geocode:
+                result["error"] = "geocode"
+                yield "result", result
+                return
+            result["geocode"] = geocode
+            origin = (geocode["lat"], geocode["lng"])
+        else:
+            yield "geocode", {"lat": origin[0], "lng": origin[1], "formatted_address": start_location or ""}
+        result["origin"] = origin
+        target_km = result["target_km"] = target_distance_km(goal_type, target_value, weight_kg, speed_kmh)
+
+        # Candidate destinations by bearings (or loop corners), and Directions for each
+        # fetched concurrently with the weather at origin; slow calls are hedged and
+        # whatever misses the budget is dropped. Routes are streamed as candidates land.
+        fit_routes = fit_routes and shape == SHAPE_OUT
+        search_label = SEARCH_LABELS[(shape, search_mode)]
+        if shape == SHAPE_LOOP:
+            events = iter_loop_routes(origin, target_km, api_key, weather_api_key)
+        elif search_mode == SEARCH_ADAPTIVE:
+            # radius corrected from the observed road / straight-line ratio,
+            # stops as soon as enough routes are close to the target
+            events = iter_adaptive_routes(origin, target_km, api_key, weather_api_key, alternatives=True)
+        else:
+            events = iter_fixed_routes(origin, target_km, api_key, weather_api_key, alternatives=True)
+
+        routes = []
+        candidate_bearings = {}
+        search = {}
+        # "search" is the time spent waiting on the search stream only: the consumer
+        # handling a "routes" event (e.g. a provisional render) is not part of it
+        search_s = 0.0
+        while True:
+            started = time.perf_counter()
+            try:
+                kind, payload = next(events)
+            except StopIteration:
+                break
+            finally:
+                search_s += time.perf_counter() - started
+            if kind == "candidate":
+                candidate_bearings[payload["index"]] = payload["bearing"]
+                new_routes = routes_from_directions(payload["index"], payload["directions"], weight_kg)
+                if new_routes:
+                    routes += new_routes
+                    yield "routes", routes
+            elif kind == "weather":
+                result["weather"] = payload
+            else:
+                search = payload
+        metrics.record_stage("search", search_s)
+        n_returned = len(routes)
+        dropped = search.get("dropped", [])
+        result["candidates"] = len(candidate_bearings)
+        result["dropped_bearings"] = [candidate_bearings[i] for i in dropped]
+        result["api_calls"] = search.get("api_calls", 0)
+        summary = (
+            f"{search_label}: {search.get('api_calls', 0)} Directions calls in {search.get('rounds', 0)} round(s), "
+            f"{search.get('within_tolerance', 0)} routes within ±{DEFAULT_TOLERANCE:.0%} of {target_km:.1f} km."
+        )
+
+        # Off-target routes reshaped to the exact target from their own geometry
+        n_fitted = 0
+        if fit_routes:
+            with metrics.timer("fit"):
+                fitted = [fit_route_to_distance(r, target_km, weight_kg, DEFAULT_TOLERANCE) for r in routes]
+            n_fitted = sum(f is not r for f, r in zip(fitted, routes))
+            if n_fitted:
+                summary += f" {n_fitted} route(s) fitted to the target distance."
+                routes = fitted
+
+        # Near-duplicates (neighbouring bearings, alternatives along the same road)
+        # collapse into their best-scoring route before ranking
+        kept = dedupe_routes(routes, goal_type, target_value)
+        if len(kept) < len(routes):
+            summary += f" {len(routes) - len(kept)} near-duplicate route(s) merged."
+            routes = [routes[i] for i in kept]
+
+        if routes:
+            # Rank routes based on goal and target
+            with metrics.timer("rank"):
+                route_order = rank_routes_top_k(routes, goal_type, target_value)
+            result.update(routes=routes, route_order=route_order, best_index=route_order[0])
+        else:
+            result["error"] = "no_routes"
+        result["summary"] = summary
+
+    # routes returned, candidates dropped at the deadline, duplicates merged,
+    # routes fitted; and one structured log line per generation
+    outcomes = result["outcomes"] = {
+        "returned": n_returned, "dropped": len(dropped),
+        "merged": n_returned - len(routes), "fitted": n_fitted,
+    }
+    for outcome, count in outcomes.items():
+        metrics.inc("wonder_run_routes_total", count, outcome=outcome)
+    metrics.inc("wonder_run_generations_total", shape=shape, search=search_label)
+    result["log_line"] = log_generation({
+        "search": search_label,
+        "target_km": round(target_km, 3),
+        "api_calls": search.get("api_calls", 0),
+        "rounds": search.get("rounds", 0),
+        "routes": outcomes,
+        "stage_s": {stage: round(seconds, 4) for stage, seconds in stage_s.items()},
+    })
+    yield "result", result
+
+
+def generate_routes(*args, **kwargs) -> dict:
+    # blocking form of iter_generation: the final result dict
+    result = None
+    for kind, payload in iter_generation(*args, **kwargs):
+        if kind == "result":
+            result = payload
+    return result
@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# decoded route geometry kept in memory, bounded by the size of the coordinate arrays
+GEOMETRY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+POLYLINE_PRECISION = 5
+
+
+def _decode_array(polyline_str: str, precision: int = POLYLINE_PRECISION) -> np.ndarray:
+    # vectorized Google encoded-polyline decoder, returns an (N, 2) float64 array of (lat, lng)
+    chunks = np.frombuffer(polyline_str.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if chunks.size == 0:
+        return np.empty((0, 2))
+    if chunks.min() < 0 or chunks.max() > 63:
+        raise ValueError("invalid polyline character")
+    # every value is a run of 5-bit chunks; the 0x20 bit marks "more chunks follow"
+    ends = (chunks & 0x20) == 0
+    if not ends[-1]:
+        raise ValueError("truncated polyline")
+    starts = np.concatenate(([0], np.flatnonzero(ends)[:-1] + 1))
+    position = np.arange(chunks.size) - np.repeat(starts, np.diff(np.append(starts, chunks.size)))
+    values = np.add.reduceat((chunks & 0x1F) << (5 * position), starts)
+    # zig-zag decode
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    if deltas.size % 2:
+        raise ValueError("odd number of polyline values")
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / float(10 ** precision)
+
+
+def encode_coords(coords, precision: int = POLYLINE_PRECISION) -> str:
+    # inverse of _decode_array: (N, 2) array-like of (lat, lng) -> Google encoded polyline
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) == 0:
+        return ""
+    scaled = np.round(coords * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    out = []
+    for value in values.tolist():
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+class GeometryCache:
+    """
+    LRU cache of decoded polylines, keyed by the encoded string.
+
+    Coordinates are stored as read-only contiguous (N, 2) float64 arrays and
+    the cache is bounded by the total size of those arrays in bytes.
+
+    Args:
+        max_bytes: Memory budget for cached coordinate arrays
+    """
+
+    def __init__(self, max_bytes: int = GEOMETRY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, polyline_str: str) -> np.ndarray:
+        with self._lock:
+            coords = self._entries.get(polyline_str)
+            if coords is not None:
+                self._entries.move_to_end(polyline_str)
+                self.hits += 1
+                return coords
+            self.misses += 1
+        try:
+            coords = _decode_array(polyline_str)
+        except (ValueError, UnicodeEncodeError):
+            coords = np.empty((0, 2))
+        coords = np.ascontiguousarray(coords)
+        coords.setflags(write=False)
+        with self._lock:
+            if polyline_str not in self._entries and coords.nbytes <= self.max_bytes:
+                self._entries[polyline_str] = coords
+                self.nbytes += coords.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+        return coords
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+        }
+
+
+geometry_cache = GeometryCache()
+
+
+def decode_coords(polyline_str) -> np.ndarray:
+    """
+    Decode an encoded polyline once and reuse the result.
+
+    Args:
+        polyline_str: Encoded polyline string from Google Maps API
+
+    Returns:
+        Read-only (N, 2) float64 array of (lat, lng); empty if the string is
+        missing or invalid
+    """
+    if not polyline_str or not isinstance(polyline_str, str):
+        return np.empty((0, 2))
+    return geometry_cache.get(polyline_str)
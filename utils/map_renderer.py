@@ -1,37 +1,135 @@
 import folium
+import numpy as np
 from folium import Popup
-import polyline
 from branca.element import Figure
+from utils.geometry import decode_coords
+from utils.metrics import metrics
 
-def render_routes_map(origin: tuple, routes: list, best_index: int = 0):
+# polylines are simplified to this many screen pixels at the zoom they are drawn at
+SIMPLIFY_TOLERANCE_PX = 1.0
+# zoom assumed for route previews (fit_bounds usually lands around 14-15 for a run)
+PREVIEW_ZOOM = 15
+
+@metrics.timed("map_render")
+def render_routes_map(origin: tuple, routes: list, best_index: int = 0, selected_route_id=None):
     # origin: (lat, lng)
     # routes: list of dicts with 'polyline' key (encoded polyline) and metadata
+    # every route is its own toggleable layer; selected_route_id (default: the best route) is highlighted
     m = folium.Map(location=[origin[0], origin[1]], zoom_start=13, control_scale=True)
     # add origin marker
     folium.CircleMarker(location=[origin[0], origin[1]], radius=6, color="#FF8C00", fill=True, fill_color="#FF8C00", popup="Start").add_to(m)
 
+    if selected_route_id is None and 0 <= best_index < len(routes):
+        selected_route_id = routes[best_index]["route_id"]
+
     colors = ["#FF7F50", "#FFD700", "#FF8C00", "#F5DEB3", "#D2691E", "#3E2723"]
-    for i, r in enumerate(routes):
-        try:
-            coords = polyline.decode(r["polyline"])
-        except Exception:
-            coords = []
-        if not coords:
+    bounds = [[origin[0], origin[1]], [origin[0], origin[1]]]
+    # the selected route is drawn last so it sits on top
+    draw_order = sorted(range(len(routes)), key=lambda i: routes[i]["route_id"] == selected_route_id)
+    for i in draw_order:
+        r = routes[i]
+        coords, _ = simplify_coords(decode_coords(r["polyline"]), zoom=13)
+        if len(coords) == 0:
             continue
+        bounds[0] = [min(bounds[0][0], float(coords[:, 0].min())), min(bounds[0][1], float(coords[:, 1].min()))]
+        bounds[1] = [max(bounds[1][0], float(coords[:, 0].max())), max(bounds[1][1], float(coords[:, 1].max()))]
+        coords = coords.tolist()
+        selected = r["route_id"] == selected_route_id
         color = colors[i % len(colors)]
-        weight = 5 if i == best_index else 3
-        folium.PolyLine(locations=coords, color=color, weight=weight, opacity=0.8, popup=f"Route {r['route_id']}").add_to(m)
+        weight = 7 if selected else (5 if i == best_index else 3)
+        opacity = 1.0 if selected else 0.6
+        label = f"{'⭐ ' if i == best_index else ''}Route {r['route_id']}"
+        layer = folium.FeatureGroup(name=label, show=True)
+        folium.PolyLine(locations=coords, color=color, weight=weight, opacity=opacity, popup=f"Route {r['route_id']}").add_to(layer)
         # add popup at midpoint
         mid = coords[len(coords)//2]
         popup_html = f"<b>Route {r['route_id']}</b><br>Distance: {r['distance_km']} km<br>Duration: {r['duration_min']} min<br>Calories: {r['calories']} kcal"
-        folium.Marker(location=mid, icon=folium.DivIcon(html=f"""<div style="font-size:12px;background:white;padding:4px;border-radius:6px;border:1px solid #D2691E;">{r['route_id']}</div>"""), popup=Popup(popup_html, max_width=250)).add_to(m)
+        border = "2px solid #FF8C00" if selected else "1px solid #D2691E"
+        folium.Marker(location=mid, icon=folium.DivIcon(html=f"""<div style="font-size:12px;background:white;padding:4px;border-radius:6px;border:{border};">{r['route_id']}</div>"""), popup=Popup(popup_html, max_width=250)).add_to(layer)
+        layer.add_to(m)
+    folium.LayerControl(collapsed=True).add_to(m)
+    if bounds[0] != bounds[1]:
+        m.fit_bounds(bounds)
     return m
 
 
+def zoom_tolerance_m(zoom, lat, pixels=SIMPLIFY_TOLERANCE_PX):
+    """
+    Ground distance covered by a number of screen pixels at a web-mercator zoom level.
+
+    Args:
+        zoom: Map zoom level
+        lat: Latitude the map is centered on
+        pixels: Number of screen pixels
+
+    Returns:
+        Float: Distance in meters
+    """
+    return pixels * 156543.03392 * np.cos(np.radians(lat)) / (2 ** zoom)
+
+
+def simplify_coords(coords, zoom=PREVIEW_ZOOM, tolerance_m=None):
+    """
+    Douglas-Peucker simplification of a route, vectorized per split segment.
+
+    Vertices closer than the tolerance to the simplified line are dropped; the
+    first and last point are always kept. By default the tolerance is one screen
+    pixel at the given zoom, so the drawn line looks the same.
+
+    Args:
+        coords: (N, 2) array-like of (lat, lng)
+        zoom: Zoom level the route is drawn at
+        tolerance_m: Explicit tolerance in meters (overrides zoom)
+
+    Returns:
+        Tuple: ((M, 2) float array of kept points, number of vertices removed)
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    n = len(coords)
+    if n <= 2:
+        return coords, 0
+    lat0 = float(coords[:, 0].mean())
+    if tolerance_m is None:
+        tolerance_m = zoom_tolerance_m(zoom, lat0)
+    # local equirectangular projection in meters
+    xy = np.radians(coords[:, ::-1]) * 6371000.0
+    xy[:, 0] *= np.cos(np.radians(lat0))
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = xy[i], xy[j]
+        points = xy[i + 1:j]
+        ab = b - a
+        length_sq = float(ab @ ab)
+        if length_sq == 0.0:
+            dist = np.hypot(*(points - a).T)
+        else:
+            t = np.clip((points - a) @ ab / length_sq, 0.0, 1.0)
+            dist = np.hypot(*(points - (a + t[:, None] * ab)).T)
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance_m:
+            split = i + 1 + k
+            keep[split] = True
+            stack.append((i, split))
+            stack.append((split, j))
+
+    simplified = coords[keep]
+    removed = n - len(simplified)
+    metrics.inc("wonder_run_simplify_vertices_total", n, outcome="in")
+    metrics.inc("wonder_run_simplify_vertices_total", removed, outcome="removed")
+    return simplified, removed
+
+
 def decode_polyline(polyline_str):
     """
     Decode a polyline string into a list of (lat, lng) coordinates.
-    Uses the polyline library for decoding.
+    Goes through the shared decoded-geometry cache, so each polyline is
+    decoded only once per process.
     
     Args:
         polyline_str: Encoded polyline string from Google Maps API
@@ -39,10 +137,7 @@ def decode_polyline(polyline_str):
     Returns:
         List of tuples: [(lat1, lng1), (lat2, lng2), ...]
     """
-    try:
-        return polyline.decode(polyline_str)
-    except Exception:
-        return []
+    return [tuple(point) for point in decode_coords(polyline_str).tolist()]
 
 
 def get_waypoints_from_polyline(polyline_str, num_waypoints=5):
@@ -56,20 +151,20 @@ def get_waypoints_from_polyline(polyline_str, num_waypoints=5):
     Returns:
         List of (lat, lng) tuples representing waypoints
     """
-    coordinates = decode_polyline(polyline_str)
+    coordinates = decode_coords(polyline_str)
     
-    if not coordinates:
+    if len(coordinates) == 0:
         return []
     
     if len(coordinates) <= num_waypoints:
-        return coordinates
+        return [tuple(point) for point in coordinates.tolist()]
     
     # Extract evenly spaced waypoints
     step = len(coordinates) // (num_waypoints - 1)
-    waypoints = [coordinates[i * step] for i in range(num_waypoints - 1)]
-    waypoints.append(coordinates[-1])  # Always include the last point
+    indices = [i * step for i in range(num_waypoints - 1)]
+    indices.append(len(coordinates) - 1)  # Always include the last point
     
-    return waypoints
+    return [tuple(point) for point in coordinates[indices].tolist()]
 
 
 def create_google_maps_url(origin, destination, waypoints=None, mode='walking'):
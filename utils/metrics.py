@@ -0,0 +1,270 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# latency buckets (seconds), Prometheus' defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "wonder_run_stage_seconds": ("histogram", "Time spent per pipeline stage"),
+    "wonder_run_upstream_seconds": ("histogram", "Upstream API request latency by endpoint and status"),
+    "wonder_run_routes_total": ("counter", "Routes per generation outcome (returned, dropped, merged, fitted)"),
+    "wonder_run_generations_total": ("counter", "Completed route generations"),
+    "wonder_run_simplify_vertices_total": ("counter", "Route vertices given to and removed by map simplification"),
+    "wonder_run_cache_hit_ratio": ("gauge", "Hit ratio of each in-process cache"),
+    "wonder_run_cache_entries": ("gauge", "Entries held by each in-process cache"),
+    "wonder_run_rate_limited_total": ("counter", "Upstream requests not admitted, by endpoint, reason and priority"),
+    "wonder_run_rate_limit_wait_seconds": ("histogram", "Time spent waiting for a rate limit token"),
+    "wonder_run_rate_limit_queued": ("gauge", "Requests waiting for a rate limit token"),
+    "wonder_run_quota_used": ("gauge", "Upstream requests counted against today's quota"),
+    "wonder_run_coalesced_total": ("counter", "Requests that joined an identical in-flight upstream request"),
+    "wonder_run_requests_in_flight": ("gauge", "Distinct upstream requests in flight"),
+}
+
+logger = logging.getLogger("wonder_run.metrics")
+if not logger.handlers:
+    # generation lines go to stderr as bare JSON, whatever the root logging setup is
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process counters, latency histograms and pulled gauges.
+
+    Everything is keyed by metric name and a label set, kept in plain dicts
+    under one lock, and can be exported as Prometheus text or a dict snapshot.
+    Gauges come from collector callbacks evaluated at export time (e.g. cache
+    hit ratios), so the hot path never pays for them.
+
+    Args:
+        buckets: Upper bounds (seconds) of the histogram buckets
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(self.buckets)] += 1
+            hist[-1] += seconds
+
+    @contextmanager
+    def timer(self, stage: str):
+        # times the block as wonder_run_stage_seconds{stage=...}
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - started)
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        # one stage duration measured by the caller (e.g. summed over the parts of a
+        # stream the caller actually waited on), recorded like a timer() run
+        self.observe("wonder_run_stage_seconds", seconds, stage=stage)
+        collecting = getattr(self._local, "collecting", ())
+        if collecting:
+            # a collector can be shared with worker threads (see collect_into)
+            with self._lock:
+                for stages in collecting:
+                    stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def collect_stages(self):
+        # yields a dict that accumulates seconds per stage for every timer run
+        # on this thread inside the block (e.g. one route generation), and on
+        # worker threads the collector is handed to with collect_into
+        stages = {}
+        with self.collect_into((stages,)):
+            yield stages
+
+    def stage_collectors(self) -> tuple:
+        # the collect_stages() dicts active on this thread, to hand to worker threads
+        return tuple(getattr(self._local, "collecting", ()))
+
+    @contextmanager
+    def collect_into(self, collectors: Tuple[dict, ...]):
+        # timers on this thread also add into collectors (taken from stage_collectors()
+        # on the submitting thread); stages timed concurrently add up their durations
+        collecting = self._local.__dict__.setdefault("collecting", [])
+        collecting.extend(collectors)
+        try:
+            yield
+        finally:
+            for stages in collectors:
+                # by identity: two collectors can hold equal dicts
+                for i in range(len(collecting) - 1, -1, -1):
+                    if collecting[i] is stages:
+                        del collecting[i]
+                        break
+
+    def timed(self, stage: str) -> Callable:
+        # decorator form of timer()
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, dict, float]]]) -> None:
+        # collector() -> [(gauge name, labels, value), ...], called on every export
+        with self._lock:
+            self._collectors.append(collector)
+
+    def _gauges(self):
+        gauges = []
+        for collector in list(self._collectors):
+            try:
+                gauges += [(name, _labels(labels), float(value)) for name, labels, value in collector()]
+            except Exception:
+                logger.debug("metrics collector failed", exc_info=True)
+        return gauges
+
+    def snapshot(self) -> dict:
+        # plain-dict view: counters and gauges by "name{labels}", histograms with count/sum/mean
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        result = {"counters": {}, "histograms": {}, "gauges": {}}
+        for (name, labels), value in counters.items():
+            result["counters"][name + _format_labels(labels)] = value
+        for (name, labels), hist in histograms.items():
+            count = sum(hist[:-1])
+            result["histograms"][name + _format_labels(labels)] = {
+                "count": count, "sum": hist[-1], "mean": hist[-1] / count if count else 0.0
+            }
+        for name, labels, value in self._gauges():
+            result["gauges"][name + _format_labels(labels)] = value
+        return result
+
+    def render_prometheus(self) -> str:
+        # Prometheus text exposition format (version 0.0.4)
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        samples: Dict[str, list] = {}
+        for (name, labels), value in counters:
+            samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), hist[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist[-1]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        for name, labels, value in sorted(self._gauges()):
+            samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+        out = []
+        for name, lines in samples.items():
+            kind, text = HELP.get(name, ("untyped", name))
+            out += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"] + lines
+        return "\n".join(out) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def log_generation(fields: dict) -> str:
+    # one structured (JSON) log line per route generation; returns the line
+    line = json.dumps({"event": "generation", "ts": round(time.time(), 3), **fields}, default=str, sort_keys=True)
+    logger.info(line)
+    return line
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = None) -> ThreadingHTTPServer:
+    """
+    Serve /metrics in Prometheus text format from a background thread.
+
+    Safe to call on every Streamlit rerun: only the first call starts a server.
+
+    Args:
+        port: TCP port to listen on
+        host: Interface to bind (default: localhost only)
+        registry: Registry to export (default: the module-level one)
+
+    Returns:
+        The running server
+    """
+    global _server
+    registry = registry or metrics
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _server = ThreadingHTTPServer((host, port), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+        return _server
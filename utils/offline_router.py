@@ -0,0 +1,299 @@
+import heapq
+import math
+import xml.etree.ElementTree as ET
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.calculations import haversine_distances, KM_PER_DEG_LAT
+from utils.geometry import encode_coords
+
+# Google's walking estimate is about 5 km/h
+WALKING_SPEED_MPS = 5.0 / 3.6
+# grid cell (degrees) of the nearest-node index; ~550 m at the equator
+NEAREST_CELL_DEG = 0.005
+# points farther than this from every routable node are outside the extract
+NEAREST_MAX_DISTANCE_M = 1000.0
+
+# highway=* values usable on foot; motorways and trunks are left out
+WALKABLE_HIGHWAYS = {
+    "footway", "path", "pedestrian", "steps", "track", "living_street", "residential",
+    "service", "unclassified", "tertiary", "tertiary_link", "secondary", "secondary_link",
+    "primary", "primary_link", "road", "cycleway", "bridleway", "corridor",
+}
+NO_ACCESS = {"no", "private"}
+
+
+def _walkable(tags: Dict[str, str]) -> bool:
+    if tags.get("highway") not in WALKABLE_HIGHWAYS:
+        return False
+    if tags.get("foot") in NO_ACCESS:
+        return False
+    return not (tags.get("access") in NO_ACCESS and tags.get("foot") not in ("yes", "designated"))
+
+
+def _read_osm_xml(path: str):
+    # streaming parse; returns ({node_id: (lat, lng)}, [(node_ids, name)])
+    nodes = {}
+    ways = []
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end":
+            continue
+        if elem.tag == "node":
+            nodes[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+        elif elem.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            if _walkable(tags):
+                refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                ways.append((refs, tags.get("name", "")))
+        elif elem.tag != "relation":
+            continue
+        # finished top-level elements stay attached to the root unless it is cleared
+        root.clear()
+    return nodes, ways
+
+
+def _read_osm_pbf(path: str):
+    # PBF needs pyosmium, an optional dependency
+    try:
+        import osmium
+    except ImportError as exc:
+        raise ImportError("Reading .osm.pbf extracts requires the 'osmium' package (pip install osmium)") from exc
+
+    class Handler(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.nodes = {}
+            self.ways = []
+
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            if not _walkable(tags):
+                return
+            refs = []
+            for n in w.nodes:
+                if n.location.valid():
+                    self.nodes[n.ref] = (n.location.lat, n.location.lon)
+                    refs.append(n.ref)
+            self.ways.append((refs, tags.get("name", "")))
+
+    handler = Handler()
+    handler.apply_file(path, locations=True)
+    return handler.nodes, handler.ways
+
+
+class OfflineRouter:
+    """
+    Walking router over a local OpenStreetMap extract.
+
+    The walkable street network is stored as a compact CSR graph (NumPy arrays
+    for node coordinates, adjacency offsets, neighbours, edge lengths and edge
+    names) with a uniform-grid index for nearest-node lookups. Routes are found
+    with A* and returned in the same shape as parse_directions_response, so
+    rank_routes and the map code work unchanged.
+
+    Args:
+        path: .osm (XML) or .osm.pbf extract
+    """
+
+    def __init__(self, path: str):
+        if path.endswith(".pbf"):
+            raw_nodes, ways = _read_osm_pbf(path)
+        else:
+            raw_nodes, ways = _read_osm_xml(path)
+        self._build(raw_nodes, ways)
+
+    def _build(self, raw_nodes, ways) -> None:
+        used = sorted({ref for refs, _ in ways for ref in refs if ref in raw_nodes})
+        index = {osm_id: i for i, osm_id in enumerate(used)}
+        self.coords = np.array([raw_nodes[osm_id] for osm_id in used], dtype=float).reshape(-1, 2)
+        self.names = [""]
+        name_ids = {"": 0}
+        src, dst, name_of = [], [], []
+        for refs, name in ways:
+            name_id = name_ids.setdefault(name, len(self.names))
+            if name_id == len(self.names):
+                self.names.append(name)
+            ids = [index[r] for r in refs if r in index]
+            for a, b in zip(ids[:-1], ids[1:]):
+                if a == b:
+                    continue
+                # walking ignores oneway: both directions
+                src += [a, b]
+                dst += [b, a]
+                name_of += [name_id, name_id]
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        order = np.argsort(src, kind="stable")
+        self.indices = dst[order].astype(np.int32)
+        self.edge_names = np.asarray(name_of, dtype=np.int32)[order]
+        self.indptr = np.zeros(len(self.coords) + 1, dtype=np.int64)
+        np.add.at(self.indptr, src + 1, 1)
+        self.indptr = np.cumsum(self.indptr)
+        sorted_src = src[order]
+        self.weights = haversine_distances(
+            self.coords[sorted_src, 0], self.coords[sorted_src, 1],
+            self.coords[self.indices, 0], self.coords[self.indices, 1]
+        ) * 1000.0  # meters
+        self._build_nearest_index()
+
+    def components(self) -> np.ndarray:
+        # connected component label of every node (the smallest node index in it), by
+        # vectorized label propagation: each round takes the smallest label among the
+        # neighbours, then pointer jumping (label of the label) spreads it along paths
+        n = len(self.coords)
+        labels = np.arange(n, dtype=np.int64)
+        src = np.repeat(labels, np.diff(self.indptr))
+        while True:
+            hooked = labels.copy()
+            np.minimum.at(hooked, src, labels[self.indices])
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                return labels
+            labels = hooked
+
+    def _largest_component(self) -> np.ndarray:
+        if len(self.coords) == 0:
+            return np.zeros(0, dtype=np.int64)
+        labels = self.components()
+        return np.flatnonzero(labels == np.bincount(labels).argmax())
+
+    def _build_nearest_index(self) -> None:
+        # only nodes of the largest connected component are snapped to, so every
+        # snapped pair of points is routable
+        nodes = self._largest_component()
+        cells = np.floor(self.coords[nodes] / NEAREST_CELL_DEG).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        self._grid_nodes = nodes[order]
+        self._grid_bounds = (cells.min(axis=0).tolist(), cells.max(axis=0).tolist()) if len(cells) else None
+        self._grid = {}
+        for pos, (ci, cj) in enumerate(cells[order].tolist()):
+            start, _ = self._grid.get((ci, cj), (pos, pos))
+            self._grid[(ci, cj)] = (start, pos + 1)
+
+    def nearest_node(self, lat: float, lng: float, max_distance_m: float = NEAREST_MAX_DISTANCE_M) -> Optional[int]:
+        # closest routable node, or None if there is none within max_distance_m
+        if not self._grid:
+            return None
+        ci, cj = int(math.floor(lat / NEAREST_CELL_DEG)), int(math.floor(lng / NEAREST_CELL_DEG))
+        (lo_i, lo_j), (hi_i, hi_j) = self._grid_bounds
+        max_ring = max(abs(ci - lo_i), abs(ci - hi_i), abs(cj - lo_j), abs(cj - hi_j))
+        # rings beyond max_distance_m (cells are narrowest east-west) cannot hold a match
+        cell_m = NEAREST_CELL_DEG * KM_PER_DEG_LAT * 1000.0 * max(math.cos(math.radians(min(abs(lat), 89.0))), 0.01)
+        max_ring = min(max_ring, int(math.ceil(max_distance_m / cell_m)) + 1)
+        found_ring = None
+        candidates = []
+        # search square rings outwards; one extra ring after the first hit covers
+        # points just across a cell border
+        for ring in range(max_ring + 1):
+            if ring == 0:
+                border = [(ci, cj)]
+            else:
+                side = range(-ring, ring + 1)
+                border = [(ci + d, cj - ring) for d in side] + [(ci + d, cj + ring) for d in side]
+                border += [(ci - ring, cj + d) for d in side[1:-1]] + [(ci + ring, cj + d) for d in side[1:-1]]
+            for cell in border:
+                span = self._grid.get(cell)
+                if span:
+                    candidates.append(self._grid_nodes[span[0]:span[1]])
+            if candidates and found_ring is None:
+                found_ring = ring
+            if found_ring is not None and ring >= found_ring + 1:
+                break
+        if not candidates:
+            return None
+        nodes = np.concatenate(candidates)
+        d = haversine_distances(lat, lng, self.coords[nodes, 0], self.coords[nodes, 1]) * 1000.0
+        best = int(np.argmin(d))
+        if d[best] > max_distance_m:
+            return None
+        return int(nodes[best])
+
+    def shortest_path(self, source: int, target: int) -> Tuple[List[int], float]:
+        # A* with the straight-line distance (admissible: edges are great-circle lengths)
+        if source == target:
+            return [source], 0.0
+        tlat, tlng = self.coords[target]
+        lat_r = np.radians(self.coords[:, 0])
+        cos_t = math.cos(math.radians(tlat))
+
+        def heuristic(u: int) -> float:
+            dlat = lat_r[u] - math.radians(tlat)
+            dlng = math.radians(self.coords[u, 1] - tlng)
+            a = math.sin(dlat / 2) ** 2 + math.cos(lat_r[u]) * cos_t * math.sin(dlng / 2) ** 2
+            return 2 * 6371000.0 * math.asin(min(1.0, math.sqrt(a)))
+
+        best = {source: 0.0}
+        parent = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if u == target:
+                path = [u]
+                while parent[path[-1]] != -1:
+                    path.append(parent[path[-1]])
+                return path[::-1], g
+            if g > best.get(u, math.inf):
+                continue
+            lo, hi = self.indptr[u], self.indptr[u + 1]
+            for v, w in zip(self.indices[lo:hi].tolist(), self.weights[lo:hi].tolist()):
+                ng = g + w
+                if ng < best.get(v, math.inf):
+                    best[v] = ng
+                    parent[v] = u
+                    heapq.heappush(heap, (ng + heuristic(v), ng, v))
+        return [], math.inf
+
+    def _edge_name(self, u: int, v: int) -> str:
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        hits = np.flatnonzero(self.indices[lo:hi] == v)
+        return self.names[self.edge_names[lo + hits[0]]] if len(hits) else ""
+
+    def route(self, points: List[Tuple[float, float]]) -> Optional[dict]:
+        # shortest route visiting points in order (first = origin, last = destination)
+        nodes = [self.nearest_node(lat, lng) for lat, lng in points]
+        if any(n is None for n in nodes):
+            return None
+        path = [nodes[0]]
+        total = 0.0
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            leg, dist = self.shortest_path(a, b)
+            if not leg:
+                return None
+            path += leg[1:]
+            total += dist
+        # summary like Google's: the streets carrying most of the route
+        lengths = Counter()
+        for u, v in zip(path[:-1], path[1:]):
+            name = self._edge_name(u, v)
+            if name:
+                lo, hi = self.indptr[u], self.indptr[u + 1]
+                lengths[name] += float(self.weights[lo:hi][self.indices[lo:hi] == v][0])
+        summary = " and ".join(name for name, _ in lengths.most_common(2))
+        return {
+            "distance_m": int(round(total)),
+            "duration_s": int(round(total / WALKING_SPEED_MPS)),
+            "polyline": encode_coords(self.coords[path]),
+            "summary": summary,
+        }
+
+    def get_directions(self, origin: Tuple[float, float], destination: Tuple[float, float], api_key: str = None,
+                       alternatives: bool = True, mode: str = "walking", use_cache: bool = True,
+                       waypoints: Optional[List[Tuple[float, float]]] = None) -> Optional[List[dict]]:
+        # drop-in for utils.api_handler.get_directions; offline routing has no alternatives
+        result = self.route([origin] + list(waypoints or []) + [destination])
+        if result is None:
+            return []
+        return [dict(route_index=0, **result)]
+
+    def stats(self) -> dict:
+        nbytes = sum(a.nbytes for a in (self.coords, self.indptr, self.indices, self.weights, self.edge_names))
+        return {"nodes": len(self.coords), "edges": len(self.indices), "nbytes": int(nbytes)}
+
@@ -0,0 +1,340 @@
+import time
+from math import radians, sin
+from statistics import median
+from typing import List, Optional, Tuple
+
+from utils.api_handler import stream_routes_with_deadline, GENERATION_BUDGET_S
+from utils.calculations import destination_points, rank_routes_top_k
+
+# typical ratio between walking road distance and straight-line distance, used
+# for the very first probe before any response has been seen
+DEFAULT_ROAD_FACTOR = 1.3
+# a route "meets the goal" when its distance is within this fraction of the target
+DEFAULT_TOLERANCE = 0.1
+# Every search aims the road distance of a returned route (what the card shows and
+# ranking compares) at the target. The fixed search places its candidates at the
+# straight-line radius that gives that distance on a typical street network.
+FIXED_RADIUS_FACTOR = 1.0 / DEFAULT_ROAD_FACTOR
+# angle at the origin between the two corners of a loop; 60 deg makes an equilateral triangle
+LOOP_APEX_DEG = 60.0
+
+
+def _route_km(route: dict) -> float:
+    return route["distance_m"] / 1000.0
+
+
+def _hits(directions: Optional[List[dict]], target_km: float, tolerance: float) -> int:
+    return sum(1 for r in directions or [] if abs(_route_km(r) - target_km) <= tolerance * target_km)
+
+
+def collect_search(events) -> dict:
+    """
+    Drain one of the iter_* search generators into a single result.
+
+    Returns:
+        Dict with 'candidates' (in request order), 'weather', and the final summary
+        fields ('api_calls', 'rounds', 'within_tolerance', 'dropped')
+    """
+    candidates = []
+    weather = None
+    summary = {}
+    for kind, payload in events:
+        if kind == "candidate":
+            candidates.append(payload)
+        elif kind == "weather":
+            weather = payload
+        else:
+            summary = payload
+    candidates.sort(key=lambda c: c["index"])
+    return dict(summary, candidates=candidates, weather=weather)
+
+
+def _next_radius(samples: List[Tuple[float, float]], target_km: float, ratio: float) -> float:
+    # secant step on f(r) = road_km(r) - target through the last two probes of a bearing;
+    # with a single probe (or a flat secant) fall back to scaling by the road/straight ratio
+    if len(samples) >= 2:
+        (r0, d0), (r1, d1) = samples[-2], samples[-1]
+        if abs(d1 - d0) > 1e-6:
+            r = r1 + (target_km - d1) * (r1 - r0) / (d1 - d0)
+        else:
+            r = target_km / ratio
+    elif samples:
+        r, d = samples[0]
+        r = r * target_km / d if d > 0 else target_km / ratio
+    else:
+        r = target_km / ratio
+    # never probe outside [0.1, 1] x target: a route is at least as long as the straight line
+    return min(max(r, 0.1 * target_km), target_km)
+
+
+# Every search strategy is a generator of (kind, payload) events so callers can
+# show routes as they land:
+#   ("candidate", dict)  one Directions request settled: index, bearing, radius_km,
+#                        destination, round, directions (None if failed or timed out)
+#   ("weather", dict)    weather at the origin
+#   ("summary", dict)    last event: api_calls, rounds, within_tolerance, dropped
+# The blocking wrappers (fixed_route_search, ...) drain them with collect_search.
+
+
+def _stream_round(origin, destinations, api_key, weather_api_key, alternatives, budget_s, first_index, meta, waypoints=None):
+    # one concurrent batch; yields candidate/weather events, returns the batch's "done" info
+    done = {"dropped": [], "hedged": []}
+    for kind, idx, payload in stream_routes_with_deadline(
+        origin=origin,
+        destinations=destinations,
+        api_key=api_key,
+        weather_api_key=weather_api_key,
+        alternatives=alternatives,
+        budget_s=budget_s,
+        waypoints=waypoints
+    ):
+        if kind == "directions":
+            yield "candidate", dict(meta[idx], index=first_index + idx, destination=destinations[idx], directions=payload)
+        elif kind == "weather":
+            yield "weather", payload
+        else:
+            done = payload
+    # timed-out candidates still get their (empty) event so every request is accounted for
+    for idx in done["dropped"]:
+        yield "candidate", dict(meta[idx], index=first_index + idx, destination=destinations[idx], directions=None)
+    return done
+
+
+def iter_fixed_routes(origin: Tuple[float, float], target_distance_km: float, api_key: str,
+                      weather_api_key: str = None, n_bearings: int = 8, alternatives: bool = True,
+                      radius_factor: float = FIXED_RADIUS_FACTOR, budget_s: float = GENERATION_BUDGET_S):
+    """
+    One candidate per evenly spaced bearing at radius_factor x target, all fetched at once.
+
+    The default radius factor (1 / DEFAULT_ROAD_FACTOR) aims the road distance at
+    the target, like the adaptive search; only the correction step is missing.
+
+    Args:
+        origin: (lat, lng) start point
+        target_distance_km: Route distance to aim for
+        api_key: Google Maps API key
+        weather_api_key: OpenWeatherMap API key (weather is skipped if missing)
+        n_bearings: Number of evenly spaced bearings
+        alternatives: Ask Directions for alternative routes
+        radius_factor: Candidate distance from the origin as a fraction of the target
+        budget_s: Total time budget
+
+    Yields:
+        Search events (see above)
+    """
+    bearings = [i * (360 / n_bearings) for i in range(n_bearings)]
+    radius_km = target_distance_km * radius_factor
+    lats, lngs = destination_points(origin[0], origin[1], bearings, radius_km)
+    destinations = [(float(lat), float(lng)) for lat, lng in zip(lats, lngs)]
+    meta = [{"bearing": b, "radius_km": radius_km, "round": 1} for b in bearings]
+    within = 0
+    stream = _stream_round(origin, destinations, api_key, weather_api_key, alternatives, budget_s, 0, meta)
+    while True:
+        try:
+            kind, payload = next(stream)
+        except StopIteration as stop:
+            done = stop.value
+            break
+        if kind == "candidate":
+            within += _hits(payload["directions"], target_distance_km, DEFAULT_TOLERANCE)
+        yield kind, payload
+    yield "summary", {
+        "api_calls": n_bearings + len(done["hedged"]),
+        "rounds": 1,
+        "within_tolerance": within,
+        "dropped": done["dropped"],
+    }
+
+
+def fixed_route_search(*args, **kwargs) -> dict:
+    # blocking form of iter_fixed_routes
+    return collect_search(iter_fixed_routes(*args, **kwargs))
+
+
+def iter_adaptive_routes(origin: Tuple[float, float], target_distance_km: float, api_key: str,
+                         weather_api_key: str = None, n_bearings: int = 8, k: int = 3,
+                         tolerance: float = DEFAULT_TOLERANCE, max_rounds: int = 3,
+                         alternatives: bool = True, budget_s: float = GENERATION_BUDGET_S):
+    """
+    Search candidate destinations whose routes hit the target distance, correcting the radius per bearing.
+
+    The first round probes every other bearing at target / DEFAULT_ROAD_FACTOR. The
+    road/straight-line ratio observed there sets the radius for the remaining
+    bearings, and bearings that missed are refined with a secant step on their own
+    probes. The search stops as soon as k routes are within tolerance (mid-round:
+    requests still in flight are abandoned), when nothing is left to refine, or
+    after max_rounds rounds. It typically needs more Directions calls than the
+    fixed search, in exchange for more routes close to the target.
+
+    Args:
+        origin: (lat, lng) start point
+        target_distance_km: Route distance to aim for
+        api_key: Google Maps API key
+        weather_api_key: OpenWeatherMap API key; weather is fetched with the first round
+        n_bearings: Number of evenly spaced bearings
+        k: Stop once this many routes are within tolerance
+        tolerance: Allowed relative distance error
+        max_rounds: Upper bound on request rounds
+        alternatives: Ask Directions for alternative routes
+        budget_s: Total time budget shared by all rounds
+
+    Yields:
+        Search events (see above)
+    """
+    deadline = time.perf_counter() + budget_s
+    bearings = [i * (360 / n_bearings) for i in range(n_bearings)]
+    samples = {b: [] for b in range(n_bearings)}  # bearing index -> [(radius_km, road_km)]
+    met = set()  # bearing indices that already have a route within tolerance
+    tried = set()  # bearing indices with at least one request
+    dropped = []
+    api_calls = 0
+    rounds = 0
+    within = 0
+    sent = 0
+
+    # round 1 probes every other bearing so the rest can use the observed road factor
+    todo = {b: target_distance_km / DEFAULT_ROAD_FACTOR for b in range(0, n_bearings, 2)}
+    while todo and rounds < max_rounds:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        order = sorted(todo)
+        lats, lngs = destination_points(origin[0], origin[1], [bearings[b] for b in order], [todo[b] for b in order])
+        destinations = [(float(lat), float(lng)) for lat, lng in zip(lats, lngs)]
+        rounds += 1
+        meta = [{"bearing": bearings[b], "radius_km": todo[b], "round": rounds, "bearing_index": b} for b in order]
+        stream = _stream_round(origin, destinations, api_key, weather_api_key if rounds == 1 else None,
+                               alternatives, remaining, sent, meta)
+        while True:
+            if within >= k:
+                # enough routes already: stop waiting for the rest of the round
+                stream.close()
+                done = {"dropped": [], "hedged": []}
+                break
+            try:
+                kind, payload = next(stream)
+            except StopIteration as stop:
+                done = stop.value
+                break
+            if kind == "candidate":
+                b = payload.pop("bearing_index")
+                tried.add(b)
+                directions = payload["directions"]
+                if directions:
+                    as_ranked = [{"distance_km": _route_km(r), "duration_min": r["duration_s"] / 60.0} for r in directions]
+                    closest = directions[rank_routes_top_k(as_ranked, "Distance (km)", target_distance_km, k=1, weights={"target": 1.0})[0]]
+                    samples[b].append((payload["radius_km"], _route_km(closest)))
+                    hits = _hits(directions, target_distance_km, tolerance)
+                    if hits:
+                        met.add(b)
+                        within += hits
+            yield kind, payload
+        api_calls += len(destinations) + len(done["hedged"])
+        dropped += [sent + i for i in done["dropped"]]
+        sent += len(destinations)
+
+        if within >= k:
+            break
+
+        # next round: unprobed bearings use the median road factor seen so far,
+        # probed bearings that missed refine their own radius
+        ratios = [d / r for s in samples.values() for r, d in s if r > 0 and d > 0]
+        ratio = median(ratios) if ratios else DEFAULT_ROAD_FACTOR
+        todo = {}
+        for b in range(n_bearings):
+            if b in met:
+                continue
+            if not samples[b]:
+                if b not in tried:
+                    todo[b] = _next_radius([], target_distance_km, ratio)
+                continue
+            r = _next_radius(samples[b], target_distance_km, ratio)
+            if abs(r - samples[b][-1][0]) > 0.01 * target_distance_km:
+                todo[b] = r
+
+    yield "summary", {
+        "api_calls": api_calls,
+        "rounds": rounds,
+        "within_tolerance": within,
+        "dropped": dropped,
+    }
+
+
+def adaptive_route_search(*args, **kwargs) -> dict:
+    # blocking form of iter_adaptive_routes
+    return collect_search(iter_adaptive_routes(*args, **kwargs))
+
+
+def loop_waypoints(origin: Tuple[float, float], target_distance_km: float, n_loops: int = 8,
+                   road_factor: float = DEFAULT_ROAD_FACTOR, apex_deg: float = LOOP_APEX_DEG) -> List[List[Tuple[float, float]]]:
+    """
+    Corner points of triangular loops origin -> A -> B -> origin, one loop per bearing.
+
+    A lies on the loop's bearing and B apex_deg further clockwise, both at the same
+    radius, chosen so the road distance of the loop is about target_distance_km.
+
+    Args:
+        origin: (lat, lng) start and end point
+        target_distance_km: Loop distance to aim for
+        n_loops: Number of evenly rotated loops
+        road_factor: Expected road / straight-line distance ratio
+        apex_deg: Angle at the origin between A and B
+
+    Returns:
+        List of [A, B] waypoint pairs, one per loop
+    """
+    # straight-line perimeter of the triangle is r (out) + chord + r (back)
+    perimeter_per_radius = 2 + 2 * sin(radians(apex_deg) / 2)
+    radius_km = target_distance_km / (road_factor * perimeter_per_radius)
+    bearings = [i * (360 / n_loops) for i in range(n_loops)]
+    corners = bearings + [b + apex_deg for b in bearings]
+    lats, lngs = destination_points(origin[0], origin[1], corners, radius_km)
+    points = [(round(float(lat), 6), round(float(lng), 6)) for lat, lng in zip(lats, lngs)]
+    return [[points[i], points[n_loops + i]] for i in range(n_loops)]
+
+
+def iter_loop_routes(origin: Tuple[float, float], target_distance_km: float, api_key: str,
+                     weather_api_key: str = None, n_loops: int = 8,
+                     budget_s: float = GENERATION_BUDGET_S):
+    """
+    Fetch true loop routes, each with a single multi-waypoint Directions request.
+
+    The ranked distance is the distance of the whole loop, and every returned route
+    carries its 'waypoints' so the link handed to the user follows the same loop.
+
+    Args:
+        origin: (lat, lng) start and end point
+        target_distance_km: Loop distance to aim for
+        api_key: Google Maps API key
+        weather_api_key: OpenWeatherMap API key (weather is skipped if missing)
+        n_loops: Number of loops (one Directions request each)
+        budget_s: Total time budget
+
+    Yields:
+        Search events (see above); candidates also carry their 'waypoints'
+    """
+    waypoints = loop_waypoints(origin, target_distance_km, n_loops)
+    meta = [{"bearing": i * (360 / n_loops), "radius_km": None, "round": 1, "waypoints": waypoints[i]} for i in range(n_loops)]
+    within = 0
+    stream = _stream_round(origin, [origin] * n_loops, api_key, weather_api_key, False, budget_s, 0, meta, waypoints=waypoints)
+    while True:
+        try:
+            kind, payload = next(stream)
+        except StopIteration as stop:
+            done = stop.value
+            break
+        if kind == "candidate" and payload["directions"]:
+            payload["directions"] = [dict(r, waypoints=payload["waypoints"]) for r in payload["directions"]]
+            within += _hits(payload["directions"], target_distance_km, DEFAULT_TOLERANCE)
+        yield kind, payload
+    yield "summary", {
+        "api_calls": n_loops + len(done["hedged"]),
+        "rounds": 1,
+        "within_tolerance": within,
+        "dropped": done["dropped"],
+    }
+
+
+def fetch_loop_routes(*args, **kwargs) -> dict:
+    # blocking form of iter_loop_routes
+    return collect_search(iter_loop_routes(*args, **kwargs))
@@ -0,0 +1,139 @@
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from utils.calculations import PathIndex, calculate_calories
+from utils.geometry import decode_coords, encode_coords
+
+
+class Route:
+    """
+    Compact record for one suggested route.
+
+    Uses __slots__ instead of a per-instance dict, keeps the geometry as the
+    encoded polyline (decoded lazily through the shared geometry cache) and
+    pickles to a plain tuple. Supports read-only mapping access (route["distance_km"],
+    route.get("waypoints")) so code written against the old route dicts, like
+    rank_routes and the map renderer, works unchanged.
+    """
+
+    __slots__ = ("route_id", "polyline", "distance_km", "duration_min", "calories", "summary", "waypoints")
+
+    def __init__(self, route_id: str, polyline: str, distance_km: float, duration_min: float, calories: float,
+                 summary: str = "", waypoints: Optional[List[Tuple[float, float]]] = None):
+        self.route_id = route_id
+        self.polyline = polyline
+        self.distance_km = float(distance_km)
+        self.duration_min = float(duration_min)
+        self.calories = float(calories)
+        self.summary = summary or ""
+        self.waypoints = tuple(tuple(p) for p in waypoints) if waypoints else None
+
+    @classmethod
+    def from_directions(cls, candidate_index: int, parsed: dict, weight_kg: float) -> "Route":
+        # one route of parse_directions_response -> Route (distance in km, duration in minutes)
+        dist_km = parsed["distance_m"] / 1000.0
+        dur_min = parsed["duration_s"] / 60.0
+        return cls(
+            route_id=f"{candidate_index}-{parsed['route_index']}",
+            polyline=parsed["polyline"],
+            distance_km=round(dist_km, 3),
+            duration_min=round(dur_min, 1),
+            calories=round(calculate_calories(dist_km, weight_kg), 1),
+            summary=parsed.get("summary", ""),
+            # loop routes: the exact stopovers the route was fetched with
+            waypoints=parsed.get("waypoints")
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Route":
+        return cls(**{key: data.get(key) for key in cls.__slots__ if key in data})
+
+    @property
+    def coords(self) -> np.ndarray:
+        # decoded (N, 2) geometry, shared through the geometry cache
+        return decode_coords(self.polyline)
+
+    def to_dict(self) -> dict:
+        data = {key: getattr(self, key) for key in self.__slots__}
+        if data["waypoints"] is None:
+            del data["waypoints"]
+        else:
+            data["waypoints"] = [list(p) for p in data["waypoints"]]
+        return data
+
+    # mapping-style access, for code written against route dicts
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        if key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def keys(self) -> Iterator[str]:
+        return (key for key in self.__slots__ if getattr(self, key) is not None)
+
+    def __reduce__(self):
+        return (Route, tuple(getattr(self, key) for key in self.__slots__))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Route) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Route({self.route_id!r}, {self.distance_km} km, {self.duration_min} min)"
+
+
+def routes_from_directions(candidate_index: int, directions: Optional[List[dict]], weight_kg: float) -> List[Route]:
+    # parsed Directions routes of one candidate (possibly several alternatives) -> Route records
+    return [Route.from_directions(candidate_index, r, weight_kg) for r in directions or []]
+
+
+def fit_route_to_distance(route: Route, target_km: float, weight_kg: float, tolerance: float = 0.1) -> Route:
+    """
+    Reshape a route to exactly target_km from its own geometry, without another API call.
+
+    Routes that overshoot are cut at target_km; routes that fall short but reach
+    at least half the target become an out-and-back that turns around at
+    target_km / 2. Distance, duration (at the route's own pace) and calories are
+    recomputed. Routes already within tolerance, and ones too short to fit, are
+    returned unchanged.
+
+    Args:
+        route: Route to fit
+        target_km: Distance to fit the route to
+        weight_kg: Runner weight, for the calorie estimate
+        tolerance: Relative distance error accepted as is
+
+    Returns:
+        Route: The fitted copy, or the original route
+    """
+    if route.distance_km <= 0 or abs(route.distance_km - target_km) <= tolerance * target_km:
+        return route
+    index = PathIndex(route.coords)
+    if index.length_km <= 0 or route.distance_km < target_km / 2.0:
+        return route
+    # cut positions in geometry km, scaled so the reported distance matches the API's
+    geometry_km = target_km * index.length_km / route.distance_km
+    if route.distance_km > target_km:
+        coords = index.truncate(geometry_km)
+        route_id, summary, waypoints = f"{route.route_id}t", "trimmed", None
+    else:
+        coords = index.out_and_back(geometry_km)
+        # the turnaround is the one stop needed to reproduce it in Google Maps
+        route_id, summary, waypoints = f"{route.route_id}b", "out and back", [tuple(round(v, 6) for v in index.point_at(geometry_km / 2.0))]
+    return Route(
+        route_id=route_id,
+        polyline=encode_coords(coords),
+        distance_km=round(target_km, 3),
+        duration_min=round(route.duration_min * target_km / route.distance_km, 1),
+        calories=round(calculate_calories(target_km, weight_kg), 1),
+        summary=f"{route.summary} ({summary})" if route.summary else summary.capitalize(),
+        waypoints=waypoints
+    )
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import itertools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from utils.cache import CACHE_DIR
+from utils.geometry import decode_coords
+
+# rendered route thumbnails, one PNG per (polyline, style) content hash
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, "thumbnails")
+# the directory is pruned to this many files (least recently used go first), and files
+# unused for THUMBNAIL_MAX_AGE_S are dropped; checked every THUMBNAIL_PRUNE_EVERY writes
+THUMBNAIL_MAX_FILES = 2000
+THUMBNAIL_MAX_AGE_S = 7 * 24 * 3600
+THUMBNAIL_PRUNE_EVERY = 50
+# drawn at this multiple of the output size, then downsampled for anti-aliasing
+SUPERSAMPLE = 2
+
+DEFAULT_STYLE = {
+    "width": 400,
+    "height": 300,
+    "padding": 24,
+    "background": "#FFF8F0",
+    "grid_color": "#F3E3D3",
+    "line_color": "#D2691E",
+    "line_width": 4,
+    "start_color": "#2E7D32",
+}
+
+
+_writes = itertools.count(1)
+
+
+def thumbnail_key(polyline_str: str, style: dict) -> str:
+    payload = json.dumps({"polyline": polyline_str, "style": style}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _project(coords: np.ndarray) -> np.ndarray:
+    # web mercator (x grows east, y grows south) on an arbitrary scale
+    lat = np.radians(np.clip(coords[:, 0], -85.0, 85.0))
+    x = np.radians(coords[:, 1])
+    y = -np.log(np.tan(np.pi / 4 + lat / 2))
+    return np.column_stack((x, y))
+
+
+def render_thumbnail(coords, origin=None, style: dict = None) -> bytes:
+    """
+    Rasterize a route into a small PNG without any tile server.
+
+    Args:
+        coords: (N, 2) array-like of (lat, lng)
+        origin: Optional (lat, lng) start marker (default: first route point)
+        style: Overrides for DEFAULT_STYLE
+
+    Returns:
+        Bytes: PNG image
+    """
+    style = {**DEFAULT_STYLE, **(style or {})}
+    scale = SUPERSAMPLE
+    width, height = style["width"] * scale, style["height"] * scale
+    padding = style["padding"] * scale
+    image = Image.new("RGB", (width, height), style["background"])
+    draw = ImageDraw.Draw(image)
+    for gx in range(0, width, 40 * scale):
+        draw.line([(gx, 0), (gx, height)], fill=style["grid_color"], width=scale)
+    for gy in range(0, height, 40 * scale):
+        draw.line([(0, gy), (width, gy)], fill=style["grid_color"], width=scale)
+
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if origin is None and len(coords):
+        origin = tuple(coords[0])
+    points = coords if origin is None else np.vstack((coords, [origin]))
+    if len(points):
+        xy = _project(points)
+        lo, hi = xy.min(axis=0), xy.max(axis=0)
+        span = np.maximum(hi - lo, 1e-9)
+        # uniform scale so the route keeps its shape, centered in the frame
+        fit = min((width - 2 * padding) / span[0], (height - 2 * padding) / span[1])
+        offset = (np.array([width, height]) - span * fit) / 2
+        pixels = (xy - lo) * fit + offset
+        if len(coords) >= 2:
+            draw.line([tuple(p) for p in pixels[:len(coords)].tolist()], fill=style["line_color"],
+                      width=style["line_width"] * scale, joint="curve")
+        if origin is not None:
+            sx, sy = pixels[-1]
+            r = 6 * scale
+            draw.ellipse([sx - r, sy - r, sx + r, sy + r], fill=style["start_color"], outline="white", width=scale)
+
+    image = image.resize((style["width"], style["height"]), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def get_route_thumbnail(polyline_str: str, origin=None, style: dict = None, cache_dir: str = None) -> bytes:
+    """
+    PNG thumbnail for an encoded polyline, served from the disk cache when possible.
+
+    Args:
+        polyline_str: Encoded polyline string
+        origin: Optional (lat, lng) start marker
+        style: Overrides for DEFAULT_STYLE
+        cache_dir: Thumbnail directory (default: THUMBNAIL_DIR)
+
+    Returns:
+        Bytes: PNG image
+    """
+    style = {**DEFAULT_STYLE, **(style or {})}
+    cache_dir = cache_dir or THUMBNAIL_DIR
+    key_style = dict(style, origin=list(origin) if origin is not None else None)
+    path = os.path.join(cache_dir, thumbnail_key(polyline_str or "", key_style) + ".png")
+    try:
+        with open(path, "rb") as file:
+            png = file.read()
+        # the modification time doubles as the last use, for prune_thumbnails
+        os.utime(path)
+        return png
+    except OSError:
+        pass
+    png = render_thumbnail(decode_coords(polyline_str), origin=origin, style=style)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temp file first so concurrent readers never see a partial PNG
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(png)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+    if next(_writes) % THUMBNAIL_PRUNE_EVERY == 0:
+        prune_thumbnails(cache_dir)
+    return png
+
+
+def prune_thumbnails(cache_dir: str = None, max_files: int = None, max_age_s: float = None) -> int:
+    """
+    Bound the thumbnail directory like the SQLite caches: drop files unused for
+    max_age_s, then the least recently used ones above max_files.
+
+    Args:
+        cache_dir: Thumbnail directory (default: THUMBNAIL_DIR)
+        max_files: Files kept at most (default: THUMBNAIL_MAX_FILES)
+        max_age_s: Seconds since last use before a file is dropped (default: THUMBNAIL_MAX_AGE_S)
+
+    Returns:
+        Int: Number of files removed
+    """
+    cache_dir = cache_dir or THUMBNAIL_DIR
+    max_files = THUMBNAIL_MAX_FILES if max_files is None else max_files
+    max_age_s = THUMBNAIL_MAX_AGE_S if max_age_s is None else max_age_s
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(".png")]
+    except OSError:
+        return 0
+    used = []
+    for entry in entries:
+        try:
+            used.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            pass
+    used.sort(reverse=True)
+    cutoff = time.time() - max_age_s
+    stale = [path for i, (mtime, path) in enumerate(used) if i >= max_files or mtime < cutoff]
+    removed = 0
+    for path in stale:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed